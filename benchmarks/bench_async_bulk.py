@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+u"""
+QueryListの一括処理を、逐次実行した場合と並行実行した場合で比較するベンチマーク。
+
+ローカルの擬似Redashサーバに応答遅延を設定し、fork_in_bulkとasync_fork_in_bulkの所要時間を比較する。
+
+実行例:
+    python3 ./benchmarks/bench_async_bulk.py 200 0.05 20
+"""
+
+import sys
+from asyncio import get_event_loop
+from os import path
+from time import perf_counter
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from benchmarks.fake_redash import FakeRedashServer
+from lib.redash_util import ConnectionInfo, Query, QueryList
+from lib.redash_util.async_gateway import shutdown_all_executors
+from lib.redash_util.gateway import close_all_sessions
+
+
+def make_query_list(con: 'ConnectionInfo', count: int) -> 'QueryList':
+    u"""ダミーのクエリをcount件保持するQueryListを返す。"""
+    query_list = QueryList(con)
+    query_list.set_queries(
+        [Query(query_id=i, connection_info=con) for i in range(1, count + 1)])
+    return query_list
+
+
+if __name__ == u'__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    pool_size = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    server = FakeRedashServer(latency=latency).start()
+    con = ConnectionInfo(server.get_end_point(), u'dummy api key', pool_size)
+    try:
+        start = perf_counter()
+        make_query_list(con, count).fork_in_bulk()
+        sequential = perf_counter() - start
+
+        start = perf_counter()
+        get_event_loop().run_until_complete(
+            make_query_list(con, count).async_fork_in_bulk())
+        concurrent = perf_counter() - start
+    finally:
+        shutdown_all_executors()
+        close_all_sessions()
+        server.stop()
+
+    print(u'queries: {0}, latency: {1}s, pool size: {2}'.format(
+        count, latency, pool_size))
+    print(u'fork_in_bulk       : {0:8.2f} s'.format(sequential))
+    print(u'async_fork_in_bulk : {0:8.2f} s'.format(concurrent))
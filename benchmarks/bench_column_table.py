@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+u"""
+クエリの実行結果を、行毎の辞書の配列(従来)とColumnTable(カラム毎の配列)で保持した場合の、
+メモリ使用量とcsvシリアライズの所要時間を比較するベンチマーク。
+
+カラムは、整数・浮動小数点数・文字列を順に繰り返してcolumn_count個作る。
+
+実行例:
+    python3 ./benchmarks/bench_column_table.py 200000 20
+"""
+
+import sys
+from csv import QUOTE_NONNUMERIC, writer
+from gc import collect
+from os import linesep, path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+from typing import Any, Callable, Dict, Tuple
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from lib.redash_util import QueryResult
+
+
+def make_data(row_count: int, column_count: int) -> Dict[str, Any]:
+    u"""Redashが返す形式の、row_count行・column_countカラムのdataを返す。"""
+    types = [u'integer', u'float', u'string']
+    columns = [
+        {u'name': u'column_{}'.format(i), u'type': types[i % 3]}
+        for i in range(column_count)]
+    makers = [
+        lambda i: i,
+        lambda i: i * 0.5,
+        lambda i: u'value' + str(i),
+    ]
+    rows = [
+        {column[u'name']: makers[j % 3](i)
+         for j, column in enumerate(columns)}
+        for i in range(row_count)]
+    return {u'columns': columns, u'rows': rows}
+
+
+def serialize_rows(data: Dict[str, Any], file_path: str) -> None:
+    u"""行毎の辞書から、カラム毎に辞書を引いて書き出す従来の実装。"""
+    column_names = [column[u'name'] for column in data[u'columns']]
+    with open(file_path, u'w', newline=u'') as file:
+        writer(file, lineterminator=linesep).writerow(column_names)
+        writer(file, quoting=QUOTE_NONNUMERIC, lineterminator=linesep) \
+            .writerows([row.get(name) for name in column_names]
+                       for row in data[u'rows'])
+
+
+def measure_retained(build: Callable[[], Any]) -> Tuple[Any, float]:
+    u"""関数の戻り値と、それが保持し続けるメモリ量(MB)を返す。"""
+    collect()
+    start()
+    value = build()
+    collect()
+    retained = get_traced_memory()[0] / 1024 / 1024
+    stop()
+    return value, retained
+
+
+def best_of(function: Callable[[], None], repeat: int=3) -> float:
+    u"""関数をrepeat回実行し、最短の所要時間(秒)を返す。"""
+    times = []
+    for _ in range(repeat):
+        begin = perf_counter()
+        function()
+        times.append(perf_counter() - begin)
+    return min(times)
+
+
+if __name__ == u'__main__':
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    column_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    # いずれも、Redashが返すdata(行毎の辞書)を生成してから、その形式で保持し続ける量を計測する。
+    # (ColumnTableの場合、変換後に行毎の辞書は解放される。文字列の値は両者で共有する。)
+    data, rows_mb = measure_retained(
+        lambda: make_data(row_count, column_count))
+    query_result, table_mb = measure_retained(
+        lambda: QueryResult({u'data': make_data(row_count, column_count)}))
+
+    with TemporaryDirectory() as temp_dir:
+        file_path = path.join(temp_dir, u'result.csv')
+        rows_time = best_of(lambda: serialize_rows(data, file_path))
+        table_time = best_of(
+            lambda: query_result.serialize(file_path, u'csv'))
+
+    print(u'rows={} columns={}'.format(row_count, column_count))
+    print(u'{0:>13} | {1:>12} | {2:>8}'.format(
+        u'layout', u'memory(MB)', u'csv(s)'))
+    print(u'{0:>13} | {1:12.1f} | {2:8.2f}'.format(
+        u'dict-of-rows', rows_mb, rows_time))
+    print(u'{0:>13} | {1:12.1f} | {2:8.2f}'.format(
+        u'ColumnTable', table_mb, table_time))
+    print(u'memory: {:.1f}x smaller, csv: {:.1f}x faster'.format(
+        rows_mb / table_mb, rows_time / table_time))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+u"""
+csvと列指向形式(columnar)の、書き出し時間・ファイルサイズ・読み込み時間を比較するベンチマーク。
+
+読み込み時間は、以下を計測する。
+* csv     : csvモジュールで一行ずつ解析し、カラムの型に応じてint・floatに変換して列の配列にまとめる。
+* columnar: ColumnarReader.read_columnsで列の配列にまとめる。
+
+実行例:
+    python3 ./benchmarks/bench_columnar.py 100000 1000000
+"""
+
+import sys
+from csv import reader
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from benchmarks.bench_csv_serialize import make_query_result
+from lib.redash_util import ColumnarReader
+
+
+# csvを読み込む際の、カラムの型毎の変換関数。
+CONVERTERS = {
+    u'integer': int,
+    u'float': float,
+}
+
+
+def load_csv(
+    file_path: str, columns: List[Dict[str, Any]]
+) -> Dict[str, List[Any]]:
+    u"""csvファイルを読み込み、カラムの型に応じて変換した列の辞書を返す。"""
+    converters = [
+        CONVERTERS.get(column[u'type'], str) for column in columns]
+    with open(file_path, newline=u'') as file:
+        rows = reader(file)
+        names = next(rows)
+        values = [[] for _ in names]  # type: List[List[Any]]
+        for row in rows:
+            for converter, column, value in zip(converters, values, row):
+                column.append(converter(value) if value != u'' else None)
+    return dict(zip(names, values))
+
+
+def timed(function: Callable[[], Any]) -> Tuple[float, Any]:
+    u"""関数の所要時間(秒)と、戻り値を返す。"""
+    begin = perf_counter()
+    result = function()
+    return perf_counter() - begin, result
+
+
+if __name__ == u'__main__':
+    row_counts = [int(arg) for arg in sys.argv[1:]] or [100000]
+
+    print(u'{0:>9} | {1:>8} | {2:>9} | {3:>10} | {4:>9}'.format(
+        u'rows', u'format', u'write(s)', u'size(MB)', u'load(s)'))
+    with TemporaryDirectory() as temp_dir:
+        for row_count in row_counts:
+            query_result = make_query_result(row_count)
+            columns = query_result.data[u'columns']
+            for file_format in (u'csv', u'columnar'):
+                file_path = path.join(temp_dir, u'result.' + file_format)
+                write_time, _ = timed(
+                    lambda: query_result.serialize(file_path, file_format))
+                if file_format == u'csv':
+                    load_time, _ = timed(lambda: load_csv(file_path, columns))
+                else:
+                    load_time, _ = timed(
+                        lambda: ColumnarReader(file_path).read_columns())
+                print(u'{0:>9} | {1:>8} | {2:9.2f} | {3:10.2f} | {4:9.2f}'
+                      .format(row_count, file_format, write_time,
+                              path.getsize(file_path) / 1024 / 1024,
+                              load_time))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+u"""
+QueryResult.serializeの、圧縮形式・圧縮レベル・バックグラウンド圧縮の有無による、
+所要時間と書き出したバイト数の違いを比較するベンチマーク。
+
+ネットワークファイルシステムのような遅いディスクを想定する場合は、
+第2引数に書き出し速度の上限(MB/s)を指定する(ファイルへの書き込み毎に、その速度になるようスリープする)。
+
+実行例:
+    python3 ./benchmarks/bench_compressed_output.py 1000000 50
+"""
+
+import sys
+from io import FileIO
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+from unittest.mock import patch
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from benchmarks.bench_csv_serialize import make_query_result
+from lib.redash_util.compression import zstandard
+
+
+class ThrottledFile(FileIO):
+    u"""書き込み速度をbytes_per_second以下に制限するファイル。"""
+
+    bytes_per_second = 0.0
+
+    def write(self, data: bytes) -> int:
+        if self.bytes_per_second:
+            sleep(len(data) / self.bytes_per_second)
+        return super().write(data)
+
+
+def throttled_open(file_path: str, mode: str, *args, **kwargs) -> FileIO:
+    u"""
+    open関数の代わりに、書き込み速度を制限したファイルを開く。
+
+    (serializeの中では、書き出し用のファイルをバイナリモードで開くことだけに使われる。)
+    """
+    return ThrottledFile(file_path, mode.replace(u'b', u''))
+
+
+if __name__ == u'__main__':
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    mb_per_second = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    ThrottledFile.bytes_per_second = mb_per_second * 1024 * 1024
+
+    cases = [
+        (u'csv', None, False),
+        (u'csv.gz', 1, False),
+        (u'csv.gz', 1, True),
+        (u'csv.gz', 6, False),
+        (u'csv.gz', 6, True),
+    ]
+    if zstandard is not None:
+        cases += [(u'csv.zst', 3, False), (u'csv.zst', 3, True)]
+
+    query_result = make_query_result(row_count)
+    print(u'rows={} disk={}'.format(
+        row_count,
+        u'{} MB/s'.format(mb_per_second) if mb_per_second else u'local'))
+    print(u'{0:>8} | {1:>5} | {2:>10} | {3:>8} | {4:>10}'.format(
+        u'format', u'level', u'background', u'time(s)', u'size(MB)'))
+    with TemporaryDirectory() as temp_dir, \
+            patch(u'builtins.open', throttled_open):
+        for file_format, level, background in cases:
+            file_path = path.join(temp_dir, u'result.' + file_format)
+            begin = perf_counter()
+            query_result.serialize(
+                file_path, file_format, compression_level=level,
+                background=background)
+            elapsed = perf_counter() - begin
+            print(u'{0:>8} | {1:>5} | {2:>10} | {3:8.2f} | {4:10.2f}'.format(
+                file_format, str(level or u'-'), str(background), elapsed,
+                path.getsize(file_path) / 1024 / 1024))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+u"""
+QueryResultのcsvシリアライズ処理の、所要時間と最大メモリ使用量を計測するベンチマーク。
+
+以下二つの方式で、10k/100k/1M行の結果をcsvファイルに書き出して比較する。
+
+* before: 文字列連結で全体を組み立ててから書き出す、以前の実装。
+* after : QueryResult.serialize(csvモジュールで一行ずつ書き出す)。
+
+以前の実装は行数に対して二乗で遅くなるため、LEGACY_MAX_ROWSを超える行数では計測を省略する。
+
+実行例:
+    python3 ./benchmarks/bench_csv_serialize.py 10000 100000 1000000
+"""
+
+import sys
+from os import linesep, path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+from typing import Any, Callable, Dict, Tuple
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from lib.redash_util import QueryResult
+
+
+# 以前の実装を計測する行数の上限(10万行で数分かかるため)。
+LEGACY_MAX_ROWS = 100000
+
+
+def make_query_result(row_count: int) -> 'QueryResult':
+    u"""5カラム・row_count行のダミーのQueryResultを返す。"""
+    columns = [
+        {u'name': u'id', u'type': u'integer'},
+        {u'name': u'name', u'type': u'string'},
+        {u'name': u'score', u'type': u'float'},
+        {u'name': u'comment', u'type': u'string'},
+        {u'name': u'created_at', u'type': u'datetime'},
+    ]
+    rows = [{
+        u'id': i,
+        u'name': u'user' + str(i),
+        u'score': i * 0.5,
+        u'comment': u'hello, "world"',
+        u'created_at': u'2017-06-15T14:25:33',
+    } for i in range(row_count)]
+    return QueryResult({
+        u'id': 1, u'data': {u'columns': columns, u'rows': rows}})
+
+
+def serialize_legacy(data: Dict[str, Any], file_path: str) -> None:
+    u"""以前の実装(文字列連結で全体を組み立ててから書き出す)。"""
+    headers = u''
+    for column_definition in data[u'columns']:
+        headers += column_definition[u'name'] + u','
+    headers = headers[:-1] + linesep
+
+    records = u''
+    for column_values in data[u'rows']:
+        for column_definition in data[u'columns']:
+            column_name = column_definition[u'name']
+            if column_name not in column_values:
+                records += u','
+                continue
+            value = column_values[column_name]
+            if type(value) is str:
+                value = u'"' + value + u'"'
+            records += str(value) + u','
+        records = records[:-1] + linesep
+
+    with open(file_path, u'w') as file:
+        file.write(headers + records)
+
+
+def measure(function: Callable[[], None]) -> Tuple[float, float]:
+    u"""関数の所要時間(秒)と、実行中の最大メモリ使用量(MB)を返す。"""
+    start()
+    begin = perf_counter()
+    function()
+    elapsed = perf_counter() - begin
+    peak = get_traced_memory()[1] / 1024 / 1024
+    stop()
+    return elapsed, peak
+
+
+if __name__ == u'__main__':
+    row_counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+
+    print(u'{0:>9} | {1:>18} | {2:>18}'.format(
+        u'rows', u'before (s / MB)', u'after (s / MB)'))
+    with TemporaryDirectory() as temp_dir:
+        file_path = path.join(temp_dir, u'result.csv')
+        for row_count in row_counts:
+            query_result = make_query_result(row_count)
+            after = measure(
+                lambda: query_result.serialize(file_path, u'csv'))
+            if row_count > LEGACY_MAX_ROWS:
+                print(u'{0:>9} | {1:>18} | {2:7.2f} / {3:8.1f}'.format(
+                    row_count, u'(skipped)', after[0], after[1]))
+                continue
+            before = measure(
+                lambda: serialize_legacy(query_result.data, file_path))
+            print(u'{0:>9} | {1:7.2f} / {2:8.1f} | {3:7.2f} / {4:8.1f}'.format(
+                row_count, before[0], before[1], after[0], after[1]))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+u"""
+Gatewayのコネクション使い回しによる効果を計測するベンチマーク。
+
+ローカルの擬似Redashサーバに対して、以下二つの方式で同じ件数のリクエストを行い、
+1秒あたりのリクエスト数を比較する。
+
+* before: requestsモジュールの関数を直接呼ぶ(リクエスト毎に新しいコネクションを張る)。
+* after : Gateway経由で呼ぶ(ConnectionInfo毎に共有されるSessionを使う)。
+
+実行例:
+    python3 ./benchmarks/bench_gateway_pool.py 2000
+"""
+
+import sys
+from os import path
+from time import perf_counter
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from benchmarks.fake_redash import FakeRedashServer
+from lib.redash_util import ConnectionInfo
+from lib.redash_util.gateway import Gateway, close_all_sessions
+from requests import get
+
+
+def bench_without_pool(con: 'ConnectionInfo', count: int) -> float:
+    u"""リクエスト毎に新しいコネクションを張った場合の、1秒あたりのリクエスト数を返す。"""
+    headers = {u'Authorization': u'Key ' + con.get_api_key()}
+    start = perf_counter()
+    for i in range(count):
+        get(con.get_end_point() + u'/api/jobs/' + str(i), headers=headers)
+    return count / (perf_counter() - start)
+
+
+def bench_with_pool(con: 'ConnectionInfo', count: int) -> float:
+    u"""Gateway経由でコネクションを使い回した場合の、1秒あたりのリクエスト数を返す。"""
+    start = perf_counter()
+    for i in range(count):
+        # Job毎にGatewayが生成される実運用に合わせて、毎回インスタンスを作る。
+        Gateway(con).update_job_status(str(i))
+    return count / (perf_counter() - start)
+
+
+if __name__ == u'__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    server = FakeRedashServer().start()
+    con = ConnectionInfo(server.get_end_point(), u'dummy api key')
+    try:
+        before = bench_without_pool(con, count)
+        after = bench_with_pool(con, count)
+    finally:
+        close_all_sessions()
+        server.stop()
+
+    print(u'requests: ' + str(count))
+    print(u'before (no pool) : {0:8.1f} req/s'.format(before))
+    print(u'after  (pooled)  : {0:8.1f} req/s'.format(after))
+    print(u'speedup          : {0:8.2f} x'.format(after / before))
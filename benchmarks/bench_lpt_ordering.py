@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+u"""
+一括実行の順序による、全体の所要時間(makespan)の違いを比較するシミュレーションベンチマーク。
+
+同時実行数の上限がある場合に、以下の2つの順序でクエリを実行したときの所要時間を比較する。
+  * 検索結果の順(従来の順序)
+  * RuntimeHistoryによる、過去の実行時間の長い順(LPT: Longest Processing Time first)
+
+各クエリの実行時間は対数正規分布(少数の長いクエリが混ざる分布)から生成し、
+過去の実行時間は、実際の実行時間に±noiseの誤差を加えたものとする。
+サーバとは疎通せず、枠が空き次第次のクエリを実行するスケジューリングを計算のみで再現する。
+
+実行例:
+    python3 ./benchmarks/bench_lpt_ordering.py 60 5 0.3 20
+"""
+
+import sys
+from heapq import heapify, heappop, heappush
+from os import path
+from random import Random
+from typing import List
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from lib.redash_util import Query, RuntimeHistory
+
+
+def simulate_makespan(runtimes: List[float], concurrency: int) -> float:
+    u"""
+    実行時間のリストを先頭から順に、同時実行数の上限まで実行した場合の所要時間を返す。
+
+    :param runtimes: 実行する順に並べた、各クエリの実行時間(秒)。
+    :param concurrency: 同時実行数の上限。
+    :return: 最後のクエリが終了するまでの時間(秒)。
+    """
+    # 各枠が空く時刻。
+    slots = [0.0] * concurrency
+    heapify(slots)
+    for runtime in runtimes:
+        heappush(slots, heappop(slots) + runtime)
+    return max(slots)
+
+
+if __name__ == u'__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    noise = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+    trials = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+
+    print(u'queries={} concurrency={} noise=±{:.0%} trials={}'.format(
+        count, concurrency, noise, trials))
+    print(u'{:>5} {:>12} {:>12} {:>12} {:>8}'.format(
+        u'seed', u'search(s)', u'LPT(s)', u'bound(s)', u'speedup'))
+
+    total_search = 0.0
+    total_lpt = 0.0
+    for seed in range(trials):
+        random = Random(seed)
+        runtimes = {
+            query_id: random.lognormvariate(4.0, 1.2)
+            for query_id in range(1, count + 1)}
+
+        # 過去の実行時間(誤差あり)を記録しておく。
+        history = RuntimeHistory()
+        for query_id, runtime in runtimes.items():
+            history.record(
+                query_id, runtime * random.uniform(1.0 - noise, 1.0 + noise))
+
+        pairs = [(Query(query_id), {}) for query_id in runtimes]
+        search_order = [runtimes[query.id] for query, _ in pairs]
+        lpt_order = [
+            runtimes[query.id]
+            for query, _ in history.order_longest_first(pairs)]
+
+        search_makespan = simulate_makespan(search_order, concurrency)
+        lpt_makespan = simulate_makespan(lpt_order, concurrency)
+        # 所要時間の下限(最長のクエリの実行時間か、全体を均等に分けた時間の大きい方)。
+        lower_bound = max(
+            max(runtimes.values()), sum(runtimes.values()) / concurrency)
+
+        total_search += search_makespan
+        total_lpt += lpt_makespan
+        print(u'{:>5} {:>12.1f} {:>12.1f} {:>12.1f} {:>7.2f}x'.format(
+            seed, search_makespan, lpt_makespan, lower_bound,
+            search_makespan / lpt_makespan))
+
+    print(u'average speedup: {:.2f}x'.format(total_search / total_lpt))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+u"""
+クエリ一覧を大量に保持した場合の、メモリ使用量を比較するベンチマーク。
+
+検索APIが返すような、userやvisualizationsなどの深いプロパティを持つ辞書をcount件生成し、
+以下の表現で保持した場合の、保持し続けるメモリ量(tracemallocで計測)を比較する。
+  * legacy: 従来の表現(インスタンス毎の__dictに全プロパティをsetattrし、インスタンス毎にGatewayを持つ)
+  * slots : FIELDSを__slots__に、それ以外のプロパティを一つの辞書に保持し、Gatewayを共有する現在のQuery
+
+実行例:
+    python3 ./benchmarks/bench_model_memory.py 20000
+"""
+
+import sys
+import tracemalloc
+from gc import collect
+from os import path
+from typing import Any, Callable, Dict
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from lib.redash_util import ConnectionInfo, Query
+from lib.redash_util.gateway import Gateway
+
+
+class LegacyQuery:
+    u"""従来のQueryクラスの、プロパティの持ち方だけを再現したクラス。"""
+
+    def __init__(self, query_id: int=0, connection_info=None) -> None:
+        self.id = query_id
+        self.__gateway = Gateway(connection_info)
+        self.query = u''
+        self.name = u''
+        self.__original_query = ''
+        self.__value_bind_flag = False
+
+    def set_properties(self, properties: Dict[str, Any]) -> None:
+        for name, value in properties.items():
+            setattr(self, name, value)
+
+
+def make_properties(query_id: int) -> Dict[str, Any]:
+    u"""検索APIが返す、クエリ1件分のプロパティに似た辞書を生成する。"""
+    return {
+        u'id': query_id,
+        u'name': u'query ' + str(query_id),
+        u'description': u'description of query ' + str(query_id),
+        u'query': u'SELECT * FROM events WHERE id = ' + str(query_id)
+                  + u" AND date = '{{ date }}';",
+        u'query_hash': u'%032x' % query_id,
+        u'data_source_id': query_id % 5 + 1,
+        u'schedule': None,
+        u'options': {u'parameters': []},
+        u'is_archived': False,
+        u'is_draft': False,
+        u'can_edit': True,
+        u'updated_at': u'2017-01-01T00:00:00.000000+00:00',
+        u'created_at': u'2017-01-01T00:00:00.000000+00:00',
+        u'latest_query_data_id': query_id * 10,
+        u'version': 1,
+        u'api_key': u'%040x' % query_id,
+        u'tags': [u'kpi', u'daily'],
+        u'user': {
+            u'id': 1, u'name': u'user', u'email': u'user@example.com',
+            u'gravatar_url': u'https://www.gravatar.com/avatar/' + u'0' * 32,
+            u'groups': [1, 2], u'updated_at': u'2017-01-01T00:00:00',
+        },
+        u'last_modified_by': {
+            u'id': 1, u'name': u'user', u'email': u'user@example.com',
+        },
+        u'visualizations': [
+            {u'id': query_id * 2 + i, u'type': u'TABLE', u'name': u'Table',
+             u'description': u'', u'options': {u'columns': []},
+             u'updated_at': u'2017-01-01T00:00:00'}
+            for i in range(2)
+        ],
+    }
+
+
+def measure(make: Callable[[Dict[str, Any]], Any], count: int) -> int:
+    u"""
+    プロパティの辞書をcount件生成してオブジェクトに変換し、保持し続けるメモリ量(バイト)を返す。
+
+    変換元の辞書は、変換後に破棄する(オブジェクトが参照していなければ解放される)。
+    """
+    collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    objects = [make(make_properties(i)) for i in range(1, count + 1)]
+    collect()
+    retained = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del objects
+    return retained
+
+
+if __name__ == u'__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    con = ConnectionInfo(u'https://dummy.endpoint', u'dummy api key')
+
+    def make_legacy(properties: Dict[str, Any]) -> 'LegacyQuery':
+        query = LegacyQuery(connection_info=con)
+        query.set_properties(properties)
+        return query
+
+    def make_slots(properties: Dict[str, Any]) -> 'Query':
+        query = Query(connection_info=con)
+        query.set_properties(properties)
+        return query
+
+    print(u'queries={}'.format(count))
+    print(u'{:>14} {:>12} {:>14}'.format(
+        u'model', u'total(MB)', u'per query(B)'))
+    results = [
+        (u'legacy', measure(make_legacy, count)),
+        (u'slots', measure(make_slots, count)),
+    ]
+    for name, retained in results:
+        print(u'{:>14} {:>12.2f} {:>14.0f}'.format(
+            name, retained / 1024 / 1024, retained / count))
+    print(u'reduction: {:.1f}x'.format(results[0][1] / results[1][1]))
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+u"""
+QueryResult.serializeの、ファイルフォーマット毎の処理速度と最大メモリ使用量を計測するベンチマーク。
+
+以下の方式で、10k/100k行の結果をファイルに書き出して比較する。
+
+* csv      : QueryResult.serialize(csv)
+* json     : QueryResult.serialize(json)。1行ずつJSON Linesで書き出す。
+* yaml     : QueryResult.serialize(yaml)。1レコードずつYAMLドキュメントとして書き出す。
+* json-doc : 参考。全レコードを一つのJSON配列の文字列に組み立ててから書き出す方式。
+
+実行例:
+    python3 ./benchmarks/bench_result_formats.py 10000 100000
+"""
+
+import sys
+from json import dumps
+from os import path
+from tempfile import TemporaryDirectory
+from typing import Any, Dict
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from benchmarks.bench_csv_serialize import make_query_result, measure
+
+
+def serialize_json_document(data: Dict[str, Any], file_path: str) -> None:
+    u"""全レコードを一つのJSON配列の文字列に組み立ててから書き出す方式。"""
+    column_names = [column[u'name'] for column in data[u'columns']]
+    document = dumps([
+        {name: row.get(name) for name in column_names}
+        for row in data[u'rows']], ensure_ascii=False)
+    with open(file_path, u'w', encoding=u'utf-8') as file:
+        file.write(document)
+
+
+if __name__ == u'__main__':
+    row_counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+
+    print(u'{0:>9} | {1:>8} | {2:>9} | {3:>12} | {4:>9}'.format(
+        u'rows', u'format', u'time(s)', u'rows/s', u'peak(MB)'))
+    with TemporaryDirectory() as temp_dir:
+        for row_count in row_counts:
+            query_result = make_query_result(row_count)
+            cases = [
+                (file_format, lambda file_format=file_format:
+                    query_result.serialize(
+                        path.join(temp_dir, u'result.' + file_format),
+                        file_format))
+                for file_format in (u'csv', u'json', u'yaml')]
+            cases.append((u'json-doc', lambda: serialize_json_document(
+                query_result.data, path.join(temp_dir, u'result.doc.json'))))
+            for name, function in cases:
+                elapsed, peak = measure(function)
+                print(u'{0:>9} | {1:>8} | {2:9.2f} | {3:12.0f} | {4:9.1f}'
+                      .format(row_count, name, elapsed,
+                              row_count / elapsed, peak))
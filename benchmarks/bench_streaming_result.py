@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+u"""
+クエリ結果取得APIのレスポンスを、一括で変換する場合(Job.get_result)と、
+読み込みながら一定行数ずつ変換する場合(Job.stream_result)の、csvシリアライズの所要時間と最大メモリ使用量を比較するベンチマーク。
+
+* json  : レスポンスボディ全体をjson.loadsで変換し、QueryResultを生成してから書き出す。
+* stream: StreamingQueryResultで、batch_size行ずつ変換しながら書き出す。
+
+レスポンスボディ(バイト列)は計測前に生成しておき、いずれの計測にも含めない
+(実際のstream=Trueのレスポンスでは、ボディ全体をメモリに持つこともない)。
+
+実行例:
+    python3 ./benchmarks/bench_streaming_result.py 100000 10000
+"""
+
+import sys
+from json import dumps, loads
+from os import path
+from tempfile import TemporaryDirectory
+from typing import Iterator
+
+lib_path = path.dirname(path.abspath(__file__)) + u'/..'
+if lib_path not in sys.path:
+    sys.path.append(lib_path)
+
+from benchmarks.bench_csv_serialize import make_query_result, measure
+from lib.redash_util import QueryResult, StreamingQueryResult
+
+
+class BodyResponse:
+    u"""生成済みのレスポンスボディを、iter_contentメソッドで少しずつ返すResponseの代わり。"""
+
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+
+    def iter_content(self, chunk_size: int=1) -> Iterator[bytes]:
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+
+if __name__ == u'__main__':
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    # Redashと同様に、キーをソートしたJSONにする(runtimeなどはrowsより後ろになる)。
+    content = dumps({u'query_result': {
+        u'id': 1,
+        u'data': make_query_result(row_count).data,
+        u'runtime': 1.0,
+    }}, sort_keys=True).encode(u'utf-8')
+
+    with TemporaryDirectory() as temp_dir:
+        file_path = path.join(temp_dir, u'result.csv')
+        json_time, json_mb = measure(
+            lambda: QueryResult(
+                loads(content.decode(u'utf-8'))[u'query_result']
+            ).serialize(file_path, u'csv'))
+        with open(file_path, u'rb') as file:
+            expected = file.read()
+
+        stream_time, stream_mb = measure(
+            lambda: StreamingQueryResult(
+                {}, BodyResponse(content), batch_size
+            ).serialize(file_path, u'csv'))
+        with open(file_path, u'rb') as file:
+            assert file.read() == expected
+
+    print(u'rows={} batch_size={} body={:.1f}MB'.format(
+        row_count, batch_size, len(content) / 1024 / 1024))
+    print(u'{0:>7} | {1:>8} | {2:>9}'.format(
+        u'method', u'time(s)', u'peak(MB)'))
+    print(u'{0:>7} | {1:8.2f} | {2:9.1f}'.format(u'json', json_time, json_mb))
+    print(u'{0:>7} | {1:8.2f} | {2:9.1f}'.format(
+        u'stream', stream_time, stream_mb))
+    print(u'peak memory: {:.1f}x smaller'.format(json_mb / stream_mb))
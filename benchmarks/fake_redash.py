@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+u"""
+ベンチマーク用に、ローカルで動作する擬似的なRedashサーバを提供するモジュール。
+
+以下クラスを提供する。
+
+* FakeRedashServer
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from json import dumps
+from re import match
+from socketserver import ThreadingMixIn
+from threading import Thread
+from time import sleep
+from typing import Any, Dict, Tuple
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    u"""リクエスト毎にスレッドを立てて処理するHTTPサーバ。"""
+
+    daemon_threads = True
+
+
+class _FakeRedashHandler(BaseHTTPRequestHandler):
+    u"""Redash APIのうち、このプロジェクトで使うエンドポイントだけを模倣するハンドラ。"""
+
+    # keep-aliveを有効にするため、HTTP/1.1で応答する。
+    protocol_version = u'HTTP/1.1'
+    # ヘッダとボディの書き込みが分かれるため、Nagleアルゴリズムによる遅延を避ける。
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        self.__respond(u'GET')
+
+    def do_POST(self) -> None:
+        self.__respond(u'POST')
+
+    def do_DELETE(self) -> None:
+        self.__respond(u'DELETE')
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # ベンチマーク結果が読みにくくなるため、アクセスログは出力しない。
+        pass
+
+    def __respond(self, method: str) -> None:
+        # リクエストボディは読み捨てる(keep-alive時に次のリクエストと混ざらないように)。
+        length = int(self.headers.get(u'Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        server = self.server
+        server.count_request()
+        if server.latency:
+            sleep(server.latency)
+
+        status, body = server.route(method, self.path.split(u'?')[0])
+        raw = dumps(body).encode(u'utf-8')
+        self.send_response(status)
+        self.send_header(u'Content-Type', u'application/json')
+        self.send_header(u'Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+class FakeRedashServer:
+    u"""
+    ベンチマーク用の、擬似的なRedashサーバ。
+
+    別スレッドでHTTPサーバを起動し、固定のレスポンスを返す。
+    latencyを指定すると、各リクエストの応答前にその秒数だけ待機する(ネットワーク遅延の模倣)。
+    """
+
+    def __init__(self, latency: float=0.0, row_count: int=1) -> None:
+        u"""
+        コンストラクタ。
+
+        :param latency: 各リクエストの応答前に待機する秒数。
+        :param row_count: query_resultsエンドポイントが返す結果の行数。
+        """
+        self.__server = _ThreadingHTTPServer(
+            (u'127.0.0.1', 0), _FakeRedashHandler)
+        self.__server.latency = latency
+        self.__server.row_count = row_count
+        self.__server.request_count = 0
+        self.__server.count_request = self.__count_request
+        self.__server.route = self.__route
+        self.__thread = Thread(target=self.__server.serve_forever)
+        self.__thread.daemon = True
+
+    def start(self) -> 'FakeRedashServer':
+        u"""
+        サーバを起動する。
+
+        :return: このインスタンス。
+        """
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        u"""
+        サーバを停止する。
+
+        :return:
+        """
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def get_end_point(self) -> str:
+        u"""
+        このサーバのエンドポイントを返す。
+
+        :return:
+        """
+        host, port = self.__server.server_address
+        return u'http://' + host + u':' + str(port)
+
+    def get_request_count(self) -> int:
+        u"""
+        このサーバが起動してから受け付けたリクエスト数を返す。
+
+        :return:
+        """
+        return self.__server.request_count
+
+    def __count_request(self) -> None:
+        # 厳密な値は不要なので、ロックは取らない。
+        self.__server.request_count += 1
+
+    def __route(self, method: str, path: str) -> Tuple[int, Any]:
+        u"""
+        リクエストのパスに応じて、ステータスコードとレスポンスボディを返す。
+
+        :param method: HTTPメソッド名。
+        :param path: リクエストのパス。
+        :return: ステータスコードと、JSONに変換する値のタプル。
+        """
+        m = match(r'^/api/queries/(\d+)(/refresh|/fork)?$', path)
+        if m:
+            query_id = int(m.group(1))
+            if m.group(2) == u'/refresh':
+                return 200, {u'job': self.__make_job(query_id)}
+            if method == u'DELETE':
+                return 200, {}
+            return 200, self.__make_query(query_id)
+
+        if path == u'/api/queries/search':
+            return 200, [self.__make_query(i) for i in range(1, 11)]
+        if path == u'/api/queries':
+            return 200, self.__make_query(1)
+
+        m = match(r'^/api/jobs/(.+)$', path)
+        if m:
+            job = self.__make_job(0)
+            job[u'id'] = m.group(1)
+            job[u'status'] = 3
+            job[u'query_result_id'] = 1
+            return 200, {u'job': job}
+
+        m = match(r'^/api/query_results/(\d+)$', path)
+        if m:
+            return 200, {u'query_result': self.__make_query_result(
+                int(m.group(1)))}
+
+        return 404, {u'message': u'not found'}
+
+    def __make_query(self, query_id: int) -> Dict[str, Any]:
+        return {
+            u'id': query_id,
+            u'name': u'query' + str(query_id),
+            u'query': u'SELECT {{ value }} AS value;',
+            u'data_source_id': 1,
+            u'query_hash': u'hash' + str(query_id),
+            u'updated_at': u'2017-06-15T14:25:33.216603+09:00',
+        }
+
+    def __make_job(self, query_id: int) -> Dict[str, Any]:
+        return {
+            u'id': u'job-' + str(query_id),
+            u'status': 1,
+            u'query_result_id': None,
+            u'error': u'',
+            u'updated_at': 0,
+        }
+
+    def __make_query_result(self, query_result_id: int) -> Dict[str, Any]:
+        rows = []
+        for i in range(self.__server.row_count):
+            rows.append({u'id': i, u'name': u'name' + str(i)})
+        return {
+            u'id': query_result_id,
+            u'data_source_id': 1,
+            u'query': u'SELECT id, name FROM sample_table;',
+            u'query_hash': u'hash',
+            u'retrieved_at': u'2017-06-15T14:25:33.216603+09:00',
+            u'runtime': 0.1,
+            u'data': {
+                u'columns': [
+                    {u'name': u'id', u'friendly_name': u'id',
+                     u'type': u'integer'},
+                    {u'name': u'name', u'friendly_name': u'name',
+                     u'type': u'string'},
+                ],
+                u'rows': rows,
+            },
+        }
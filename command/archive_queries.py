@@ -11,4 +11,5 @@ if lib_path not in sys.path:
 from lib.command import ArchiveQueriesCommand
 
 command = ArchiveQueriesCommand(sys.argv[1:])
+command.setup_logging()
 command.execute()
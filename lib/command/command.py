@@ -9,15 +9,30 @@ u"""
 """
 
 from argparse import ArgumentParser, Namespace
-from os import linesep
+from asyncio import get_event_loop
+from datetime import date, datetime, timedelta
+from logging import FileHandler, Formatter, INFO, StreamHandler, getLogger
+from os import linesep, makedirs
 from os.path import dirname, join
-from re import compile
-from typing import Any, Dict, List
+from re import compile, sub
+from typing import Any, Awaitable, Dict, List, Tuple, TYPE_CHECKING
 
-from lib.redash_util import ConnectionInfo, JobManager, QueryList
+from lib.redash_util import \
+    ConnectionInfo, ExecutionJournal, Job, JobManager, JobScheduler, \
+    JobStatus, QueryCatalog, QueryList, QueryResult, ResultCache, \
+    RetryPolicy, RuntimeHistory
+from lib.redash_util.compression import check_compression, split_compression
+
+from requests import RequestException
 
 from yaml import load
 
+if TYPE_CHECKING:
+    from lib.redash_util import Query
+
+
+logger = getLogger(__name__)
+
 
 def parse_parameter_string(parameter_string: str) -> Dict[str, Any]:
     u"""
@@ -56,6 +71,73 @@ def parse_parameter_string(parameter_string: str) -> Dict[str, Any]:
     return parameters_dict
 
 
+def parse_source_limits(limits_string: str) -> Dict[int, int]:
+    u"""
+    データソース毎の同時実行数の上限を表す文字列をパースして、辞書形式で返す。
+
+    :param limits_string: data_source_idと上限を、コロンとカンマで連結した文字列。
+                          ex) '1:2, 5:10'
+    :return: data_source_idと上限の辞書。
+             ex) {1: 2, 5: 10}
+    """
+    return {
+        int(key): int(value)
+        for key, value in parse_parameter_string(limits_string).items()}
+
+
+def parse_date(date_string: str) -> 'date':
+    u"""
+    日付を表す文字列をパースして、dateオブジェクトとして返す。
+
+    :param date_string: 'YYYY-MM-DD'形式の文字列。
+    :return: dateオブジェクト。形式が不正な場合、ValueErrorを送出する。
+    """
+    return datetime.strptime(date_string.strip(), u'%Y-%m-%d').date()
+
+
+def make_daily_parameter_sets(
+    start: 'date', end: 'date', start_key: str, end_key: str
+) -> List[Dict[str, str]]:
+    u"""
+    日付の範囲を一日ずつに区切った、クエリパラメータの辞書のリストを返す。
+
+    :param start: 範囲の開始日(この日を含む)。
+    :param end: 範囲の終了日(この日を含まない)。
+    :param start_key: 各日の開始日をバインドするクエリパラメータのキー。
+    :param end_key: 各日の終了日(翌日)をバインドするクエリパラメータのキー。
+    :return: 各パラメータ情報を表す辞書のリスト。
+             ex) start=2017-01-01, end=2017-01-03の場合
+                 [{'start_date': '2017-01-01', 'end_date': '2017-01-02'},
+                  {'start_date': '2017-01-02', 'end_date': '2017-01-03'}]
+    """
+    if end <= start:
+        raise ValueError()
+
+    parameter_sets = []
+    day = start
+    while day < end:
+        next_day = day + timedelta(days=1)
+        parameter_sets.append({
+            start_key: day.isoformat(),
+            end_key: next_day.isoformat(),
+        })
+        day = next_day
+    return parameter_sets
+
+
+def make_parameter_label(parameters: Dict[str, str]) -> str:
+    u"""
+    クエリパラメータを表す辞書から、ディレクトリ名などに使えるラベル文字列を生成する。
+
+    :param parameters: 各パラメータ情報を表す辞書。
+    :return: キーの昇順に'キー=値'をアンダースコアで連結し、記号を置換した文字列。
+             ex) 'end_date=2017-01-02_start_date=2017-01-01'
+    """
+    label = u'_'.join(
+        key + u'=' + str(parameters[key]) for key in sorted(parameters))
+    return sub(r'[^\w.=-]+', u'_', label)
+
+
 def parse_file_format(file_format: str) -> str:
     u"""
     ファイル拡張子を表す文字列の形式チェック & 先頭のカンマ部分の削除を行う。
@@ -63,15 +145,18 @@ def parse_file_format(file_format: str) -> str:
     :param file_format: ファイルの拡張子。
     :return: ファイルの拡張子。
              先頭にカンマが付与されていた場合、削除する。
-             また、期待する拡張子以外を文字列を指定した場合、ValueErrorを送出する。
+             csv.gzのように、末尾に圧縮形式の拡張子(gz、zst)を付けてもよい。
+             また、期待する拡張子以外を文字列を指定した場合(圧縮形式が使えない場合も含む)、ValueErrorを送出する。
     """
     r = compile(r'^(\.?)(.+)$')
     m = r.search(file_format)
 
     if not m:
         raise ValueError()
-    if m.group(2) not in [u'csv', u'json', u'yml', u'yaml']:
+    base_format, compression = split_compression(m.group(2))
+    if base_format not in QueryResult.FILE_FORMATS:
         raise ValueError()
+    check_compression(compression)
 
     return m.group(2)
 
@@ -125,8 +210,15 @@ class BaseCommand:
 
         # 委譲で保持しておくべきインスタンスを生成する。
         self.connection_info\
-            = ConnectionInfo(self.ns.end_point, self.ns.api_key)
-        self.query_list = QueryList(self.connection_info)
+            = ConnectionInfo(
+                self.ns.end_point, self.ns.api_key, self.ns.pool_size,
+                RetryPolicy(max_attempts=self.ns.max_attempts),
+                self.ns.rate_limit)
+        self.catalog = None
+        if self.ns.catalog:
+            self.catalog = QueryCatalog(
+                self.ns.catalog, self.connection_info, self.ns.catalog_max_age)
+        self.query_list = QueryList(self.connection_info, self.catalog)
         self.job_manager = JobManager()
 
         # インスタンス生成後のフック処理を実施する。
@@ -197,6 +289,58 @@ class BaseCommand:
                  + u'省略した場合、/tmpディレクトリ以下にログが出力されます。',
             dest=u'log_dir',
         )
+        self.parser.add_argument(
+            u'--pool-size',
+            type=int,
+            default=ConnectionInfo.DEFAULT_POOL_SIZE,
+            help=u'サーバとのHTTPコネクションプールのサイズを指定します。'
+                 + linesep
+                 + u'省略した場合、'
+                 + str(ConnectionInfo.DEFAULT_POOL_SIZE)
+                 + u'になります。',
+            dest=u'pool_size',
+        )
+        self.parser.add_argument(
+            u'--max-attempts',
+            type=int,
+            default=RetryPolicy().max_attempts,
+            help=u'一時的なエラー(429や502など)で失敗したリクエストを、再試行も含めて試みる回数の上限を指定します。'
+                 + linesep
+                 + u'クエリ実行などの冪等でないリクエストは、サーバが処理していないことが明らかな場合だけ再試行します。'
+                 + linesep
+                 + u'省略した場合、'
+                 + str(RetryPolicy().max_attempts)
+                 + u'回になります(1の場合は再試行しません)。',
+            dest=u'max_attempts',
+        )
+        self.parser.add_argument(
+            u'--rate-limit',
+            type=float,
+            default=0,
+            help=u'サーバへのリクエストの、1秒あたりの件数の上限を指定します。'
+                 + linesep
+                 + u'省略した場合(0の場合)、制限しません。',
+            dest=u'rate_limit',
+        )
+        self.parser.add_argument(
+            u'--catalog',
+            help=u'クエリ一覧をキャッシュするSQLiteファイルのパスを指定します。'
+                 + linesep
+                 + u'指定した場合、search-textによる検索をサーバではなくキャッシュに対して行い、'
+                 + u'キャッシュが古い場合のみサーバと差分同期します。',
+            dest=u'catalog',
+        )
+        self.parser.add_argument(
+            u'--catalog-max-age',
+            type=float,
+            default=QueryCatalog.DEFAULT_MAX_AGE,
+            help=u'--catalogのキャッシュを、同期せずに使う期間(秒)を指定します。'
+                 + linesep
+                 + u'省略した場合、'
+                 + str(QueryCatalog.DEFAULT_MAX_AGE)
+                 + u'秒になります。',
+            dest=u'catalog_max_age',
+        )
 
     def load_connection_info_from_yaml(self) -> None:
         u"""
@@ -226,6 +370,34 @@ class BaseCommand:
         """
         pass
 
+    def setup_logging(self) -> None:
+        u"""
+        ログを、標準エラー出力と、--log-dirで指定したディレクトリ以下のファイルに出力するよう設定する。
+
+        ログファイル名は、「(コマンド名).log」となる。
+        :return:
+        """
+        makedirs(self.ns.log_dir, exist_ok=True)
+        log_file = join(
+            self.ns.log_dir, self.parser.prog.replace(u'.py', u'.log'))
+
+        formatter = Formatter(
+            u'%(asctime)s %(levelname)s %(name)s: %(message)s')
+        root_logger = getLogger()
+        root_logger.setLevel(INFO)
+        for handler in [StreamHandler(), FileHandler(log_file)]:
+            handler.setFormatter(formatter)
+            root_logger.addHandler(handler)
+
+    def run_until_complete(self, coroutine: Awaitable[Any]) -> Any:
+        u"""
+        コルーチンを、イベントループ上で完了するまで実行する。
+
+        :param coroutine: 実行するコルーチン。
+        :return: コルーチンの戻り値。
+        """
+        return get_event_loop().run_until_complete(coroutine)
+
 
 class ExecuteQueriesCommand(BaseCommand):
     u"""execute_queriesコマンドに対応する処理を行うクラス。"""
@@ -263,36 +435,554 @@ class ExecuteQueriesCommand(BaseCommand):
                  + u'\'start_date:2017-01-01, end_date:2017-02-01\'',
             dest=u'parameters'
         )
+        self.parser.add_argument(
+            u'--max-in-flight',
+            type=int,
+            default=None,
+            help=u'ジョブの状態を更新する際に、同時に行うリクエスト数の上限を指定します。'
+                 + linesep
+                 + u'省略した場合、--pool-sizeと同じ値になります。',
+            dest=u'max_in_flight'
+        )
+
+        self.parser.add_argument(
+            u'--deadline',
+            type=float,
+            default=None,
+            help=u'全てのジョブの終了を待機する時間の上限(秒)を指定します。'
+                 + linesep
+                 + u'上限を過ぎた場合、その時点で成功しているジョブの結果だけを出力します。',
+            dest=u'deadline'
+        )
+        self.parser.add_argument(
+            u'--job-timeout',
+            type=float,
+            default=None,
+            help=u'ジョブ毎に、発行してから終了するまでの時間の上限(秒)を指定します。'
+                 + linesep
+                 + u'上限を過ぎたジョブはkillし、他のジョブの結果の出力を続けます。',
+            dest=u'job_timeout'
+        )
+        self.parser.add_argument(
+            u'--total-timeout',
+            type=float,
+            default=None,
+            help=u'全てのジョブの終了を待機する時間の上限(秒)を指定します。'
+                 + linesep
+                 + u'--deadlineと異なり、上限を過ぎた時点で終わっていないジョブを全てkillします。',
+            dest=u'total_timeout'
+        )
+        self.parser.add_argument(
+            u'--timeout-retries',
+            type=int,
+            default=0,
+            help=u'--job-timeoutで時間切れになったジョブを、間隔を空けて再実行する回数を指定します。'
+                 + linesep
+                 + u'省略した場合(0の場合)、再実行しません。',
+            dest=u'timeout_retries'
+        )
+        self.parser.add_argument(
+            u'--direct-download',
+            action=u'store_true',
+            help=u'Redash側でcsvに変換された結果を、そのままファイルに書き出します。'
+                 + linesep
+                 + u'結果をPython上で変換しないため、結果のサイズによらずメモリ使用量は一定になります'
+                 + u'(file-formatがcsvの場合のみ指定できます)。',
+            dest=u'direct_download'
+        )
+        self.parser.add_argument(
+            u'--compression-level',
+            type=int,
+            default=None,
+            help=u'file-formatにcsv.gzのような圧縮形式を指定した場合の、圧縮レベルを指定します。'
+                 + linesep
+                 + u'省略した場合、gzipは6、zstdは3になります。',
+            dest=u'compression_level'
+        )
+        self.parser.add_argument(
+            u'--background-compression',
+            action=u'store_true',
+            help=u'結果の圧縮とファイルへの書き出しを別スレッドで行い、結果の変換と並行させます。',
+            dest=u'background_compression'
+        )
+        self.parser.add_argument(
+            u'--stream-batch-size',
+            type=int,
+            default=None,
+            help=u'Redashから結果を読み込みながら、指定した行数ずつ変換してファイルに書き出します。'
+                 + linesep
+                 + u'結果全体を一度にPython上のオブジェクトに変換しないため、'
+                 + u'メモリ使用量はおよそ指定した行数分で一定になります(書き出した結果はキャッシュしません)。',
+            dest=u'stream_batch_size'
+        )
+
+        self.parser.add_argument(
+            u'--sweep-days',
+            nargs=2,
+            type=parse_date,
+            metavar=(u'FROM', u'TO'),
+            help=u'FROM(この日を含む)からTO(この日を含まない)までを一日ずつに区切り、'
+                 + u'各日についてクエリをまとめて実行します。'
+                 + linesep
+                 + u'各日の開始日・終了日は、--sweep-keysで指定したクエリパラメータにバインドされます。'
+                 + linesep
+                 + u'結果は、output-dir以下のパラメータ毎のディレクトリに出力します。',
+            dest=u'sweep_days'
+        )
+        self.parser.add_argument(
+            u'--sweep-keys',
+            nargs=2,
+            default=[u'start_date', u'end_date'],
+            metavar=(u'START_KEY', u'END_KEY'),
+            help=u'--sweep-daysで、各日の開始日・終了日をバインドするクエリパラメータのキーを指定します。'
+                 + linesep
+                 + u'省略した場合、start_dateとend_dateになります。',
+            dest=u'sweep_keys'
+        )
+        self.parser.add_argument(
+            u'--sweep-file',
+            help=u'クエリパラメータの辞書のリストを記載したYAML(またはJSON)ファイルを指定し、'
+                 + u'各パラメータについてクエリをまとめて実行します。'
+                 + linesep
+                 + u'結果は、output-dir以下のパラメータ毎のディレクトリに出力します。',
+            dest=u'sweep_file'
+        )
+
+        self.parser.add_argument(
+            u'--max-in-flight-per-source',
+            type=int,
+            default=0,
+            help=u'データソース毎に、同時に実行するジョブ数の上限を指定します。'
+                 + linesep
+                 + u'上限を超えたクエリはデータソース毎のキューで待機し、ジョブが終了して枠が空き次第実行します。'
+                 + linesep
+                 + u'省略した場合(0の場合)、全てのクエリを一度に実行します。',
+            dest=u'max_in_flight_per_source'
+        )
+        self.parser.add_argument(
+            u'--source-limits',
+            type=parse_source_limits,
+            default={},
+            help=u'データソース毎に、--max-in-flight-per-sourceとは異なる上限を指定します。'
+                 + u'以下のような形式で指定します(data_source_id:上限)。'
+                 + linesep
+                 + u'\'1:2, 5:10\'',
+            dest=u'source_limits'
+        )
+
+        self.parser.add_argument(
+            u'--runtime-history',
+            help=u'クエリ毎の過去の実行時間を記録するJSONファイルのパスを指定します。'
+                 + linesep
+                 + u'指定した場合、過去の実行時間が長いクエリから順に実行し、今回の実行時間を記録します。',
+            dest=u'runtime_history'
+        )
+
+        self.parser.add_argument(
+            u'--journal',
+            default=None,
+            help=u'実行の進捗(発行したジョブのidや、書き出したファイル)を記録するファイルのパスを指定します。'
+                 + linesep
+                 + u'省略した場合、進捗は記録しません(--resumeで再開できません)。',
+            dest=u'journal'
+        )
+        self.parser.add_argument(
+            u'--resume',
+            action=u'store_true',
+            help=u'前回の実行が--journalのファイルに残した進捗の記録を読み込み、続きから再開します。'
+                 + linesep
+                 + u'結果を書き出し済みのクエリは実行せず、実行中だったジョブは終了を待ち、残りのクエリだけを実行します。',
+            dest=u'resume'
+        )
+
+        self.parser.add_argument(
+            u'--max-age',
+            type=float,
+            default=None,
+            help=u'指定した秒数以内に実行した結果がローカルのキャッシュにあれば、'
+                 + u'クエリを実行せずにその結果を出力します。'
+                 + linesep
+                 + u'キャッシュのキーは、クエリのSQLのハッシュ値とバインドしたパラメータです'
+                 + u'(--direct-download・--stream-batch-sizeで書き出した結果は'
+                 + u'キャッシュしません)。',
+            dest=u'max_age'
+        )
+        self.parser.add_argument(
+            u'--server-max-age',
+            type=int,
+            default=0,
+            help=u'指定した秒数以内の実行結果がRedashサーバ上にあれば、'
+                 + u'バックエンドでクエリを再実行せずにその結果を使います。'
+                 + linesep
+                 + u'省略した場合(0の場合)、必ずクエリを再実行します。',
+            dest=u'server_max_age'
+        )
+        self.parser.add_argument(
+            u'--result-cache-dir',
+            default=u'/tmp/redash_result_cache',
+            help=u'--max-ageで使うキャッシュの保存先を指定します。'
+                 + linesep
+                 + u'省略した場合、/tmp/redash_result_cacheになります。',
+            dest=u'result_cache_dir'
+        )
+        self.parser.add_argument(
+            u'--result-cache-size',
+            type=int,
+            default=ResultCache.DEFAULT_MAX_BYTES // (1024 * 1024),
+            help=u'--max-ageで使うキャッシュの合計サイズの上限(MB)を指定します。'
+                 + linesep
+                 + u'上限を超えた場合は、最後に使った日時が古い結果から削除します。',
+            dest=u'result_cache_size'
+        )
+
+    def after_init(self) -> None:
+        if self.ns.direct_download and self.ns.file_format != u'csv':
+            self.parser.error(
+                u'--direct-download can only be used with csv format.')
+        if self.ns.stream_batch_size is not None \
+                and self.ns.stream_batch_size < 1:
+            self.parser.error(u'--stream-batch-size must be positive.')
+        if self.ns.resume and self.ns.journal is None:
+            self.parser.error(u'--resume requires --journal.')
+        # 省略した場合は、コネクションプールのサイズに合わせる(JobSchedulerのconcurrencyと同様)。
+        self.job_manager.set_max_in_flight(
+            self.ns.pool_size if self.ns.max_in_flight is None
+            else self.ns.max_in_flight)
+        self.job_manager.set_timeouts(
+            self.ns.job_timeout,
+            self.ns.total_timeout,
+            self.ns.timeout_retries)
+
+        if self.ns.runtime_history:
+            self.job_manager.set_runtime_history(
+                RuntimeHistory(self.ns.runtime_history))
+
+        self.result_cache = None
+        if self.ns.max_age is not None:
+            self.result_cache = ResultCache(
+                self.ns.result_cache_dir,
+                self.ns.max_age,
+                self.ns.result_cache_size * 1024 * 1024)
+        # 実行中の(クエリのid, パラメータのラベル)と、キャッシュのキーの対応。
+        self.__cache_keys = {}
+
+        self.scheduler = None
+        if self.ns.max_in_flight_per_source > 0:
+            self.scheduler = JobScheduler(
+                self.job_manager,
+                self.ns.max_in_flight_per_source,
+                self.ns.source_limits,
+                self.ns.pool_size,
+                self.ns.server_max_age)
 
     def execute(self) -> None:
         # 検索条件に合致するクエリを探し、QueryListにセットする。
         self.query_list.search_queries_by(self.ns.search_text)
+        if self.catalog is not None:
+            self.__reread_catalog_queries()
+
+        # --journalの場合は、発行したジョブや書き出したファイルを記録する。
+        # (--resumeの場合は、前回の記録を読み込み、続けて記録する。)
+        self.journal = None
+        if self.ns.journal is not None:
+            self.journal = ExecutionJournal(self.ns.journal, self.ns.resume)
+            if self.scheduler is not None:
+                self.scheduler.set_submit_listener(
+                    self.journal.record_submitted)
+
+        # 全てのクエリを、並行して実行する。
+        # パラメータが指定された場合は、値をバインドしたSQLを実行リクエストに含めて送るため、
+        # サーバ上のクエリは書き換えない。
+        # また、スイープ実行の場合は、全ての(クエリ, パラメータ)の組み合わせをまとめて実行する。
+        parameter_sets = self.__make_parameter_sets()
+        job_list = []
+        history = self.job_manager.get_runtime_history()
+        if self.result_cache is not None or self.scheduler is not None \
+                or history is not None or self.ns.resume:
+            # 再開する場合は、書き出し済みの組み合わせを除き、実行中だったジョブの終了を待つ。
+            # キャッシュ済みの結果はそのまま出力し、残りの組み合わせだけを実行する。
+            # データソース毎の同時実行数を制限する場合は、スケジューラのキューに積み、
+            # 結果の待ち受けと並行して、枠が空き次第実行する。
+            # 過去の実行時間の記録がある場合は、実行時間の長いクエリから実行する。
+            query_and_parameters = [
+                (query, parameters)
+                for parameters in parameter_sets or [self.ns.parameters or {}]
+                for query in self.query_list.get_queries()]
+            if self.ns.resume:
+                query_and_parameters = self.__resume(query_and_parameters)
+            query_and_parameters = self.__filter_uncached(
+                query_and_parameters)
+            if history is not None:
+                query_and_parameters = history.order_longest_first(
+                    query_and_parameters)
+            if self.scheduler is not None:
+                self.scheduler.add(query_and_parameters)
+            else:
+                job_list = self.run_until_complete(
+                    self.query_list.async_execute_each(
+                        query_and_parameters,
+                        max_age=self.ns.server_max_age))
+        elif parameter_sets:
+            job_list = self.run_until_complete(
+                self.query_list.async_execute_sweep(
+                    parameter_sets, max_age=self.ns.server_max_age))
+        elif self.ns.parameters:
+            job_list = self.run_until_complete(
+                self.query_list.async_execute_with_in_bulk(
+                    self.ns.parameters, max_age=self.ns.server_max_age))
+        else:
+            job_list = self.run_until_complete(
+                self.query_list.async_execute_in_bulk(
+                    max_age=self.ns.server_max_age))
+
+        # ジョブが成功した順に、対応するQueryResultオブジェクトを指定のファイルにシリアライズする。
+        # (全てのジョブが終了するか、上限時間を過ぎるまで続ける。)
+        if self.journal is not None:
+            for job in job_list:
+                self.journal.record_submitted(job)
+        self.job_manager.add(job_list)
+        waiter = self.scheduler or self.job_manager
+        if self.ns.direct_download:
+            # サーバ側で変換済みのcsvを、そのままファイルに書き出す。
+            for job in waiter.iter_finished_jobs(self.ns.deadline):
+                output_path = self.__make_output_path(
+                    job.get_query_name(), job.get_parameters())
+                if job.download_result(output_path, self.ns.file_format):
+                    self.__record_written(
+                        job.query_id, job.get_parameters(), output_path)
+        else:
+            # --stream-batch-sizeの場合は、結果を読み込みながら指定の行数ずつ書き出す。
+            for result in waiter.iter_completed(
+                    self.ns.deadline, batch_size=self.ns.stream_batch_size):
+                output_path = self.__make_output_path(
+                    result.get_query_name(), result.get_parameters())
+                self.__serialize(result, output_path)
+                self.__record_written(
+                    result.get_query_id(), result.get_parameters(),
+                    output_path)
+                if self.ns.stream_batch_size is None:
+                    self.__put_result_cache(result)
+
+        if self.journal is not None:
+            for job in self.job_manager.get_jobs(JobStatus.failure) \
+                    + self.job_manager.get_jobs(JobStatus.timeout):
+                self.journal.record_finished(job)
+            self.journal.close()
+
+        for job in self.job_manager.get_jobs(JobStatus.timeout):
+            # killしても、データソースによってはクエリが実行され続けている可能性がある。
+            logger.warning(
+                u'%s %s: %s',
+                job.get_query_name(),
+                make_parameter_label(job.get_parameters()),
+                job.error)
+        if not self.job_manager.finished():
+            logger.warning(
+                u'deadline exceeded: %d job(s) are still running.',
+                self.job_manager.count(JobStatus.pending)
+                + self.job_manager.count(JobStatus.running))
+        if self.scheduler is not None:
+            if self.scheduler.count_queued():
+                logger.warning(
+                    u'deadline exceeded: %d query(s) were not executed.',
+                    self.scheduler.count_queued())
+            for stats in self.scheduler.get_stats().values():
+                logger.info(u'data source stats: %s', stats)
+        logger.info(
+            u'poll requests: %d', self.job_manager.get_poll_count())
+
+        if history is not None:
+            history.save()
+
+    def __reread_catalog_queries(self) -> None:
+        u"""
+        --catalogで検索したクエリを、実行する前にサーバから読み直す。
 
-        # クエリのパラメータ部分に実際の変数をバインドして、サーバ上のクエリを更新する。
-        if self.ns.parameters:
-            self.query_list.bind_values_in_bulk(self.ns.parameters)
-            self.query_list.update_in_bulk()
+        キャッシュのSQLは、最大で--catalog-max-age秒古い可能性があるため、最新のSQLで実行する。
+        読み直した時点でアーカイブ済みのクエリは、実行せずにキャッシュからも除く。
+        :return:
+        """
+        self.run_until_complete(
+            self.query_list.async_read_in_bulk(self.ns.pool_size))
+        archived = self.query_list.remove_archived()
+        if archived:
+            self.catalog.remove(query.id for query in archived)
+            logger.info(u'skipped %d archived query(s)', len(archived))
+
+    def __resume(
+        self, query_and_parameters: List[Tuple['Query', Dict[str, str]]]
+    ) -> List[Tuple['Query', Dict[str, str]]]:
+        u"""
+        前回の実行の記録から、書き出し済みの組み合わせを除き、実行中だったジョブをJobManagerに登録し直す。
 
-        # 全てのクエリを実行する。
-        job_list = self.query_list.execute_in_bulk()
+        実行中だったジョブは、サーバと疎通して状態を更新し、実行中か成功していた場合だけ終了を待つ。
+        待機中のままのジョブは再実行する(Redashは、期限切れや未知のジョブのidにも待機中を返すため、
+        そのまま待つと終了しない可能性がある)。失敗していた(または状態を取得できなかった)場合も再実行する。
+        :param query_and_parameters: Queryオブジェクトと、クエリパラメータの辞書の組のリスト。
+        :return: 新たに実行する必要がある(クエリ, パラメータ)の組のリスト。
+        """
+        remaining = []
+        resumed_jobs = []
+        written_count = 0
+        for query, parameters in query_and_parameters:
+            if self.journal.is_written(query.id, parameters):
+                written_count += 1
+                continue
+
+            job_id = self.journal.get_running_job_id(query.id, parameters)
+            if job_id is None:
+                remaining.append((query, parameters))
+                continue
+
+            job = Job(
+                job_id=job_id,
+                query_id=query.id,
+                connection_info=self.connection_info,
+                query_name=query.name,
+                parameters=parameters,
+                query=query)
+            try:
+                job.update()
+            except RequestException as e:
+                logger.warning(
+                    u'could not resume the job %s: %s', job_id, e)
+                remaining.append((query, parameters))
+                continue
+            if job.get_status() in (JobStatus.running, JobStatus.success):
+                resumed_jobs.append(job)
+            else:
+                remaining.append((query, parameters))
+
+        self.job_manager.add(resumed_jobs)
+        logger.info(
+            u'resume: %d written, %d job(s) resumed, %d to execute',
+            written_count, len(resumed_jobs), len(remaining))
+        return remaining
+
+    def __filter_uncached(
+        self, query_and_parameters: List[Tuple['Query', Dict[str, str]]]
+    ) -> List[Tuple['Query', Dict[str, str]]]:
+        u"""
+        各(クエリ, パラメータ)の組み合わせのうち、キャッシュに新鮮な結果があるものは、その結果をそのまま出力する。
 
-        # バインドしたクエリを元に戻す。
-        if self.ns.parameters:
-            self.query_list.unbind_values_in_bulk()
-            self.query_list.update_in_bulk()
+        :param query_and_parameters: Queryオブジェクトと、クエリパラメータの辞書の組のリスト。
+        :return: 実行する必要がある(クエリ, パラメータ)の組のリスト。
+        """
+        if self.result_cache is None:
+            return query_and_parameters
+
+        uncached = []
+        for query, parameters in query_and_parameters:
+            key = ResultCache.make_key(query, parameters)
+            result = self.result_cache.get(key)
+            if result is None:
+                uncached.append((query, parameters))
+                self.__cache_keys[
+                    (query.id, make_parameter_label(parameters))] = key
+            else:
+                output_path = self.__make_output_path(query.name, parameters)
+                self.__serialize(result, output_path)
+                self.__record_written(query.id, parameters, output_path)
+
+        logger.info(
+            u'result cache: %d hit(s), %d miss(es)',
+            len(query_and_parameters) - len(uncached), len(uncached))
+        return uncached
+
+    def __serialize(self, result: 'QueryResult', output_path: str) -> None:
+        u"""
+        クエリの実行結果を、指定したファイルフォーマット・圧縮レベルでファイルに書き出す。
 
-        # 全てのジョブの状態を更新する。
-        self.job_manager.add(job_list)
-        while not self.job_manager.finished():
-            self.job_manager.update()
+        :param result: クエリの実行結果。
+        :param output_path: 出力先のファイルのパス。
+        :return:
+        """
+        result.serialize(
+            output_path,
+            self.ns.file_format,
+            compression_level=self.ns.compression_level,
+            background=self.ns.background_compression)
+
+    def __record_written(
+        self, query_id: int, parameters: Dict[str, str], output_path: str
+    ) -> None:
+        u"""
+        --journalが指定されている場合に、クエリの実行結果を書き出したことを記録する。
 
-        # ジョブと対応するQueryResultオブジェクト配列を、指定のファイルにシリアライズする。
-        result_list = self.job_manager.get_query_result_list()
-        for result in result_list:
-            output_path = join(
-                self.ns.output_dir,
-                result.get_query_name() + u'.' + self.ns.file_format)
-            result.serialize(output_path, self.ns.file_format)
+        :param query_id: クエリのid。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータ。
+        :param output_path: 書き出したファイルのパス。
+        :return:
+        """
+        if self.journal is not None:
+            self.journal.record_written(query_id, parameters, output_path)
+
+    def __put_result_cache(self, result: 'QueryResult') -> None:
+        u"""
+        --max-ageが指定されている場合に、ジョブが成功した結果をキャッシュに書き込む。
+
+        :param result: クエリの実行結果。
+        :return:
+        """
+        key = self.__cache_keys.get(
+            (result.get_query_id(),
+             make_parameter_label(result.get_parameters())))
+        if key is not None:
+            self.result_cache.put(key, result)
+
+    def __is_sweep(self) -> bool:
+        u"""
+        スイープ実行(複数のパラメータの組み合わせでの実行)かどうかを返す。
+
+        :return:
+        """
+        return bool(self.ns.sweep_days or self.ns.sweep_file)
+
+    def __make_parameter_sets(self) -> List[Dict[str, str]]:
+        u"""
+        スイープ実行で使う、クエリパラメータの辞書のリストを生成する。
+
+        -pで指定したパラメータは、全ての組み合わせに共通して適用する(キーが重複した場合はスイープ側を優先)。
+        :return: 各パラメータ情報を表す辞書のリスト。スイープ実行でない場合は空のリスト。
+        """
+        if not self.__is_sweep():
+            return []
+
+        sweep_sets = []
+        if self.ns.sweep_file:
+            with open(self.ns.sweep_file, u'r') as file:
+                for parameters in load(file):
+                    sweep_sets.append(
+                        {key: str(value) for key, value in parameters.items()})
+        if self.ns.sweep_days:
+            start_key, end_key = self.ns.sweep_keys
+            sweep_sets += make_daily_parameter_sets(
+                self.ns.sweep_days[0], self.ns.sweep_days[1],
+                start_key, end_key)
+
+        parameter_sets = []
+        for sweep_set in sweep_sets:
+            parameters = dict(self.ns.parameters or {})
+            parameters.update(sweep_set)
+            parameter_sets.append(parameters)
+        return parameter_sets
+
+    def __make_output_path(
+        self, query_name: str, parameters: Dict[str, str]
+    ) -> str:
+        u"""
+        クエリ名から、結果を出力するファイルのパスを生成する。
+
+        スイープ実行の場合は、output_dir以下にパラメータ毎のディレクトリを作成し、その中に出力する。
+        :param query_name: クエリ名。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータ。
+        :return: 出力先のファイルのパス。
+        """
+        output_dir = self.ns.output_dir
+        if self.__is_sweep():
+            output_dir = join(output_dir, make_parameter_label(parameters))
+            makedirs(output_dir, exist_ok=True)
+        return join(output_dir, query_name + u'.' + self.ns.file_format)
 
 
 class ArchiveQueriesCommand(BaseCommand):
@@ -308,8 +998,13 @@ class ArchiveQueriesCommand(BaseCommand):
         # 検索条件に合致するクエリを探し、QueryListにセットする。
         self.query_list.search_queries_by(self.ns.search_text)
 
-        # 全てのクエリをアーカイブする。
-        self.query_list.archive_in_bulk()
+        # 全てのクエリを、並行してアーカイブする。
+        self.run_until_complete(self.query_list.async_archive_in_bulk())
+
+        # アーカイブしたクエリは、次回以降の検索対象にならないよう、キャッシュから除く。
+        if self.catalog is not None:
+            self.catalog.remove(
+                query.id for query in self.query_list.get_queries())
 
 
 class ForkQueriesCommand(BaseCommand):
@@ -335,8 +1030,9 @@ class ForkQueriesCommand(BaseCommand):
         # 検索条件に合致するクエリを探し、QueryListにセットする。
         self.query_list.search_queries_by(self.ns.search_text)
 
-        # 全てのクエリをフォークする。
-        fork_queries = self.query_list.fork_in_bulk()
+        # 全てのクエリを、並行してフォークする。
+        fork_queries = self.run_until_complete(
+            self.query_list.async_fork_in_bulk())
 
         # フォークしたクエリを、新規のQueryListインスタンスに格納する。
         fork_query_list = QueryList(self.connection_info)
@@ -345,4 +1041,4 @@ class ForkQueriesCommand(BaseCommand):
         # フォークしたクエリのdata_source_idを書き換えて、サーバ上のインスタンスを更新。
         fork_query_list.set_properties_in_bulk({
             u'data_source_id': self.ns.target_data_source_id})
-        fork_query_list.update_in_bulk()
+        self.run_until_complete(fork_query_list.async_update_in_bulk())
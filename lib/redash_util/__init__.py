@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 u"""Redash関連のユーティリティクラスをまとめたモジュール。"""
 
+from .column_table import ColumnTable
+from .columnar_file import ColumnarReader, ColumnarWriter
 from .connection_info import ConnectionInfo
 from .exceptions import \
     RedashException, \
     RedashJobException, \
     RedashJobFailureException
-from .job import Job, JobManager, JobStatus
+from .execution_journal import ExecutionJournal
+from .job import Job, JobManager, JobStatus, PollingPolicy
 from .query import Query, QueryList
-from .query_result import NullQueryResult, QueryResult
+from .query_catalog import QueryCatalog
+from .query_result import \
+    NullQueryResult, QueryResult, StreamingQueryResult
+from .result_cache import ResultCache
+from .result_stream import QueryResultStream
+from .retry_policy import RetryPolicy, TokenBucket
+from .runtime_history import RuntimeHistory
+from .scheduler import DataSourceStats, JobScheduler
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* AsyncGateway
+
+また、以下の関数を提供する。
+
+* get_executor
+* shutdown_all_executors
+* get_async_gateway
+"""
+from asyncio import get_event_loop
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+from weakref import WeakKeyDictionary, WeakValueDictionary
+
+from requests import Response
+
+from .connection_info import ConnectionInfo
+from .gateway import Gateway, get_gateway
+
+
+# ConnectionInfoオブジェクト毎に共有する、スレッドプールを保持する辞書。
+_executors = WeakKeyDictionary()
+_executors_lock = Lock()
+
+# ConnectionInfoオブジェクト毎に共有する、AsyncGatewayオブジェクトを保持する辞書(キーはConnectionInfoのid)。
+# (get_gateway関数と同じく、AsyncGatewayが内部のGateway経由でConnectionInfoを参照しているため、
+#  辞書にある間に、同じidが別のConnectionInfoに再利用されることはない。)
+_async_gateways = WeakValueDictionary()
+_async_gateways_lock = Lock()
+
+
+def get_executor(connection_info: 'ConnectionInfo') -> 'ThreadPoolExecutor':
+    u"""
+    接続情報に対応する、HTTP通信用のスレッドプールを返す。
+
+    スレッド数は、接続情報のHTTPコネクションプールのサイズに合わせる。
+    (コネクション数以上のスレッドがあっても、コネクションの空き待ちになるだけのため。)
+    :param connection_info: 接続情報を保持するオブジェクト。
+    :return: スレッドプール。
+    """
+    with _executors_lock:
+        executor = _executors.get(connection_info)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=connection_info.get_pool_size())
+            _executors[connection_info] = executor
+        return executor
+
+
+def shutdown_all_executors() -> None:
+    u"""
+    共有しているスレッドプールを全て停止する。
+
+    :return:
+    """
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
+
+
+class AsyncGateway:
+    u"""
+    Gatewayの各メソッドを、コルーチンとして提供するクラス。
+
+    概要:
+    1. Gatewayと同じ名前・引数のメソッドを持ち、どのメソッドもResponseオブジェクトを返すコルーチンである。
+    2. 実際のHTTP通信は、接続情報毎に共有されるスレッドプール上でGatewayに委譲する。
+       そのため、keep-aliveのコネクションプールもGatewayと共有される。
+    3. HTTP通信で例外が発生した場合、Gatewayと同じく、requestsライブラリの例外がawait時に送出される。
+
+    補足:
+    ・Gatewayと同じく、外部への公開を想定していないため、__init__.pyにimport処理を記載しないこと。
+    """
+
+    def __init__(self, connection_info: 'ConnectionInfo'=None) -> None:
+        u"""
+        コンストラクタ。
+
+        :param connection_info:
+        """
+        self.__gateway = get_gateway(connection_info)
+
+    def set_connection_info(self, connection_info: 'ConnectionInfo') -> None:
+        u"""
+        サーバへの接続情報を保持するオブジェクトをセットする。
+
+        :param connection_info:
+        :return:
+        """
+        self.__gateway = get_gateway(connection_info)
+
+    def get_connection_info(self) -> 'ConnectionInfo':
+        u"""
+        サーバへの接続情報を保持するオブジェクトを返す。
+
+        :return:
+        """
+        return self.__gateway.get_connection_info()
+
+    async def get_query(self, query_id: int) -> 'Response':
+        u"""
+        サーバ上から、指定したidのクエリ一件を取得する。
+
+        :param query_id:
+        :return:
+        """
+        return await self.__run(self.__gateway.get_query, query_id)
+
+    async def update_query(
+        self, query_id: int, properties: Dict[str, Any]
+    ) -> 'Response':
+        u"""
+        サーバ上で、指定したidのクエリのプロパティを更新する。
+
+        :param query_id:
+        :param properties: 更新対象となるプロパティ名と値をセットした辞書。
+        :return:
+        """
+        return await self.__run(
+            self.__gateway.update_query, query_id, properties)
+
+    async def execute_query(self, query_id: int) -> 'Response':
+        u"""
+        サーバ上で、指定したidのクエリを実行する。
+
+        :param query_id:
+        :return:
+        """
+        return await self.__run(self.__gateway.execute_query, query_id)
+
+    async def execute_query_text(
+        self,
+        query_text: str,
+        data_source_id: int,
+        query_id: int=None,
+        max_age: int=0
+    ) -> 'Response':
+        u"""
+        サーバ上で、引数で指定したSQL文字列を実行する(サーバ上のクエリは更新しない)。
+
+        :param query_text: 実行するSQL文字列。
+        :param data_source_id: 実行先のデータソースのid。
+        :param query_id: 実行結果を紐付けるクエリのid。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを返す(0の場合、必ず実行する)。
+        :return:
+        """
+        return await self.__run(
+            self.__gateway.execute_query_text,
+            query_text, data_source_id, query_id, max_age)
+
+    async def create_query(self, properties: Dict[str, Any]) -> 'Response':
+        u"""
+        サーバ上で、引数で指定したプロパティを持つクエリを作成する。
+
+        :param properties: プロパティ名と値をセットした辞書。
+        :return:
+        """
+        return await self.__run(self.__gateway.create_query, properties)
+
+    async def fork_query(self, query_id: int) -> 'Response':
+        u"""
+        サーバ上で、指定したidのクエリをフォークする。
+
+        :param query_id:
+        :return:
+        """
+        return await self.__run(self.__gateway.fork_query, query_id)
+
+    async def archive_query(self, query_id: int) -> 'Response':
+        u"""
+        サーバ上で、指定したidのクエリをアーカイブする。
+
+        :param query_id:
+        :return:
+        """
+        return await self.__run(self.__gateway.archive_query, query_id)
+
+    async def search_queries(self, text: str) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定した文字列を含むクエリを返す。
+
+        :param text:
+        :return:
+        """
+        return await self.__run(self.__gateway.search_queries, text)
+
+    async def get_queries(
+        self, page: int=1, page_size: int=250, order: str=u'-updated_at'
+    ) -> 'Response':
+        u"""
+        サーバと疎通し、(アーカイブされていない)クエリの一覧を、ページ単位で返す。
+
+        :param page:
+        :param page_size:
+        :param order:
+        :return:
+        """
+        return await self.__run(
+            self.__gateway.get_queries, page, page_size, order)
+
+    async def update_job_status(self, job_id: str) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定したidのJobを更新する。
+
+        :param job_id:
+        :return:
+        """
+        return await self.__run(self.__gateway.update_job_status, job_id)
+
+    async def get_query_result(self, query_result_id: int) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定したidのQueryResultを返す。
+
+        :param query_result_id:
+        :return:
+        """
+        return await self.__run(
+            self.__gateway.get_query_result, query_result_id)
+
+    async def stream_query_result(self, query_result_id: int) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定したidのQueryResultを、レスポンスボディを読み込まずに返す。
+
+        :param query_result_id:
+        :return:
+        """
+        return await self.__run(
+            self.__gateway.stream_query_result, query_result_id)
+
+    async def download_query_result(
+        self, query_result_id: int, file_format: str=u'csv'
+    ) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定したidのQueryResultを、サーバ側で変換済みのファイル形式で返す。
+
+        :param query_result_id:
+        :param file_format: サーバ側で変換するファイル形式(csvかxlsx)。
+        :return:
+        """
+        return await self.__run(
+            self.__gateway.download_query_result,
+            query_result_id, file_format)
+
+    async def kill_job(self, job_id: str) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定したidのジョブの実行を停止する。
+
+        :param job_id:
+        :return:
+        """
+        return await self.__run(self.__gateway.kill_job, job_id)
+
+    async def __run(
+        self, method: Callable[..., Response], *params: Any
+    ) -> 'Response':
+        u"""
+        Gatewayのメソッドを、接続情報毎のスレッドプール上で実行し、結果を待つ。
+
+        :param method: Gatewayのメソッド。
+        :param params: メソッドに渡す引数。
+        :return: Responseオブジェクト。
+        """
+        # 接続情報が無い場合は、イベントループのデフォルトのスレッドプールを使う。
+        connection_info = self.__gateway.get_connection_info()
+        executor = get_executor(connection_info) if connection_info else None
+        return await get_event_loop().run_in_executor(
+            executor, partial(method, *params))
+
+
+def get_async_gateway(
+    connection_info: Optional['ConnectionInfo']
+) -> 'AsyncGateway':
+    u"""
+    接続情報に対応する、共有のAsyncGatewayオブジェクトを返す。
+
+    get_gateway関数と同じく、ポーリングなどで繰り返し使う場合は、呼び出し毎に生成せずにこれを使う。
+    共有しているため、返されたAsyncGatewayのset_connection_infoメソッドは呼び出さないこと。
+    :param connection_info: 接続情報を保持するオブジェクト。
+    :return: AsyncGatewayオブジェクト。接続情報がNoneの場合は、共有しない新しいオブジェクト。
+    """
+    if connection_info is None:
+        return AsyncGateway(None)
+
+    with _async_gateways_lock:
+        async_gateway = _async_gateways.get(id(connection_info))
+        if async_gateway is None:
+            async_gateway = AsyncGateway(connection_info)
+            _async_gateways[id(connection_info)] = async_gateway
+        return async_gateway
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* ColumnTable
+"""
+
+from array import array
+from itertools import repeat
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+
+class ColumnTable:
+    u"""
+    クエリの実行結果の表を、カラム毎の配列として保持するクラス。
+
+    概要:
+    1. Redashが返す行毎の辞書(カラム名をキーとする)の配列を、カラム毎の値の配列に一度だけ変換する。
+    2. 全ての値が整数(または浮動小数点数)のカラムは、型付きの配列(array)として保持する。
+       それ以外のカラム(nullや型の混在を含むもの)は、値のリストとして保持する。
+    3. カラム名から位置への対応(インデックス)は、全ての行で共有する。
+       行はiter_rowsメソッドで、カラムの順に値を並べたタプルとして取り出す。
+
+    補足:
+    ・行毎の辞書(キーとハッシュテーブル)を持たないため、行数・カラム数が多い結果ほどメモリ使用量が減る。
+    ・型付きの配列にするのは、値の型が一つに揃っている場合だけである。
+      そのため、取り出した値は元の値と等しく、シリアライズ結果も変わらない
+      (floatのカラムに整数が混ざっている場合などは、リストのまま保持する)。
+    """
+
+    __slots__ = (u'__columns', u'__names', u'__index', u'__values',
+                 u'__num_rows')
+
+    # 値の型が揃っている場合に使う、arrayモジュールの型コード。
+    TYPE_CODES = {
+        int: u'q',
+        float: u'd',
+    }
+
+    def __init__(
+        self,
+        columns: List[Dict[str, Any]],
+        values: List[Sequence[Any]],
+        num_rows: int
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param columns: カラムの定義(nameとtypeなどを持つ辞書)の配列。
+        :param values: カラム毎の値の配列の配列(columnsと同じ順)。
+        :param num_rows: 行数。
+        """
+        self.__columns = columns
+        self.__names = [column[u'name'] for column in columns]
+        self.__index = {name: i for i, name in enumerate(self.__names)}
+        self.__values = values
+        self.__num_rows = num_rows
+
+    @classmethod
+    def from_rows(
+        cls, columns: List[Dict[str, Any]], rows: List[Dict[str, Any]]
+    ) -> 'ColumnTable':
+        u"""
+        Redashが返す行毎の辞書の配列から、インスタンスを生成する。
+
+        :param columns: カラムの定義(nameとtypeなどを持つ辞書)の配列。
+        :param rows: カラム名と値の辞書の配列。値がないカラムはnullとして扱う。
+        :return:
+        """
+        values = []
+        for column in columns:
+            name = column[u'name']
+            values.append(cls.__pack([row.get(name) for row in rows]))
+        return cls(columns, values, len(rows))
+
+    def get_columns(self) -> List[Dict[str, Any]]:
+        u"""
+        カラムの定義の配列を返す。
+
+        :return:
+        """
+        return self.__columns
+
+    def get_column_names(self) -> List[str]:
+        u"""
+        カラム名の配列を返す。
+
+        :return:
+        """
+        return self.__names
+
+    def get_index(self, name: str) -> int:
+        u"""
+        カラム名に対応する、カラムの位置(iter_rowsメソッドが返すタプル内の位置)を返す。
+
+        :param name: カラム名。
+        :return: 位置。該当するカラムが無い場合はKeyErrorを送出する。
+        """
+        return self.__index[name]
+
+    def get_column(self, name: str) -> Sequence[Any]:
+        u"""
+        カラム名に対応する、値の配列を返す(arrayかlist)。
+
+        :param name: カラム名。
+        :return:
+        """
+        return self.__values[self.__index[name]]
+
+    def get_values(self) -> List[Sequence[Any]]:
+        u"""
+        カラム毎の値の配列の配列を返す。
+
+        :return:
+        """
+        return self.__values
+
+    def count_rows(self) -> int:
+        u"""
+        行数を返す。
+
+        :return:
+        """
+        return self.__num_rows
+
+    def iter_rows(self) -> Iterator[Tuple[Any, ...]]:
+        u"""
+        各行を、カラムの順に値を並べたタプルとして一行ずつ返すイテレータ。
+
+        :return:
+        """
+        if not self.__values:
+            return repeat((), self.__num_rows)
+        return zip(*self.__values)
+
+    def iter_dicts(self) -> Iterator[Dict[str, Any]]:
+        u"""
+        各行を、カラム名と値の辞書として一行ずつ返すイテレータ。
+
+        :return:
+        """
+        names = self.__names
+        for row in self.iter_rows():
+            yield dict(zip(names, row))
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        u"""
+        Redashが返す形式(カラム名と値の辞書の配列)に戻して返す。
+
+        :return:
+        """
+        return list(self.iter_dicts())
+
+    @classmethod
+    def __pack(cls, values: List[Any]) -> Sequence[Any]:
+        u"""
+        値の型が整数か浮動小数点数に揃っていれば、型付きの配列に変換する。
+
+        :param values: 一つのカラムの値のリスト。
+        :return: arrayか、引数のリストそのもの。
+        """
+        value_types = set(map(type, values))
+        if len(value_types) != 1:
+            return values
+        type_code = cls.TYPE_CODES.get(value_types.pop())
+        if type_code is None:
+            return values
+        try:
+            return array(type_code, values)
+        except OverflowError:
+            # (64bitに収まらない整数は、リストのまま保持する。)
+            return values
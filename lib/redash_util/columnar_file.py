@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* ColumnarWriter
+* ColumnarReader
+"""
+
+import sys
+import zlib
+from array import array
+from itertools import accumulate, islice
+from json import dumps, loads
+from struct import pack, unpack
+from typing import \
+    Any, BinaryIO, Dict, Iterable, List, Sequence, Set, Tuple
+
+
+# ファイルの先頭と末尾に置く、ファイル形式を識別するバイト列。
+MAGIC = b'RCOL1\x00'
+
+# Redashのカラムの型と、列バッファの型(物理型)との対応。これ以外の型は文字列として保持する。
+PHYSICAL_TYPES = {
+    u'integer': u'int64',
+    u'float': u'float64',
+    u'boolean': u'bool',
+}
+
+# 物理型毎の、arrayモジュールの型コード。
+TYPE_CODES = {
+    u'int64': u'q',
+    u'float64': u'd',
+    u'bool': u'b',
+}
+
+# 物理型毎の、nullの行に格納する値(validityで区別するため、値自体は何でもよい)。
+NULL_VALUES = {
+    u'int64': 0,
+    u'float64': 0.0,
+    u'bool': False,
+    u'string': u'',
+}
+
+NONE_TYPE = type(None)
+
+# arrayの値はネイティブのバイトオーダーのため、ビッグエンディアンの環境ではリトルエンディアンに変換する。
+NEEDS_BYTESWAP = sys.byteorder != u'little'
+
+
+class ColumnarWriter:
+    u"""
+    クエリの実行結果を、列指向のバイナリ形式でファイルに書き出すクラス。
+
+    概要:
+    1. 行をrow_group_size行ずつ溜め、溜まった行(row group)をカラム毎の型付きの列バッファに変換して書き出す。
+    2. 列バッファの型は、Redashが返すカラムの型(columnsのtype)から決める。
+       integerは64bit整数、floatは64bit浮動小数点数、booleanは1バイトの真偽値、それ以外はUTF-8の文字列とする。
+    3. 各列バッファは、compressionを指定した場合は圧縮して書き出す。
+    4. 最後に、カラムの定義と各列バッファの位置を記したフッタ(JSON)を書き出す。
+
+    ファイルの構造(数値は全てリトルエンディアン):
+        MAGIC
+        row group 0の各カラムの列バッファ
+        row group 1の各カラムの列バッファ
+        ...
+        フッタ(JSON)
+        フッタのバイト数(uint32)
+        MAGIC
+
+    列バッファの構造(Apache Arrowの配列の表現に倣っている):
+        validity: null_countが1以上の場合のみ。値がある行のビットを1とするビットマップ。
+        offsets : 文字列の場合のみ。各値の開始位置(int64)を行数+1個並べたもの。
+        values  : 数値・真偽値の場合は固定長の値の配列、文字列の場合はUTF-8のバイト列を連結したもの。
+
+    補足:
+    ・行数によらずメモリ使用量は、row group一つ分で一定になる。
+    ・カラムの型と合わない値(integerのカラムの小数や文字列など)を含むrow groupでは、
+      そのカラムをJSON文字列(物理型json)として保持する。値が失われることはない。
+    ・ColumnarReaderで読み込める。
+    """
+
+    # row groupの行数のデフォルト値。
+    DEFAULT_ROW_GROUP_SIZE = 64 * 1024
+
+    # 対応している圧縮形式。
+    COMPRESSIONS = (u'zlib',)
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        columns: List[Dict[str, Any]],
+        row_group_size: int=DEFAULT_ROW_GROUP_SIZE,
+        compression: str=u'zlib',
+        compression_level: int=1
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param file: 書き出し先の(バイナリモードで開いた)ファイルオブジェクト。
+        :param columns: クエリの実行結果のカラムの定義(nameとtypeを持つ辞書)の配列。
+        :param row_group_size: row group一つあたりの行数。
+        :param compression: 列バッファの圧縮形式。Noneの場合は圧縮しない。
+        :param compression_level: 圧縮レベル(zlibの場合は1〜9)。
+        """
+        if compression is not None and compression not in self.COMPRESSIONS:
+            raise ValueError(
+                u'unsupported compression: {}'.format(compression))
+
+        self.__file = file
+        self.__columns = [
+            {u'name': column[u'name'], u'type': column.get(u'type')}
+            for column in columns]
+        self.__row_group_size = max(row_group_size, 1)
+        self.__compression = compression
+        self.__compression_level = compression_level
+
+        # 書き出し前の行。
+        self.__pending_rows = []  # type: List[Dict[str, Any]]
+        self.__row_groups = []  # type: List[Dict[str, Any]]
+        self.__num_rows = 0
+
+        self.__file.write(MAGIC)
+        self.__offset = len(MAGIC)
+
+    def write_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        u"""
+        行を書き出す。row_group_size行溜まる毎に、row groupとしてファイルに書き出す。
+
+        :param rows: カラム名と値の辞書の配列(またはイテレータ)。
+        :return:
+        """
+        rows = iter(rows)
+        while True:
+            size = self.__row_group_size - len(self.__pending_rows)
+            self.__pending_rows.extend(islice(rows, size))
+            if len(self.__pending_rows) < self.__row_group_size:
+                return
+            self.__flush()
+
+    def write_columns(
+        self, columns: List[Sequence[Any]], num_rows: int
+    ) -> None:
+        u"""
+        カラム毎の値の配列(ColumnTableが保持するもの)を、row_group_size行ずつ書き出す。
+
+        型付きの配列(array)のカラムは、値を一つずつ変換せずにそのまま列バッファにする。
+        :param columns: カラム毎の値の配列の配列(コンストラクタのcolumnsと同じ順)。
+        :param num_rows: 行数。
+        :return:
+        """
+        self.__flush()
+        for start in range(0, num_rows, self.__row_group_size):
+            end = min(start + self.__row_group_size, num_rows)
+            self.__write_row_group(
+                [values[start:end] for values in columns], end - start)
+
+    def close(self) -> None:
+        u"""
+        溜まっている行と、フッタを書き出す(ファイル自体は閉じない)。
+
+        :return:
+        """
+        self.__flush()
+        footer = dumps({
+            u'version': 1,
+            u'columns': self.__columns,
+            u'compression': self.__compression,
+            u'num_rows': self.__num_rows,
+            u'row_groups': self.__row_groups,
+        }).encode(u'utf-8')
+        self.__file.write(footer)
+        self.__file.write(pack(u'<I', len(footer)))
+        self.__file.write(MAGIC)
+
+    def __flush(self) -> None:
+        u"""
+        溜まっている行を、row groupとして書き出す。
+
+        :return:
+        """
+        rows = self.__pending_rows
+        self.__pending_rows = []
+        if rows:
+            self.__write_row_group(
+                [[row.get(column[u'name']) for row in rows]
+                 for column in self.__columns],
+                len(rows))
+
+    def __write_row_group(
+        self, columns: List[Sequence[Any]], num_rows: int
+    ) -> None:
+        u"""
+        カラム毎の値の配列を、一つのrow groupとして書き出す。
+
+        :param columns: カラム毎の値の配列(listかarray)の配列。
+        :param num_rows: 行数。
+        :return:
+        """
+        if not self.__columns:
+            return
+
+        chunks = []
+        for column, values in zip(self.__columns, columns):
+            physical_type, null_count, buffers = self.__encode(
+                values, PHYSICAL_TYPES.get(column[u'type'], u'string'))
+            data = b''.join(buffers)
+            if self.__compression == u'zlib':
+                data = zlib.compress(data, self.__compression_level)
+            self.__file.write(data)
+            chunks.append({
+                u'type': physical_type,
+                u'null_count': null_count,
+                u'offset': self.__offset,
+                u'length': len(data),
+                u'buffers': [len(buffer) for buffer in buffers],
+            })
+            self.__offset += len(data)
+
+        self.__row_groups.append({u'num_rows': num_rows, u'columns': chunks})
+        self.__num_rows += num_rows
+
+    @classmethod
+    def __encode(
+        cls, values: Sequence[Any], physical_type: str
+    ) -> Tuple[str, int, List[bytes]]:
+        u"""
+        一つのカラムの値の配列を、列バッファに変換する。
+
+        値が物理型に合わない場合は、JSON文字列として変換する。
+        :param values: 値の配列(listかarray)。
+        :param physical_type: 物理型。
+        :return: 実際に使った物理型、nullの数、validity・offsets・valuesのバイト列の配列。
+        """
+        if isinstance(values, array):
+            if values.typecode == TYPE_CODES.get(physical_type):
+                # 物理型と同じ型付きの配列は、nullを含まないため、そのままバイト列にする。
+                if NEEDS_BYTESWAP:
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                return physical_type, 0, [values.tobytes()]
+            values = values.tolist()
+
+        # (値の型の集合や、nullの数は、C実装の組み込み関数でまとめて求める。)
+        value_types = set(map(type, values))
+        value_types.discard(NONE_TYPE)
+        null_count = values.count(None)
+        buffers = []  # type: List[bytes]
+        if null_count:
+            validity = bytearray((len(values) + 7) // 8)
+            for index, value in enumerate(values):
+                if value is not None:
+                    validity[index >> 3] |= 1 << (index & 7)
+            buffers.append(bytes(validity))
+            values = [
+                NULL_VALUES.get(physical_type) if value is None else value
+                for value in values]
+
+        if physical_type in TYPE_CODES:
+            fixed = cls.__encode_fixed(values, value_types, physical_type)
+            if fixed is not None:
+                return physical_type, null_count, buffers + [fixed]
+            physical_type = u'json'
+
+        if physical_type == u'string' and not value_types <= {str}:
+            physical_type = u'json'
+        if physical_type == u'json':
+            values = [
+                u'' if value is None else dumps(value, ensure_ascii=False)
+                for value in values]
+
+        encoded = [value.encode(u'utf-8') for value in values]
+        offsets = array(u'q', [0])
+        offsets.extend(accumulate(map(len, encoded)))
+        if NEEDS_BYTESWAP:
+            offsets.byteswap()
+        return physical_type, null_count, \
+            buffers + [offsets.tobytes(), b''.join(encoded)]
+
+    @staticmethod
+    def __encode_fixed(
+        values: List[Any], value_types: Set[type], physical_type: str
+    ) -> bytes:
+        u"""
+        数値・真偽値のカラムの値の配列を、固定長の値の配列のバイト列に変換する。
+
+        :param values: 値の配列(nullは0に置き換え済みのもの)。
+        :param value_types: null以外の値の型の集合。
+        :param physical_type: 物理型(int64、float64、bool)。
+        :return: バイト列。物理型に合わない値を含む場合はNone。
+        """
+        if physical_type == u'bool':
+            if not value_types <= {bool}:
+                return None
+        elif bool in value_types:
+            # (boolはintのサブクラスのため、数値のカラムに紛れていても変換できてしまう。)
+            return None
+
+        try:
+            fixed = array(TYPE_CODES[physical_type], values)
+        except (TypeError, OverflowError):
+            return None
+        if NEEDS_BYTESWAP:
+            fixed.byteswap()
+        return fixed.tobytes()
+
+
+class ColumnarReader:
+    u"""
+    ColumnarWriterで書き出したファイルを読み込むクラス。
+
+    補足:
+    ・数値・真偽値の列は、バイト列からまとめて変換するため、csvを行毎に解析して型変換するより速い。
+    ・pandasで扱う場合は、pandas.DataFrame(reader.read_columns())のように、列の辞書からDataFrameを作れる。
+    """
+
+    def __init__(self, file_path: str) -> None:
+        u"""
+        コンストラクタ。フッタを読み込む。
+
+        :param file_path: ファイルのパス。
+        """
+        self.__file_path = file_path
+        with open(file_path, u'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(u'not a columnar file: {}'.format(file_path))
+            file.seek(-(len(MAGIC) + 4), 2)
+            footer_length = unpack(u'<I', file.read(4))[0]
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(
+                    u'truncated columnar file: {}'.format(file_path))
+            file.seek(-(len(MAGIC) + 4 + footer_length), 2)
+            self.__footer = loads(file.read(footer_length).decode(u'utf-8'))
+
+    def get_columns(self) -> List[Dict[str, Any]]:
+        u"""
+        カラムの定義(nameとtypeを持つ辞書)の配列を返す。
+
+        :return:
+        """
+        return self.__footer[u'columns']
+
+    def get_num_rows(self) -> int:
+        u"""
+        全体の行数を返す。
+
+        :return:
+        """
+        return self.__footer[u'num_rows']
+
+    def read_columns(self) -> Dict[str, List[Any]]:
+        u"""
+        全てのrow groupを読み込み、カラム名と値の配列の辞書を返す。
+
+        :return:
+        """
+        names = [column[u'name'] for column in self.get_columns()]
+        columns = {name: [] for name in names}  # type: Dict[str, List[Any]]
+        with open(self.__file_path, u'rb') as file:
+            for row_group in self.__footer[u'row_groups']:
+                for name, chunk in zip(names, row_group[u'columns']):
+                    file.seek(chunk[u'offset'])
+                    columns[name].extend(self.__decode(
+                        file.read(chunk[u'length']), chunk,
+                        row_group[u'num_rows']))
+        return columns
+
+    def iter_rows(self) -> Iterable[Dict[str, Any]]:
+        u"""
+        row group毎に読み込み、一行ずつカラム名と値の辞書を返すイテレータ。
+
+        :return:
+        """
+        names = [column[u'name'] for column in self.get_columns()]
+        with open(self.__file_path, u'rb') as file:
+            for row_group in self.__footer[u'row_groups']:
+                values = []
+                for chunk in row_group[u'columns']:
+                    file.seek(chunk[u'offset'])
+                    values.append(self.__decode(
+                        file.read(chunk[u'length']), chunk,
+                        row_group[u'num_rows']))
+                for row in zip(*values):
+                    yield dict(zip(names, row))
+
+    def __decode(
+        self, data: bytes, chunk: Dict[str, Any], num_rows: int
+    ) -> List[Any]:
+        u"""
+        一つの列バッファを、値の配列に変換する。
+
+        :param data: 列バッファのバイト列。
+        :param chunk: フッタに記された、列バッファの情報。
+        :param num_rows: row groupの行数。
+        :return:
+        """
+        if self.__footer[u'compression'] == u'zlib':
+            data = zlib.decompress(data)
+
+        buffers = []
+        position = 0
+        for length in chunk[u'buffers']:
+            buffers.append(data[position:position + length])
+            position += length
+        validity = buffers.pop(0) if chunk[u'null_count'] else None
+
+        physical_type = chunk[u'type']
+        if physical_type in TYPE_CODES:
+            fixed = array(TYPE_CODES[physical_type])
+            fixed.frombytes(buffers[0])
+            if NEEDS_BYTESWAP:
+                fixed.byteswap()
+            values = fixed.tolist()
+            if physical_type == u'bool':
+                values = [value == 1 for value in values]
+        else:
+            offsets = array(u'q')
+            offsets.frombytes(buffers[0])
+            if NEEDS_BYTESWAP:
+                offsets.byteswap()
+            strings = buffers[1]
+            values = [
+                strings[offsets[index]:offsets[index + 1]].decode(u'utf-8')
+                for index in range(num_rows)]
+            if physical_type == u'json':
+                values = [loads(value) if value else None for value in values]
+
+        if validity is not None:
+            values = [
+                value if validity[index >> 3] & (1 << (index & 7)) else None
+                for index, value in enumerate(values)]
+        return values
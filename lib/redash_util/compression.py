@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラス・関数を提供するモジュール。
+
+* BackgroundWriter
+* split_compression
+* check_compression
+* open_output
+"""
+
+import gzip
+from io import BufferedWriter, RawIOBase
+from queue import Queue
+from threading import Thread
+from typing import BinaryIO, Optional, Tuple
+
+# zstd形式で圧縮する場合に必要な、zstandardパッケージ(任意)の最小バージョン。
+# (stream_writerのwrite_return_read引数と、返すオブジェクトのwritable・closed・
+#  closeでのフレームの終端が必要。)
+ZSTANDARD_MIN_VERSION = (0, 11, 0)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# ファイルフォーマットの末尾に付ける拡張子と、圧縮形式の対応。
+COMPRESSION_SUFFIXES = {
+    u'gz': u'gzip',
+    u'gzip': u'gzip',
+    u'zst': u'zstd',
+    u'zstd': u'zstd',
+}
+
+# 圧縮形式毎の、圧縮レベルのデフォルト値。
+# (gzipの最大圧縮(9)は、6と比べてサイズがほとんど変わらず数倍遅いため、6とする。)
+DEFAULT_LEVELS = {
+    u'gzip': 6,
+    u'zstd': 3,
+}
+
+# バックグラウンドで書き出す場合に、まとめてスレッドに渡すバイト数。
+BACKGROUND_CHUNK_SIZE = 1024 * 1024
+
+
+class BackgroundWriter(RawIOBase):
+    u"""
+    書き込まれたバイト列を、別スレッドで下位のストリームに書き出すクラス。
+
+    概要:
+    1. writeメソッドは、バイト列をキューに積むだけで返る。
+    2. 別スレッドがキューからバイト列を取り出し、下位のストリーム(圧縮ストリームなど)に書き出す。
+       そのため、呼び出し元での変換処理(csvの整形など)と、圧縮・ディスクへの書き出しとが並行する。
+
+    補足:
+    ・キューに積めるのはmax_pending個までで、それを超えるとwriteメソッドは待つ(メモリ使用量は一定になる)。
+    ・小さなバイト列を一つずつ渡すと遅いため、BufferedWriterで包んで使う(open_output関数を参照)。
+    ・別スレッドで発生した例外は、次のwriteメソッドかcloseメソッドの呼び出し時に送出する。
+    """
+
+    def __init__(self, stream: BinaryIO, max_pending: int=4) -> None:
+        u"""
+        コンストラクタ。
+
+        :param stream: 書き出し先のストリーム。closeメソッドで一緒に閉じる。
+        :param max_pending: キューに積める(書き出し待ちの)バイト列の数。
+        """
+        super().__init__()
+        self.__stream = stream
+        self.__queue = Queue(max_pending)  # type: Queue
+        self.__error = None  # type: Optional[Exception]
+        self.__thread = Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def writable(self) -> bool:
+        u"""
+        書き込み可能かどうかを返す(常にTrue)。
+
+        :return:
+        """
+        return True
+
+    def write(self, data: bytes) -> int:
+        u"""
+        バイト列を、書き出し待ちのキューに積む。
+
+        :param data: バイト列。
+        :return: 受け付けたバイト数。
+        """
+        self.__raise_error()
+        # (BufferedWriterは同じバッファを使い回すため、コピーしてから渡す。)
+        self.__queue.put(bytes(data))
+        return len(data)
+
+    def close(self) -> None:
+        u"""
+        書き出し待ちのバイト列を全て書き出してから、下位のストリームを閉じる。
+
+        :return:
+        """
+        if self.closed:
+            return
+        try:
+            self.__queue.put(None)
+            self.__thread.join()
+            self.__stream.close()
+        finally:
+            super().close()
+        self.__raise_error()
+
+    def __run(self) -> None:
+        u"""
+        キューからバイト列を取り出し、下位のストリームに書き出し続ける(別スレッドで実行する)。
+
+        :return:
+        """
+        while True:
+            data = self.__queue.get()
+            if data is None:
+                return
+            if self.__error is not None:
+                # (呼び出し元が待ち続けないよう、例外の発生後もキューは空にし続ける。)
+                continue
+            try:
+                self.__stream.write(data)
+            except Exception as e:
+                self.__error = e
+
+    def __raise_error(self) -> None:
+        u"""
+        別スレッドで例外が発生していれば、送出する。
+
+        :return:
+        """
+        if self.__error is not None:
+            raise self.__error
+
+
+def split_compression(file_format: str) -> Tuple[str, Optional[str]]:
+    u"""
+    csv.gzのような、圧縮形式の拡張子を付けたファイルフォーマットを、ファイルフォーマットと圧縮形式に分ける。
+
+    :param file_format: ファイルフォーマット。
+    :return: ファイルフォーマットと、圧縮形式(gzipかzstd)の組。圧縮しない場合、圧縮形式はNone。
+    """
+    base, dot, suffix = file_format.rpartition(u'.')
+    if dot and base and suffix in COMPRESSION_SUFFIXES:
+        return base, COMPRESSION_SUFFIXES[suffix]
+    return file_format, None
+
+
+def check_compression(compression: Optional[str]) -> None:
+    u"""
+    圧縮形式が使えるかどうかをチェックし、使えないならValueErrorを送出する。
+
+    :param compression: 圧縮形式。Noneの場合は何もしない。
+    :return:
+    """
+    if compression is None:
+        return
+    if compression not in DEFAULT_LEVELS:
+        raise ValueError(u'unsupported compression: {}'.format(compression))
+    if compression == u'zstd' and (
+            zstandard is None
+            or _parse_version(zstandard.__version__) < ZSTANDARD_MIN_VERSION):
+        raise ValueError(
+            u'zstd compression requires the zstandard package {} or later.'
+            .format(u'.'.join(map(str, ZSTANDARD_MIN_VERSION))))
+
+
+def _parse_version(version: str) -> Tuple[int, ...]:
+    u"""
+    0.11.1のようなバージョン文字列を、比較できるように整数の組に変換する。
+
+    :param version: バージョン文字列。数字以外を含む部分(0.11.0.dev0のdev0など)以降は無視する。
+    :return:
+    """
+    numbers = []
+    for part in version.split(u'.'):
+        if not part.isdigit():
+            break
+        numbers.append(int(part))
+    return tuple(numbers)
+
+
+def open_output(
+    file_path: str,
+    compression: Optional[str]=None,
+    level: Optional[int]=None,
+    background: bool=False
+) -> BinaryIO:
+    u"""
+    書き出し用に、ファイルをバイナリモードで開く。圧縮形式を指定した場合は、書き込んだ順に圧縮して書き出す。
+
+    :param file_path: ファイルのパス。
+    :param compression: 圧縮形式(gzipかzstd)。Noneの場合は圧縮しない。
+    :param level: 圧縮レベル。Noneの場合は、圧縮形式毎のデフォルト値を使う。
+    :param background: Trueの場合、圧縮とファイルへの書き出しを別スレッドで行う(BackgroundWriterを参照)。
+    :return: ファイルオブジェクト。
+    """
+    check_compression(compression)
+    if level is None:
+        level = DEFAULT_LEVELS.get(compression)
+
+    if compression == u'gzip':
+        stream = gzip.open(file_path, u'wb', compresslevel=level)
+    elif compression == u'zstd':
+        # (BufferedWriterで包むため、writeが受け付けたバイト数を返すようにする。)
+        stream = BufferedWriter(
+            zstandard.ZstdCompressor(level=level).stream_writer(
+                open(file_path, u'wb'), write_return_read=True))
+    else:
+        stream = open(file_path, u'wb')
+
+    if background:
+        return BufferedWriter(
+            BackgroundWriter(stream), buffer_size=BACKGROUND_CHUNK_SIZE)
+    return stream
@@ -5,19 +5,38 @@ u"""
 * ConnectionInfo
 """
 
+from .retry_policy import RetryPolicy
+
 
 class ConnectionInfo:
     u"""Redashサーバとの接続時の情報を凝集・カプセル化するためのクラス。"""
 
-    def __init__(self, end_point: str=u'', api_key: str=u'') -> None:
+    # HTTPコネクションプールに保持するコネクション数のデフォルト値。
+    DEFAULT_POOL_SIZE = 10
+
+    def __init__(
+        self,
+        end_point: str=u'',
+        api_key: str=u'',
+        pool_size: int=DEFAULT_POOL_SIZE,
+        retry_policy: 'RetryPolicy'=None,
+        rate_limit: float=0
+    ) -> None:
         u"""
         コンストラクタ。
 
         :param end_point: 接続時のエンドポイント。
         :param api_key: ユーザ単位で発行されるAPIキー。
+        :param pool_size: この接続情報で共有するHTTPコネクションプールのサイズ。
+        :param retry_policy: 一時的なエラーで失敗したリクエストの、再試行の仕方を決めるオブジェクト。
+                             Noneの場合は、デフォルト値のRetryPolicyを使う。
+        :param rate_limit: この接続情報で行うリクエストの、1秒あたりの件数の上限。0の場合は制限しない。
         """
         self.end_point = end_point
         self.api_key   = api_key
+        self.pool_size = pool_size
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limit = rate_limit
 
     def get_end_point(self) -> str:
         u"""
@@ -34,3 +53,27 @@ class ConnectionInfo:
         :return: APIキー。
         """
         return self.api_key
+
+    def get_pool_size(self) -> int:
+        u"""
+        HTTPコネクションプールのサイズを返す。
+
+        :return: HTTPコネクションプールのサイズ。
+        """
+        return self.pool_size
+
+    def get_retry_policy(self) -> 'RetryPolicy':
+        u"""
+        リクエストの再試行の仕方を決めるオブジェクトを返す。
+
+        :return:
+        """
+        return self.retry_policy
+
+    def get_rate_limit(self) -> float:
+        u"""
+        1秒あたりのリクエスト数の上限を返す。
+
+        :return: リクエスト数の上限。0の場合は制限しない。
+        """
+        return self.rate_limit
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* ExecutionJournal
+"""
+
+from json import dumps, loads
+from logging import getLogger
+from os import makedirs
+from os.path import abspath, dirname, exists
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+from .job import JobStatus
+
+if TYPE_CHECKING:
+    from .job import Job
+
+
+logger = getLogger(__name__)
+
+
+class ExecutionJournal:
+    u"""
+    クエリの一括実行の進捗(発行したジョブのid、ジョブの状態、書き出したファイル)を記録するクラス。
+
+    概要:
+    1. (クエリのid, パラメータ)の組毎に、ジョブの発行・終了・結果の書き出しを、1行ずつJSONファイルに追記する。
+    2. 一括実行が途中で中断した場合は、同じファイルを読み込むことで、
+       結果を書き出し済みの組や、実行中のジョブのidを知ることができる(再開に使う)。
+
+    補足:
+    ・1件毎に追記してフラッシュするため、中断した時点までの記録が残る。
+      書き込み途中で中断した最後の行は、読み込み時に読み飛ばし、改行を補ってから追記を始める。
+    """
+
+    def __init__(self, file_path: str, resume: bool=False) -> None:
+        u"""
+        コンストラクタ。
+
+        :param file_path: 記録するファイルのパス。
+        :param resume: Trueの場合、既存の記録を読み込み、続けて追記する。
+                       Falseの場合、既存の記録を破棄する。
+        """
+        self.__file_path = file_path
+        # (クエリのid, パラメータ)の組のキーと、その組の最新の記録。
+        self.__entries = {}  # type: Dict[str, Dict[str, Any]]
+
+        terminated = True
+        if resume and exists(file_path):
+            terminated = self.__load()
+
+        makedirs(dirname(abspath(file_path)), exist_ok=True)
+        self.__file = open(file_path, u'a' if resume else u'w')
+        if not terminated:
+            # 途中で切れた最後の行に、次の記録が連結されないようにする。
+            self.__file.write(u'\n')
+            self.__file.flush()
+
+    def record_submitted(self, job: 'Job') -> None:
+        u"""
+        ジョブを発行したことを記録する。
+
+        サーバ上の実行結果を再利用した(ジョブのidを持たない)ジョブは、記録しない。
+        :param job: 発行したジョブ。
+        :return:
+        """
+        if not job.id:
+            return
+        self.__append(
+            job.query_id, job.get_parameters(),
+            {u'job_id': job.id, u'status': int(job.get_status())})
+
+    def record_finished(self, job: 'Job') -> None:
+        u"""
+        ジョブが終了したこと(終了時の状態)を記録する。
+
+        :param job: 終了したジョブ。
+        :return:
+        """
+        self.__append(
+            job.query_id, job.get_parameters(),
+            {u'status': int(job.get_status())})
+
+    def record_written(
+        self, query_id: int, parameters: Dict[str, str], file_path: str
+    ) -> None:
+        u"""
+        クエリの実行結果を、ファイルに書き出したことを記録する。
+
+        :param query_id: クエリのid。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータ。
+        :param file_path: 書き出したファイルのパス。
+        :return:
+        """
+        self.__append(
+            query_id, parameters,
+            {u'status': int(JobStatus.success), u'output': file_path})
+
+    def is_written(self, query_id: int, parameters: Dict[str, str]) -> bool:
+        u"""
+        クエリの実行結果を書き出し済みで、そのファイルが残っているかどうかを返す。
+
+        :param query_id: クエリのid。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータ。
+        :return:
+        """
+        entry = self.__entries.get(self.__make_key(query_id, parameters), {})
+        output = entry.get(u'output')
+        return output is not None and exists(output)
+
+    def get_running_job_id(
+        self, query_id: int, parameters: Dict[str, str]
+    ) -> Optional[str]:
+        u"""
+        発行済みで、終了が記録されていないジョブのidを返す。
+
+        :param query_id: クエリのid。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータ。
+        :return: ジョブのid。該当するジョブが無い場合はNone。
+        """
+        entry = self.__entries.get(self.__make_key(query_id, parameters), {})
+        if entry.get(u'status') in (JobStatus.pending, JobStatus.running):
+            return entry.get(u'job_id')
+        return None
+
+    def close(self) -> None:
+        u"""
+        記録するファイルを閉じる。
+
+        :return:
+        """
+        self.__file.close()
+
+    def __append(
+        self,
+        query_id: int,
+        parameters: Dict[str, str],
+        properties: Dict[str, Any]
+    ) -> None:
+        u"""
+        (クエリのid, パラメータ)の組の記録を更新し、ファイルに1行追記する。
+
+        :param query_id: クエリのid。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータ。
+        :param properties: 更新する項目。
+        :return:
+        """
+        key = self.__make_key(query_id, parameters)
+        entry = self.__entries.setdefault(key, {})
+        entry.update(properties)
+
+        record = dict(properties)
+        record[u'key'] = key
+        self.__file.write(dumps(record) + u'\n')
+        self.__file.flush()
+
+    def __load(self) -> bool:
+        u"""
+        既存の記録を読み込む。
+
+        :return: ファイルが空か、改行で終わっている場合はTrue。
+        """
+        line = u''
+        with open(self.__file_path, u'r') as file:
+            for line in file:
+                try:
+                    record = loads(line)
+                except ValueError:
+                    logger.warning(
+                        u'skipped a broken journal line: %s', line.strip())
+                    continue
+                key = record.pop(u'key')
+                self.__entries.setdefault(key, {}).update(record)
+        return not line or line.endswith(u'\n')
+
+    @staticmethod
+    def __make_key(query_id: int, parameters: Dict[str, str]) -> str:
+        u"""
+        (クエリのid, パラメータ)の組のキーを生成する。
+
+        :param query_id:
+        :param parameters:
+        :return:
+        """
+        return dumps([query_id, parameters or {}], sort_keys=True)
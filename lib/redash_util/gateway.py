@@ -3,13 +3,102 @@ u"""
 以下クラスを提供するモジュール。
 
 * Gateway
+
+また、以下の関数を提供する。
+
+* get_session
+* close_all_sessions
+* get_rate_limiter
+* get_gateway
 """
 from json import dumps
-from typing import Any, Callable, Dict
+from logging import getLogger
+from threading import Lock
+from time import sleep
+from typing import Any, Dict, Optional
+from weakref import WeakKeyDictionary, WeakValueDictionary
 
-from requests import Response, delete, get, post
+from requests import RequestException, Response, Session
+from requests.adapters import HTTPAdapter
 
 from .connection_info import ConnectionInfo
+from .retry_policy import TokenBucket
+
+
+logger = getLogger(__name__)
+
+
+# ConnectionInfoオブジェクト毎に共有する、Sessionオブジェクトを保持する辞書。
+# ConnectionInfoオブジェクトが破棄されれば、対応するSessionも辞書から除かれる。
+_sessions = WeakKeyDictionary()
+_sessions_lock = Lock()
+
+# ConnectionInfoオブジェクト毎に共有する、リクエスト頻度の制限用のTokenBucketを保持する辞書。
+_rate_limiters = WeakKeyDictionary()
+_rate_limiters_lock = Lock()
+
+# ConnectionInfoオブジェクト毎に共有する、Gatewayオブジェクトを保持する辞書(キーはConnectionInfoのid)。
+# Gatewayは使われなくなった時点で辞書から除かれる。また、GatewayがConnectionInfoを参照しているため、
+# Gatewayが辞書にある間に、同じidが別のConnectionInfoに再利用されることはない。
+_gateways = WeakValueDictionary()
+_gateways_lock = Lock()
+
+
+def get_session(connection_info: 'ConnectionInfo') -> 'Session':
+    u"""
+    接続情報に対応する、keep-alive・コネクションプール付きのSessionオブジェクトを返す。
+
+    同じConnectionInfoオブジェクトを参照する全てのGatewayは、同じSessionを共有するため、
+    Query・QueryList・Job間でTCP/TLSのコネクションが使い回される。
+    :param connection_info: 接続情報を保持するオブジェクト。
+    :return: Sessionオブジェクト。
+    """
+    with _sessions_lock:
+        session = _sessions.get(connection_info)
+        if session is None:
+            pool_size = connection_info.get_pool_size()
+            adapter = HTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size)
+            session = Session()
+            session.mount(u'http://', adapter)
+            session.mount(u'https://', adapter)
+            _sessions[connection_info] = session
+        return session
+
+
+def close_all_sessions() -> None:
+    u"""
+    共有しているSessionオブジェクトを全てクローズする。
+
+    :return:
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def get_rate_limiter(
+    connection_info: 'ConnectionInfo'
+) -> Optional['TokenBucket']:
+    u"""
+    接続情報に対応する、リクエスト頻度の制限用のTokenBucketを返す。
+
+    同じConnectionInfoオブジェクトを参照する全てのGatewayは、同じTokenBucketを共有するため、
+    AsyncGatewayのスレッドを含めた全体のリクエスト頻度が、接続情報のrate_limit以下になる。
+    :param connection_info: 接続情報を保持するオブジェクト。
+    :return: TokenBucketオブジェクト。接続情報でrate_limitを指定していない場合はNone。
+    """
+    rate_limit = connection_info.get_rate_limit()
+    if not rate_limit or rate_limit <= 0:
+        return None
+
+    with _rate_limiters_lock:
+        rate_limiter = _rate_limiters.get(connection_info)
+        if rate_limiter is None:
+            rate_limiter = TokenBucket(rate_limit)
+            _rate_limiters[connection_info] = rate_limiter
+        return rate_limiter
 
 
 class Gateway:
@@ -29,6 +118,12 @@ class Gateway:
       このクラスとConnectionInfoクラスをシングルトン化し、外部公開してもよいかもしれない。
       (この場合、テストや修正の容易性を考慮して、サービスロケータパターンを使って、
       取得するGatewayクラスの実体を切り替えられるようにしておくこと。)
+    ・実際のHTTP通信は、ConnectionInfoオブジェクト毎に共有されるSessionオブジェクト
+      (get_session関数を参照)を経由して行うため、Gatewayインスタンスを複数生成しても、
+      コネクションはkeep-aliveで使い回される。
+    ・一時的なエラー(429や502など)で失敗したリクエストは、接続情報のRetryPolicyに従って再試行する。
+      また、接続情報でrate_limitを指定した場合は、共有のTokenBucket(get_rate_limiter関数を参照)で
+      リクエストの頻度を制限する。
     """
 
     def __init__(self, connection_info: 'ConnectionInfo'=None) -> None:
@@ -66,7 +161,7 @@ class Gateway:
         :return:
         """
         return self.__request(
-            get,
+            u'GET',
             self.__make_url(u'/api/queries/' + str(query_id)),
             headers=self.__make_headers()
         )
@@ -82,7 +177,7 @@ class Gateway:
         :return:
         """
         return self.__request(
-            post,
+            u'POST',
             self.__make_url(u'/api/queries/' + str(query_id)),
             headers=self.__make_headers(contents_type=u'json'),
             data=dumps(properties)
@@ -96,11 +191,44 @@ class Gateway:
         :return:
         """
         return self.__request(
-            post,
+            u'POST',
             self.__make_url(u'/api/queries/' + str(query_id) + u'/refresh'),
             headers=self.__make_headers()
         )
 
+    def execute_query_text(
+        self,
+        query_text: str,
+        data_source_id: int,
+        query_id: int=None,
+        max_age: int=0
+    ) -> 'Response':
+        u"""
+        サーバ上で、引数で指定したSQL文字列を実行する(サーバ上のクエリは更新しない)。
+
+        パラメータに値をバインドしたSQL文字列を渡すことで、
+        サーバ上のクエリを書き換えずに、パラメータ付きでクエリを実行できる。
+        :param query_text: 実行するSQL文字列。
+        :param data_source_id: 実行先のデータソースのid。
+        :param query_id: 実行結果を紐付けるクエリのid。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを返す(0の場合、必ず実行する)。
+        :return:
+        """
+        properties = {
+            u'query': query_text,
+            u'data_source_id': data_source_id,
+            u'max_age': max_age,
+        }
+        if query_id is not None:
+            properties[u'query_id'] = query_id
+
+        return self.__request(
+            u'POST',
+            self.__make_url(u'/api/query_results'),
+            headers=self.__make_headers(contents_type=u'json'),
+            data=dumps(properties)
+        )
+
     def create_query(self, properties: Dict[str, Any]) -> 'Response':
         u"""
         サーバ上で、引数で指定したプロパティを持つクエリを作成する。
@@ -109,10 +237,10 @@ class Gateway:
         :return:
         """
         return self.__request(
-            post,
-            properties,
-            self.__make_url(u'/api/queries/'),
-            headers=self.__make_headers(),
+            u'POST',
+            self.__make_url(u'/api/queries'),
+            headers=self.__make_headers(contents_type=u'json'),
+            data=dumps(properties)
         )
 
     def fork_query(self, query_id: int) -> 'Response':
@@ -123,7 +251,7 @@ class Gateway:
         :return:
         """
         return self.__request(
-            post,
+            u'POST',
             self.__make_url(u'/api/queries/' + str(query_id) + u'/fork'),
             headers=self.__make_headers()
         )
@@ -136,7 +264,7 @@ class Gateway:
         :return:
         """
         return self.__request(
-            delete,
+            u'DELETE',
             self.__make_url(u'/api/queries/' + str(query_id)),
             headers=self.__make_headers()
         )
@@ -149,12 +277,30 @@ class Gateway:
         :return:
         """
         return self.__request(
-            get,
+            u'GET',
             self.__make_url(u'/api/queries/search'),
             headers=self.__make_headers(),
             params={u'q': text}
         )
 
+    def get_queries(
+        self, page: int=1, page_size: int=250, order: str=u'-updated_at'
+    ) -> 'Response':
+        u"""
+        サーバと疎通し、(アーカイブされていない)クエリの一覧を、ページ単位で返す。
+
+        :param page: 取得するページ番号(1始まり)。
+        :param page_size: 1ページあたりのクエリ数。
+        :param order: 並び順。デフォルトでは、更新日時の降順となる。
+        :return:
+        """
+        return self.__request(
+            u'GET',
+            self.__make_url(u'/api/queries'),
+            headers=self.__make_headers(),
+            params={u'page': page, u'page_size': page_size, u'order': order}
+        )
+
     def update_job_status(self, job_id: str) -> 'Response':
         u"""
         サーバと疎通し、引数で指定したidのJobを更新する。
@@ -163,7 +309,7 @@ class Gateway:
         :return:
         """
         return self.__request(
-            get,
+            u'GET',
             self.__make_url(u'/api/jobs/' + job_id),
             headers=self.__make_headers()
         )
@@ -176,11 +322,48 @@ class Gateway:
         :return:
         """
         return self.__request(
-            get,
+            u'GET',
             self.__make_url(u'/api/query_results/' + str(query_result_id)),
             headers=self.__make_headers()
         )
 
+    def stream_query_result(self, query_result_id: int) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定したidのQueryResultを返す。
+
+        get_query_resultメソッドと異なり、レスポンスボディは読み込まずに返すため(stream=True)、
+        呼び出し側でiter_contentメソッドなどを使って少しずつ読み出すこと。
+        :param query_result_id:
+        :return:
+        """
+        return self.__request(
+            u'GET',
+            self.__make_url(u'/api/query_results/' + str(query_result_id)),
+            headers=self.__make_headers(),
+            stream=True
+        )
+
+    def download_query_result(
+        self, query_result_id: int, file_format: str=u'csv'
+    ) -> 'Response':
+        u"""
+        サーバと疎通し、引数で指定したidのQueryResultを、サーバ側で変換済みのファイル形式で返す。
+
+        レスポンスボディは読み込まずに返すため(stream=True)、
+        呼び出し側でiter_contentメソッドなどを使って少しずつ読み出すこと。
+        :param query_result_id:
+        :param file_format: サーバ側で変換するファイル形式(csvかxlsx)。
+        :return:
+        """
+        return self.__request(
+            u'GET',
+            self.__make_url(
+                u'/api/query_results/' + str(query_result_id)
+                + u'.' + file_format),
+            headers=self.__make_headers(),
+            stream=True
+        )
+
     def kill_job(self, job_id: str) -> 'Response':
         u"""
         サーバと疎通し、引数で指定したidのジョブの実行を停止する。
@@ -189,7 +372,7 @@ class Gateway:
         :return:
         """
         return self.__request(
-            delete,
+            u'DELETE',
             self.__make_url(u'/api/jobs/' + job_id),
             headers=self.__make_headers()
         )
@@ -223,19 +406,73 @@ class Gateway:
 
     def __request(
         self,
-        request_method: Callable[..., Response],
+        method: str,
         *params: [Any],
         **keyword_params: Dict[str, Any]
     ) -> 'Response':
         u"""
         サーバへリクエストを行う。ステータスコードが200以外の場合は例外を送出する。
 
-        :param request_method: 実際にリクエスト処理を行う関数。
-        :param params: 第一引数の関数に渡す引数。
-        :param keyword_params: 第一引数に渡す引数(キーワード付きの引数)。
+        リクエストは、接続情報毎に共有されるSessionオブジェクトを経由して行う。
+        一時的なエラーで失敗した場合は、RetryPolicyに従って間隔を空けて再試行し、
+        再試行しない(または試行回数の上限に達した)場合に例外を送出する。
+        :param method: HTTPメソッド名('GET'、'POST'、'DELETE'など)。
+        :param params: Session.requestメソッドに渡す引数(メソッド名以降)。
+        :param keyword_params: Session.requestメソッドに渡す引数(キーワード付きの引数)。
         :return: Responseオブジェクト。
         """
-        # 補足: *や**を実引数に付けると、リストや辞書の要素を展開し実引数として渡すことができる。
-        response = request_method(*params, **keyword_params)
-        response.raise_for_status()
-        return response
+        session = get_session(self.__con)
+        policy = self.__con.get_retry_policy()
+        rate_limiter = get_rate_limiter(self.__con)
+
+        attempt = 1
+        while True:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+
+            try:
+                # 補足: *や**を実引数に付けると、リストや辞書の要素を展開し実引数として渡すことができる。
+                response = session.request(method, *params, **keyword_params)
+            except RequestException as e:
+                if not policy.should_retry_error(method, e, attempt):
+                    raise
+                backoff = policy.get_backoff(attempt)
+                reason = repr(e)
+            else:
+                if not policy.should_retry_response(
+                        method, response, attempt):
+                    response.raise_for_status()
+                    return response
+                backoff = policy.get_backoff(attempt, response)
+                reason = str(response.status_code)
+                if response.status_code == 429 and rate_limiter is not None:
+                    # サーバ側で制限されている間は、他の呼び出し元のリクエストも止める。
+                    rate_limiter.pause(backoff)
+                response.close()
+
+            logger.warning(
+                u'retrying %s %s in %.1f seconds (attempt %d): %s',
+                method, params[0] if params else u'', backoff, attempt,
+                reason)
+            sleep(backoff)
+            attempt += 1
+
+
+def get_gateway(connection_info: Optional['ConnectionInfo']) -> 'Gateway':
+    u"""
+    接続情報に対応する、共有のGatewayオブジェクトを返す。
+
+    Query・Jobなど、インスタンスが大量に生成されるクラスは、インスタンス毎にGatewayを持たず、これを使う。
+    共有しているため、返されたGatewayのset_connection_infoメソッドは呼び出さないこと。
+    :param connection_info: 接続情報を保持するオブジェクト。
+    :return: Gatewayオブジェクト。接続情報がNoneの場合は、共有しない新しいオブジェクト。
+    """
+    if connection_info is None:
+        return Gateway(None)
+
+    with _gateways_lock:
+        gateway = _gateways.get(id(connection_info))
+        if gateway is None:
+            gateway = Gateway(connection_info)
+            _gateways[id(connection_info)] = gateway
+        return gateway
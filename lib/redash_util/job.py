@@ -4,26 +4,75 @@ u"""
 
 * Job
 * JobStatus
+* PollingPolicy
 * JobManager
 """
 
+from asyncio import Semaphore, gather, get_event_loop
+from collections import OrderedDict
+from contextlib import closing
 from enum import IntEnum
-from typing import List, TYPE_CHECKING
+from logging import getLogger
+from os import remove, replace
+from os.path import abspath, dirname
+from random import uniform
+from tempfile import NamedTemporaryFile
+from time import monotonic, sleep
+from typing import \
+    Any, Callable, Dict, Iterable, Iterator, List, Optional, TYPE_CHECKING
 
-from .gateway import Gateway
+from requests import RequestException
 
-from .query_result import NullQueryResult, QueryResult
+from .async_gateway import get_async_gateway
+from .connection_info import ConnectionInfo
+from .gateway import get_gateway
+
+from .query_result import \
+    NullQueryResult, QueryResult, StreamingQueryResult
+from .result_stream import QueryResultStream
+
+if TYPE_CHECKING:
+    from requests import Response
+    from .query import Query
+    from .runtime_history import RuntimeHistory
+
+
+logger = getLogger(__name__)
 
 
 class Job:
-    u"""Redash上でクエリを実行した際に発行されるジョブを表すクラス。"""
+    u"""
+    Redash上でクエリを実行した際に発行されるジョブを表すクラス。
+
+    補足:
+    ・大量のインスタンスを保持してもメモリを消費しないよう、__slots__を使い、
+      ジョブ状態取得APIのレスポンスのうち、FIELDSに挙げたプロパティだけを保持する。
+    ・サーバとの疎通には、接続情報毎に共有されるGateway(get_gateway関数を参照)を使う。
+    ・statusはプロパティであり、値が変わると、add_status_listenerメソッドで登録した関数を呼び出す。
+      JobManagerは、これを使ってステータス毎のジョブの集合を更新する。
+    """
+
+    # download_resultメソッドで、一度にファイルへ書き出すバイト数。
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+    # ジョブ状態取得APIのレスポンスのうち、このクラスで保持するプロパティ。
+    FIELDS = (u'id', u'status', u'query_result_id', u'error', u'updated_at')
+
+    # (statusはプロパティとするため、値は__statusに保持する。)
+    __slots__ = tuple(name for name in FIELDS if name != u'status') + (
+        u'query_id', u'query_name', u'parameters', u'__status',
+        u'__status_listeners', u'__query_result', u'__query',
+        u'__submitted_at', u'__gateway')
 
     def __init__(
         self,
         job_id: str=u'',
         query_id: int=0,
         connection_info: 'ConnectionInfo'=None,
-        query_name: str=u''
+        query_name: str=u'',
+        parameters: Dict[str, str]=None,
+        query_result: Dict[str, Any]=None,
+        query: 'Query'=None
     ) -> None:
         u"""
         コンストラクタ。
@@ -32,18 +81,61 @@ class Job:
         :param query_id: このジョブに対応するクエリのid。
         :param connection_info: 接続情報を保持するオブジェクト。
         :param query_name: 対応するクエリの名称。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータのキーとバリュー。
+        :param query_result: サーバ上の実行結果を再利用した場合の、実行結果の辞書。
+                             指定した場合、このジョブは生成時点で成功した状態となる。
+        :param query: このジョブを発行したQueryオブジェクト。指定した場合、resubmitメソッドで再実行できる。
         """
         self.id = job_id
         self.query_id = query_id
         self.query_name = query_name
+        self.parameters = parameters or {}
+        # ステータスが変わった際に呼び出す関数(登録されるまではNone)。
+        self.__status_listeners = None  # type: List[Callable]
+        self.__status = JobStatus.pending
 
         # その他のプロパティに、デフォルト値を設定しておく。
-        self.status = JobStatus.pending
         self.query_result_id = None
         self.error = u''
         self.updated_at = 0
 
-        self.__gateway = Gateway(connection_info)
+        # 実行結果を取得済みの場合は、get_resultメソッドでサーバと疎通せずにこれを使う。
+        self.__query_result = query_result
+        if query_result is not None:
+            self.status = JobStatus.success
+            self.query_result_id = query_result.get(u'id')
+
+        # 再実行に使うクエリと、ジョブを発行した時刻(monotonic)。
+        self.__query = query
+        self.__submitted_at = monotonic()
+
+        self.__gateway = get_gateway(connection_info)
+
+    @property
+    def status(self) -> int:
+        u"""このジョブの現在のステータス。"""
+        return self.__status
+
+    @status.setter
+    def status(self, status: int) -> None:
+        previous_status = self.__status
+        self.__status = status
+        if self.__status_listeners and previous_status != status:
+            for listener in self.__status_listeners:
+                listener(self, previous_status, status)
+
+    def add_status_listener(
+        self, listener: Callable[['Job', int, int], None]
+    ) -> None:
+        u"""
+        このジョブのステータスが変わった際に呼び出す関数を登録する。
+
+        :param listener: ジョブ、変更前のステータス、変更後のステータスを引数に取る関数。
+        :return:
+        """
+        if self.__status_listeners is None:
+            self.__status_listeners = []
+        self.__status_listeners.append(listener)
 
     def set_connection_info(self, connection_info: 'ConnectionInfo') -> None:
         u"""
@@ -52,7 +144,7 @@ class Job:
         :param connection_info:
         :return:
         """
-        self.__gateway.set_connection_info(connection_info)
+        self.__gateway = get_gateway(connection_info)
 
     def update(self) -> int:
         u"""
@@ -61,11 +153,14 @@ class Job:
         :return: 更新後のジョブの状態を表すint値。
         """
         response = self.__gateway.update_job_status(self.id)
+        return self.__set_properties_from(response)
 
-        for key, value in response.json()[u'job'].items():
-            setattr(self, key, value)
-
-        return self.status
+    async def async_update(self) -> int:
+        u"""updateメソッドのコルーチン版。"""
+        async_gateway = get_async_gateway(
+            self.__gateway.get_connection_info())
+        response = await async_gateway.update_job_status(self.id)
+        return self.__set_properties_from(response)
 
     def get_result(self) -> 'QueryResult':
         u"""
@@ -74,16 +169,76 @@ class Job:
         :return: ジョブの実行結果を保持するオブジェクト。ジョブ実行中や実行失敗した場合に呼び出すと、ヌルオブジェクトを返す。
         """
         if self.status == JobStatus.success:
-            response = self.__gateway.get_query_result(self.query_result_id)
-            query_result_dict = response.json()[u'query_result']
-
-            # QueryResult側でクエリ名を知りたいことがあるため、追加で設定しておく。
+            if self.__query_result is not None:
+                query_result_dict = dict(self.__query_result)
+            else:
+                response = self.__gateway.get_query_result(
+                    self.query_result_id)
+                query_result_dict = response.json()[u'query_result']
+
+            # QueryResult側でクエリ名やパラメータを知りたいことがあるため、追加で設定しておく。
+            query_result_dict[u'query_id'] = self.query_id
             query_result_dict[u'query_name'] = self.query_name
+            query_result_dict[u'parameters'] = self.parameters
 
             return QueryResult(query_result_dict)
         else:
             return NullQueryResult({})
 
+    def stream_result(
+        self, batch_size: int=QueryResultStream.DEFAULT_BATCH_SIZE
+    ) -> 'QueryResult':
+        u"""
+        get_resultメソッドと同じだが、サーバ上の実行結果を、シリアライズする際に少しずつ読み込むオブジェクトを返す。
+
+        レスポンスボディを読み込みながら、batch_size行ずつ変換して書き出すため(StreamingQueryResultを参照)、
+        レスポンスボディ全体と全ての行を同時に持たず、メモリ使用量はおよそbatch_size行分で一定になる。
+        サーバ上の実行結果を再利用した場合(生成時に実行結果を渡した場合)は、get_resultメソッドと同じ結果を返す。
+        :param batch_size: 一度に変換して書き出す行数。
+        :return: ジョブの実行結果を保持するオブジェクト。ジョブ実行中や実行失敗した場合に呼び出すと、ヌルオブジェクトを返す。
+        """
+        if self.status != JobStatus.success or self.__query_result is not None:
+            return self.get_result()
+
+        response = self.__gateway.stream_query_result(self.query_result_id)
+        return StreamingQueryResult({
+            u'query_id': self.query_id,
+            u'query_name': self.query_name,
+            u'parameters': self.parameters,
+        }, response, batch_size)
+
+    def download_result(self, file_path: str, file_format: str=u'csv') -> bool:
+        u"""
+        このジョブが成功した場合に、サーバ側で変換済みのクエリの実行結果を、そのままファイルに書き出す。
+
+        get_resultメソッドと異なり、結果をPythonのオブジェクトに変換せず、
+        レスポンスボディを一定サイズずつファイルに書き出すため、結果のサイズによらずメモリ使用量は一定になる。
+        書き出しに失敗した場合も、レスポンスは閉じ(コネクションをプールに戻し)、書き出し途中のファイルは残さない。
+        :param file_path: ファイルのパス。
+        :param file_format: サーバ側で変換するファイル形式(csvかxlsx)。
+        :return: ファイルに書き出した場合はTrue。ジョブ実行中や実行失敗した場合はFalse。
+        """
+        if self.status != JobStatus.success:
+            return False
+
+        response = self.__gateway.download_query_result(
+            self.query_result_id, file_format)
+        with closing(response):
+            # 書き出し途中のファイルが残らないよう、一時ファイルに書いてから置き換える。
+            file = NamedTemporaryFile(
+                u'wb', dir=dirname(abspath(file_path)), suffix=u'.tmp',
+                delete=False)
+            try:
+                with file:
+                    for chunk in response.iter_content(
+                            self.DOWNLOAD_CHUNK_SIZE):
+                        file.write(chunk)
+                replace(file.name, file_path)
+            except BaseException:
+                remove(file.name)
+                raise
+        return True
+
     def kill(self) -> None:
         u"""
         RedashサーバとAPI疎通し、ジョブの実行を停止する。
@@ -98,6 +253,62 @@ class Job:
         """
         self.__gateway.kill_job(self.id)
 
+    def time_out(self) -> None:
+        u"""
+        時間切れとして、RedashサーバとAPI疎通してジョブの実行を停止し、ステータスをtimeoutにする。
+
+        killメソッドの注意点の通り、データソースによっては(TreasureDataなど)、
+        Redash上のジョブを停止しても、バックエンドのシステムではクエリが実行され続けることがある。
+        そのため、ステータスはfailureと区別し、errorにもその旨を記載する。
+        停止に失敗した場合(既にジョブが終了していた場合など)も、ステータスはtimeoutにする。
+        :return:
+        """
+        elapsed = self.get_elapsed()
+        try:
+            self.kill()
+        except RequestException as e:
+            logger.warning(u'failed to kill the job %s: %s', self.id, e)
+
+        self.status = JobStatus.timeout
+        self.error = (
+            u'timed out after {:.1f} seconds. The job was killed on Redash, '
+            u'but the query may still be running on the data source '
+            u'(e.g. TreasureData).'
+        ).format(elapsed)
+
+    def can_resubmit(self) -> bool:
+        u"""
+        resubmitメソッドで再実行できるかどうか(発行したクエリを保持しているかどうか)を返す。
+
+        :return:
+        """
+        return self.__query is not None
+
+    def resubmit(self) -> None:
+        u"""
+        このジョブを発行したクエリを、同じパラメータで再実行し、このインスタンスを新しいジョブの状態にする。
+
+        インスタンス自体は変わらないため、JobManagerなどに登録したまま再実行できる。
+        サーバ上の実行結果は再利用せず、必ず再実行する。
+        :return:
+        """
+        job = self.__query.execute_with(self.parameters)
+        self.id = job.id
+        self.status = job.status
+        self.query_result_id = job.query_result_id
+        self.error = job.error
+        self.updated_at = job.updated_at
+        self.__query_result = job.__query_result
+        self.__submitted_at = monotonic()
+
+    def get_elapsed(self) -> float:
+        u"""
+        このジョブを発行(または再実行)してからの経過秒数を返す。
+
+        :return:
+        """
+        return monotonic() - self.__submitted_at
+
     def get_status(self) -> int:
         u"""
         このジョブの現在のステータスを返す。
@@ -106,6 +317,44 @@ class Job:
         """
         return self.status
 
+    def get_query_name(self) -> str:
+        u"""
+        このジョブに対応するクエリの名称を返す。
+
+        :return:
+        """
+        return self.query_name
+
+    def get_parameters(self) -> Dict[str, str]:
+        u"""
+        このジョブの実行時にバインドしたクエリパラメータを返す。
+
+        :return:
+        """
+        return self.parameters
+
+    def is_finished(self) -> bool:
+        u"""
+        このジョブが終了済み(成功、失敗または時間切れ)かどうかを返す。
+
+        :return: 終了済みならTrue。
+        """
+        return self.status in FINISHED_STATUSES
+
+    def __set_properties_from(self, response: 'Response') -> int:
+        u"""
+        ジョブ状態取得APIのレスポンスの内容のうち、FIELDSに挙げたものを、このインスタンスのプロパティとしてセットする。
+
+        :param response: ジョブ状態取得APIのレスポンス。
+        :return: 更新後のジョブの状態を表すint値。
+        """
+        properties = response.json()[u'job']
+        for name in self.FIELDS:
+            if name in properties:
+                setattr(self, name, properties[name])
+
+        return self.status
+
 
 class JobStatus(IntEnum):
     u"""
@@ -114,45 +363,423 @@ class JobStatus(IntEnum):
     Redash上では、QueryTaskクラスでジョブステータスの定数値が定義されている。
     このクラスの定数値は、上記定数値と対応させている。
     https://github.com/getredash/redash/blob/66a5e394de727849234043d715b926506cc3464e/redash/tasks/queries.py#L138
+
+    ただし、timeoutはRedash上には無い、このライブラリ独自の状態である。
+    時間切れでkillしたジョブを表し、バックエンドのシステムではクエリが実行され続けている可能性がある。
     """
 
     null    = 0,
     pending = 1,
     running = 2,
     success = 3,
-    failure = 4
+    failure = 4,
+    timeout = 5
+
+
+# 終了済み(成功、失敗または時間切れ)を表すステータス。
+FINISHED_STATUSES = frozenset(
+    [JobStatus.success, JobStatus.failure, JobStatus.timeout])
+
+
+class PollingPolicy:
+    u"""
+    ジョブの状態取得(ポーリング)の間隔を決めるクラス。
+
+    ジョブ毎に、状態が変化しない限りポーリング間隔を指数的に延ばしていく(exponential backoff)。
+    また、多数のジョブのポーリングが同じタイミングに集中しないよう、間隔にゆらぎ(jitter)を加える。
+    """
+
+    def __init__(
+        self,
+        initial_interval: float=1.0,
+        max_interval: float=30.0,
+        multiplier: float=2.0,
+        jitter: float=0.5
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param initial_interval: 最初のポーリング間隔(秒)。ジョブの状態が変化した際も、この値に戻す。
+        :param max_interval: ポーリング間隔の上限(秒)。
+        :param multiplier: 状態が変化しなかった場合に、ポーリング間隔に掛ける倍率。
+        :param jitter: ゆらぎの割合(0〜1)。
+                       実際の間隔は、interval * (1 - jitter)〜intervalの一様乱数となる。
+        """
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def get_initial_interval(self) -> float:
+        u"""
+        最初のポーリング間隔を返す。
+
+        :return:
+        """
+        return self.initial_interval
+
+    def next_interval(self, interval: float) -> float:
+        u"""
+        状態が変化しなかった場合の、次のポーリング間隔を返す。
+
+        :param interval: 現在のポーリング間隔。
+        :return:
+        """
+        return min(interval * self.multiplier, self.max_interval)
+
+    def add_jitter(self, interval: float) -> float:
+        u"""
+        ポーリング間隔に、ゆらぎを加えた値を返す。
+
+        :param interval: ポーリング間隔。
+        :return:
+        """
+        return uniform(interval * (1.0 - self.jitter), interval)
 
 
 class JobManager:
-    u"""Redash上のジョブをまとめて管理するクラス。"""
+    u"""
+    Redash上のジョブをまとめて管理するクラス。
+
+    補足:
+    ・job_timeoutを指定した場合、発行からjob_timeout秒を過ぎても終わらないジョブは、killしてtimeoutの状態にする。
+      max_retriesを指定した場合は、時間切れのジョブを、間隔を空けて(retry_backoff秒から倍々に延ばす)再実行する。
+    ・total_timeoutを指定した場合、待機を始めてからtotal_timeout秒を過ぎた時点で、
+      終わっていない全てのジョブをkillしてtimeoutの状態にする(再実行はしない)。
+      deadlineと異なり、サーバ上にジョブを残さない。
+    ・ジョブをステータス毎の集合で管理し、ジョブのステータスが変わる度に更新する(Job.add_status_listenerを参照)。
+      そのため、finished・countメソッドはジョブの件数によらず定数時間で返り、
+      ポーリングの際も終了していないジョブだけを辿る。
+    """
 
-    def __init__(self, job_list: List['Job']=[]) -> None:
+    # 時間切れのジョブを再実行するまでの間隔のデフォルト値(秒)。
+    DEFAULT_RETRY_BACKOFF = 5.0
+
+    def __init__(
+        self,
+        job_list: List['Job']=None,
+        max_in_flight: int=ConnectionInfo.DEFAULT_POOL_SIZE,
+        polling_policy: 'PollingPolicy'=None,
+        runtime_history: 'RuntimeHistory'=None,
+        job_timeout: float=None,
+        total_timeout: float=None,
+        max_retries: int=0,
+        retry_backoff: float=DEFAULT_RETRY_BACKOFF
+    ) -> None:
         u"""
         コンストラクタ。
 
         :param job_list: ジョブ配列。
+        :param max_in_flight: 非同期モードで更新する際に、同時に行うリクエスト数の上限。
+        :param polling_policy: waitメソッドでのポーリング間隔を決めるオブジェクト。
+        :param runtime_history: 成功したジョブの実行時間を記録するオブジェクト。
+        :param job_timeout: ジョブ毎の、発行してから終了するまでの時間の上限(秒)。Noneの場合は上限なし。
+        :param total_timeout: 待機を始めてから、全てのジョブが終了するまでの時間の上限(秒)。Noneの場合は上限なし。
+        :param max_retries: job_timeoutで時間切れになったジョブを、再実行する回数の上限。
+        :param retry_backoff: 時間切れのジョブを、最初に再実行するまでの間隔(秒)。
+        """
+        self.__job_list = []  # type: List[Job]
+        # ステータス毎の、そのステータスのジョブの集合(追加した順を保つため、OrderedDictのキーとして保持する)。
+        self.__jobs_by_status = {}  # type: Dict[int, OrderedDict]
+        # 終了していないジョブの集合。
+        self.__unfinished_jobs = OrderedDict()  # type: OrderedDict
+        self.__register(job_list or [])
+        self.__max_in_flight = max_in_flight
+        self.__polling_policy = polling_policy or PollingPolicy()
+        self.__runtime_history = runtime_history
+        self.set_timeouts(
+            job_timeout, total_timeout, max_retries, retry_backoff)
+
+        # サーバへジョブの状態を問い合わせた回数。
+        self.__poll_count = 0
+        # total_timeoutで待機を打ち切った場合はTrue。
+        self.__expired = False
+
+    def set_max_in_flight(self, max_in_flight: int) -> None:
+        u"""
+        非同期モードで更新する際に、同時に行うリクエスト数の上限をセットする。
+
+        :param max_in_flight:
+        :return:
+        """
+        self.__max_in_flight = max_in_flight
+
+    def set_timeouts(
+        self,
+        job_timeout: float=None,
+        total_timeout: float=None,
+        max_retries: int=0,
+        retry_backoff: float=DEFAULT_RETRY_BACKOFF
+    ) -> None:
+        u"""
+        ジョブ毎と全体の時間の上限、時間切れのジョブの再実行の仕方をセットする。
+
+        :param job_timeout: ジョブ毎の、発行してから終了するまでの時間の上限(秒)。Noneの場合は上限なし。
+        :param total_timeout: 待機を始めてから、全てのジョブが終了するまでの時間の上限(秒)。Noneの場合は上限なし。
+        :param max_retries: job_timeoutで時間切れになったジョブを、再実行する回数の上限。
+        :param retry_backoff: 時間切れのジョブを、最初に再実行するまでの間隔(秒)。
+        :return:
+        """
+        self.__job_timeout = job_timeout
+        self.__total_timeout = total_timeout
+        self.__max_retries = max_retries
+        self.__retry_backoff = retry_backoff
+
+    def expired(self) -> bool:
+        u"""
+        total_timeoutを過ぎて、待機を打ち切ったかどうかを返す。
+
+        :return:
         """
-        self.__job_list = job_list
+        return self.__expired
+
+    def set_runtime_history(self, runtime_history: 'RuntimeHistory') -> None:
+        u"""
+        成功したジョブの実行時間を記録するオブジェクトをセットする。
+
+        :param runtime_history:
+        :return:
+        """
+        self.__runtime_history = runtime_history
+
+    def get_runtime_history(self) -> Optional['RuntimeHistory']:
+        u"""
+        成功したジョブの実行時間を記録するオブジェクトを返す(セットされていない場合はNone)。
+
+        :return:
+        """
+        return self.__runtime_history
+
+    def record_runtime(self, query_result: 'QueryResult') -> None:
+        u"""
+        クエリの実行結果が持つ実行時間(runtime)を、クエリのid毎に記録する。
+
+        実行時間を記録するオブジェクトがセットされていない場合は、何もしない。
+        :param query_result: クエリの実行結果。
+        :return:
+        """
+        runtime = getattr(query_result, u'runtime', None)
+        if self.__runtime_history is None or runtime is None:
+            return
+        self.__runtime_history.record(query_result.get_query_id(), runtime)
 
     def add(self, job_list: List['Job']) -> None:
         u"""
         このインスタンスに、ジョブ配列を追加する。
 
+        既に追加済みのジョブは、無視する。
         :param job_list: ジョブ配列。
         :return:
         """
-        self.__job_list = self.__job_list + job_list
+        self.__register(job_list)
 
     def update(self, async: bool=False) -> None:
         u"""
-        このインスタンスに登録されたジョブをまとめて更新する。
+        このインスタンスに登録されたジョブのうち、終了していないものをまとめて更新する。
 
-        TODO:
-        非同期モードを後ほど実装すること。
+        非同期モードでは、同時に行うリクエスト数をmax_in_flightまでに制限しつつ、
+        各ジョブの状態取得を並行して行う。
         :param async: Trueの場合、非同期でジョブの更新処理を行う。
         """
+        self.__poll(self.__get_unfinished_jobs(), async)
+
+    def wait(
+        self, deadline: Optional[float]=None, concurrent: bool=True
+    ) -> bool:
+        u"""
+        全てのジョブが終了するまで、ポーリング間隔を調整しながらジョブの状態を更新し続ける。
+
+        各ジョブは、PollingPolicyに従って個別の間隔でポーリングされる。
+        状態が変化しない間は間隔を延ばし、状態が変化したら最初の間隔に戻す。
+        ポーリングすべきジョブが無い間は、次のポーリング時刻までスリープする。
+        :param deadline: 待機する時間の上限(秒)。Noneの場合、全てのジョブが終了するまで待機する。
+        :param concurrent: Trueの場合、同じタイミングでポーリングするジョブの状態取得を並行して行う。
+        :return: 全てのジョブが終了していればTrue。deadlineを過ぎて待機を打ち切った場合はFalse。
+        """
+        for job in self.iter_finished_jobs(deadline, concurrent):
+            pass
+        return self.finished()
+
+    def iter_completed(
+        self,
+        deadline: Optional[float]=None,
+        concurrent: bool=True,
+        batch_size: Optional[int]=None
+    ) -> Iterator['QueryResult']:
+        u"""
+        ジョブが成功した順に、そのジョブの実行結果を返すイテレータ。
+
+        ポーリングの仕方はwaitメソッドと同じだが、ジョブが成功した時点で結果を取得して返すため、
+        結果の取得・書き出しと、他のジョブの実行とを並行させることができる。
+        失敗したジョブの結果は返さない。
+        deadlineを過ぎて打ち切られたかどうかは、イテレート後にfinishedメソッドで確認すること。
+        :param deadline: 待機する時間の上限(秒)。Noneの場合、全てのジョブが終了するまで待機する。
+        :param concurrent: Trueの場合、同じタイミングでポーリングするジョブの状態取得を並行して行う。
+        :param batch_size: 指定した場合、batch_size行ずつ読み込む結果(Job.stream_resultを参照)を返す。
+                           この場合、実行時間は呼び出し側が結果をシリアライズし終えた後に記録する。
+        :return: ジョブの実行結果を保持するオブジェクトのイテレータ。
+        """
+        yield from self.iter_results(
+            self.iter_finished_jobs(deadline, concurrent), batch_size)
+
+    def iter_results(
+        self, jobs: Iterable['Job'], batch_size: Optional[int]=None
+    ) -> Iterator['QueryResult']:
+        u"""
+        終了したジョブのうち、成功したものの実行結果を順に返し、実行時間を記録する。
+
+        iter_completedメソッドと、JobSchedulerのiter_completedメソッドで共有する。
+        :param jobs: 終了したジョブのイテラブル(iter_finished_jobsメソッドの戻り値など)。
+        :param batch_size: 指定した場合、batch_size行ずつ読み込む結果(Job.stream_resultを参照)を返す。
+                           この場合、実行時間は呼び出し側が結果をシリアライズし終えた後に記録する。
+        :return: ジョブの実行結果を保持するオブジェクトのイテレータ。
+        """
+        for job in jobs:
+            if job.get_status() != JobStatus.success:
+                continue
+            if batch_size is None:
+                result = job.get_result()
+                self.record_runtime(result)
+                yield result
+            else:
+                # (runtimeはrowsより後ろにあることがあるため、読み込み終えてから記録する。)
+                result = job.stream_result(batch_size)
+                yield result
+                self.record_runtime(result)
+
+    def iter_finished_jobs(
+        self, deadline: Optional[float]=None, concurrent: bool=True
+    ) -> Iterator['Job']:
+        u"""
+        ポーリング間隔を調整しながらジョブの状態を更新し、終了したジョブを終了した順に返す。
+
+        呼び出し時点で既に終了しているジョブは、最初に返す。
+        イテレート中にaddメソッドで追加された(終了していない)ジョブも、追加された時点からポーリングの対象とする。
+        時間切れでkillしたジョブも、終了したジョブとして返す(再実行する場合は、再実行後に終了した時点で返す)。
+        全てのジョブが終了するか、deadline(またはtotal_timeout)を過ぎた時点でイテレートを終える。
+        :param deadline: 待機する時間の上限(秒)。Noneの場合、全てのジョブが終了するまで待機する。
+        :param concurrent: Trueの場合、同じタイミングでポーリングするジョブの状態取得を並行して行う。
+        :return: 終了したジョブのイテレータ。
+        """
+        policy = self.__polling_policy
+        start = monotonic()
+        self.__expired = False
+
+        # ジョブ毎の、現在のポーリング間隔と次回のポーリング時刻。
+        intervals = {}  # type: Dict[Job, float]
+        next_poll_times = {}  # type: Dict[Job, float]
+        # 時間切れのジョブ毎の、再実行した回数と、再実行を待っているジョブの再実行時刻。
+        retry_counts = {}  # type: Dict[Job, int]
+        retry_times = {}  # type: Dict[Job, float]
         for job in self.__job_list:
-            job.update()
+            if job.is_finished():
+                yield job
+                continue
+            intervals[job] = policy.get_initial_interval()
+            next_poll_times[job] = start + policy.add_jitter(intervals[job])
+
+        while True:
+            unfinished_jobs = self.__get_unfinished_jobs()
+            if not unfinished_jobs and not retry_times:
+                return
+
+            now = monotonic()
+            if self.__total_timeout is not None \
+                    and now - start >= self.__total_timeout:
+                # 終わっていない全てのジョブを時間切れとし、打ち切る。
+                self.__expired = True
+                for job in unfinished_jobs:
+                    job.time_out()
+                for job in unfinished_jobs + list(retry_times):
+                    yield job
+                return
+            if deadline is not None and now - start >= deadline:
+                return
+
+            # 再実行時刻を迎えたジョブを、再実行する。
+            for job in [job for job, retry_time in retry_times.items()
+                        if retry_time <= now]:
+                del retry_times[job]
+                job.resubmit()
+                logger.info(
+                    u'resubmitted the timed out job: %s (retry %d)',
+                    job.get_query_name(), retry_counts[job])
+                next_poll_times.pop(job, None)
+                if job.is_finished():
+                    yield job
+            unfinished_jobs = self.__get_unfinished_jobs()
+
+            # イテレート中に追加(または再実行)されたジョブは、最初の間隔でポーリングを始める。
+            for job in unfinished_jobs:
+                if job not in next_poll_times:
+                    intervals[job] = policy.get_initial_interval()
+                    next_poll_times[job] = \
+                        now + policy.add_jitter(intervals[job])
+
+            # ポーリング時刻を迎えたジョブだけ状態を更新する。
+            due_jobs = [
+                job for job in unfinished_jobs if next_poll_times[job] <= now]
+            previous_statuses = [job.get_status() for job in due_jobs]
+            self.__poll(due_jobs, concurrent)
+
+            # 状態が変化したジョブは間隔を戻し、変化しなかったジョブは間隔を延ばす。
+            polled_at = monotonic()
+            for job, previous_status in zip(due_jobs, previous_statuses):
+                if job.get_status() != previous_status:
+                    intervals[job] = policy.get_initial_interval()
+                else:
+                    intervals[job] = policy.next_interval(intervals[job])
+                next_poll_times[job] = \
+                    polled_at + policy.add_jitter(intervals[job])
+
+            # 今回のポーリングで終了したジョブを返す。
+            for job in due_jobs:
+                if job.is_finished():
+                    yield job
+
+            # 発行からjob_timeout秒を過ぎたジョブをkillし、再実行するか、終了したジョブとして返す。
+            for job in self.__get_timed_out_jobs():
+                job.time_out()
+                retry_count = retry_counts.get(job, 0)
+                if retry_count < self.__max_retries and job.can_resubmit():
+                    retry_counts[job] = retry_count + 1
+                    retry_times[job] = monotonic() \
+                        + self.__retry_backoff * 2 ** retry_count
+                    logger.warning(
+                        u'job timed out and will be retried: %s',
+                        job.get_query_name())
+                else:
+                    yield job
+
+            # 次にポーリングすべき時刻まで(deadlineを超えない範囲で)スリープする。
+            # (終了したジョブの処理に時間がかかった場合、その分スリープは短くなる。)
+            unfinished_jobs = self.__get_unfinished_jobs()
+            if not unfinished_jobs and not retry_times:
+                return
+            # (イテレート中に追加されたジョブがあれば、スリープせずに登録し直す。)
+            wake_up_times = [
+                next_poll_times.get(job, now) for job in unfinished_jobs]
+            wake_up_times += list(retry_times.values())
+            if self.__job_timeout is not None:
+                current = monotonic()
+                wake_up_times += [
+                    current + self.__job_timeout - job.get_elapsed()
+                    for job in unfinished_jobs]
+            if self.__total_timeout is not None:
+                wake_up_times.append(start + self.__total_timeout)
+            if deadline is not None:
+                wake_up_times.append(start + deadline)
+            sleep_time = min(wake_up_times) - monotonic()
+            if sleep_time > 0:
+                sleep(sleep_time)
+
+    def get_poll_count(self) -> int:
+        u"""
+        このインスタンスが、サーバへジョブの状態を問い合わせた回数を返す。
+
+        :return:
+        """
+        return self.__poll_count
 
     def count(self, job_status: int) -> int:
         u"""
@@ -161,23 +788,24 @@ class JobManager:
         :param job_status: ジョブのステータスを表すint値。
         :return: 対象のステータスのジョブの件数。
         """
-        count = 0
-        for job in self.__job_list:
-            if job.get_status() == job_status:
-                count += 1
-        return count
+        return len(self.__jobs_by_status.get(job_status, ()))
+
+    def get_jobs(self, job_status: int) -> List['Job']:
+        u"""
+        引数で指定したステータスのジョブの配列を返す。
+
+        :param job_status: ジョブのステータスを表すint値。
+        :return: 対象のステータスのジョブの配列(そのステータスになった順)。
+        """
+        return list(self.__jobs_by_status.get(job_status, ()))
 
     def finished(self) -> bool:
         u"""
-        全てのジョブが終了済みかどうかチェックして返す。
+        全てのジョブが終了済み(成功、失敗または時間切れ)かどうかチェックして返す。
 
         :return: 全てのジョブが終了済みならTrue。
         """
-        for job in self.__job_list:
-            if (job.get_status() != JobStatus.success) and \
-               (job.get_status() != JobStatus.failure):
-                return False
-        return True
+        return not self.__unfinished_jobs
 
     def get_query_result_list(self) -> List['QueryResult']:
         u"""
@@ -192,3 +820,119 @@ class JobManager:
                 # typeで型チェックしていることに注意(サブクラスの場合は該当しない)。
                 query_result_list.append(query_result)
         return query_result_list
+
+    def __get_unfinished_jobs(self) -> List['Job']:
+        u"""
+        終了していないジョブの配列を返す。
+
+        :return:
+        """
+        return list(self.__unfinished_jobs)
+
+    def __register(self, job_list: List['Job']) -> None:
+        u"""
+        ジョブを登録し、ステータスの変化を受け取るようにする。既に登録済みのジョブは無視する。
+
+        :param job_list: ジョブ配列。
+        :return:
+        """
+        for job in job_list:
+            if job in self.__jobs_by_status.get(job.get_status(), ()):
+                continue
+            self.__job_list.append(job)
+            self.__index(job, job.get_status())
+            job.add_status_listener(self.__on_status_changed)
+
+    def __index(self, job: 'Job', job_status: int) -> None:
+        u"""
+        ジョブを、ステータス毎の集合と、終了していないジョブの集合に登録する。
+
+        :param job: 登録するジョブ。
+        :param job_status: ジョブのステータス。
+        :return:
+        """
+        self.__jobs_by_status.setdefault(job_status, OrderedDict())[job] = None
+        if job_status not in FINISHED_STATUSES:
+            self.__unfinished_jobs[job] = None
+
+    def __on_status_changed(
+        self, job: 'Job', previous_status: int, job_status: int
+    ) -> None:
+        u"""
+        ジョブのステータスが変わった際に、ステータス毎の集合を更新する。
+
+        :param job: ステータスが変わったジョブ。
+        :param previous_status: 変更前のステータス。
+        :param job_status: 変更後のステータス。
+        :return:
+        """
+        self.__jobs_by_status.get(previous_status, {}).pop(job, None)
+        if job_status in FINISHED_STATUSES:
+            self.__unfinished_jobs.pop(job, None)
+        self.__index(job, job_status)
+
+    def __get_timed_out_jobs(self) -> List['Job']:
+        u"""
+        終了していないジョブのうち、発行からjob_timeout秒を過ぎたものの配列を返す。
+
+        :return:
+        """
+        if self.__job_timeout is None:
+            return []
+        return [
+            job for job in self.__get_unfinished_jobs()
+            if job.get_elapsed() >= self.__job_timeout]
+
+    def __poll(self, job_list: List['Job'], concurrent: bool) -> None:
+        u"""
+        引数で渡したジョブの状態を更新し、問い合わせ回数を記録する。
+
+        (リトライしても)状態を取得できなかったジョブは、警告を出力して状態を変えずにおく。
+        他のジョブのポーリングは続け、そのジョブは次のポーリング時刻(間隔を延ばしたもの)に再度問い合わせる。
+        :param job_list: 更新対象のジョブ配列。
+        :param concurrent: Trueの場合、非同期でジョブの更新処理を行う。
+        :return:
+        """
+        self.__poll_count += len(job_list)
+
+        if concurrent:
+            get_event_loop().run_until_complete(
+                self.__update_concurrently(job_list))
+            return
+
+        for job in job_list:
+            try:
+                job.update()
+            except RequestException as e:
+                self.__warn_poll_failure(job, e)
+
+    async def __update_concurrently(self, job_list: List['Job']) -> None:
+        u"""
+        同時実行数を制限しつつ、ジョブの状態を並行して更新する。
+
+        :param job_list: 更新対象のジョブ配列。
+        :return:
+        """
+        semaphore = Semaphore(max(self.__max_in_flight, 1))
+
+        async def update(job: 'Job') -> None:
+            async with semaphore:
+                try:
+                    await job.async_update()
+                except RequestException as e:
+                    self.__warn_poll_failure(job, e)
+
+        await gather(*[update(job) for job in job_list])
+
+    @staticmethod
+    def __warn_poll_failure(job: 'Job', error: 'RequestException') -> None:
+        u"""
+        ジョブの状態を取得できなかったことを、警告として出力する。
+
+        :param job: 状態を取得できなかったジョブ。
+        :param error: 状態の取得時に送出された例外。
+        :return:
+        """
+        logger.warning(
+            u'could not poll the job %s (%s), will retry: %s',
+            job.id, job.get_query_name(), error)
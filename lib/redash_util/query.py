@@ -6,23 +6,50 @@ u"""
 * QueryList
 """
 
+from asyncio import Semaphore, gather
+from functools import partial
 from json import dumps, load
 from os import path
-from re import match, sub
-from typing import Any, Dict, List, TYPE_CHECKING
+from typing import \
+    Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Tuple, \
+    TYPE_CHECKING
 
 from lib.file_io_util import list_files_in
 
-from .gateway import Gateway
+from .async_gateway import get_async_gateway
+from .connection_info import ConnectionInfo
+from .gateway import get_gateway
 from .job import Job
-
+from .query_template import get_query_template
 
 if TYPE_CHECKING:
-    from .connection_info import ConnectionInfo
+    from requests import Response
+    from .async_gateway import AsyncGateway
+    from .query_catalog import QueryCatalog
 
 
 class Query:
-    u"""Redash上のクエリを表すクラス。"""
+    u"""
+    Redash上のクエリを表すクラス。
+
+    補足:
+    ・大量のインスタンスを保持してもメモリを消費しないよう、__slots__を使い、
+      サーバから得たプロパティのうちFIELDSに挙げたものだけを保持する。
+      それ以外のプロパティ(userやvisualizationsなど)は、まとめて一つの辞書に保持し、
+      シリアライズ時にも書き出す(get_payloadメソッドで、全てのプロパティを参照できる)。
+    ・FIELDSのうち、id・name・query以外は、サーバから得た場合のみセットされる
+      (参照する場合は、getattrでデフォルト値を指定すること)。
+    ・サーバとの疎通には、接続情報毎に共有されるGateway(get_gateway関数を参照)を使う。
+    """
+
+    # サーバから得たプロパティのうち、このクラスで保持するもの。
+    FIELDS = (
+        u'id', u'name', u'query', u'description', u'data_source_id',
+        u'query_hash', u'options', u'schedule', u'is_archived', u'is_draft',
+        u'can_edit', u'updated_at')
+
+    __slots__ = FIELDS + (
+        u'__gateway', u'__payload', u'__original_query', u'__value_bind_flag')
 
     def __init__(
         self,
@@ -36,11 +63,13 @@ class Query:
         :param connection_info: 接続情報を保持するオブジェクト。
         """
         self.id = query_id
-        self.__gateway = Gateway(connection_info)
+        self.__gateway = get_gateway(connection_info)
 
         self.query = u''
         self.name = u''
 
+        # サーバから得たプロパティのうち、FIELDS以外のもの(無い場合はNone)。
+        self.__payload = None  # type: Optional[Dict[str, Any]]
         # パラメータに値がバインドされる前のSQL文字列。
         self.__original_query = ''
         # パラメータがバインド済みかどうかを判断するフラグ。
@@ -53,13 +82,18 @@ class Query:
         :param connection_info:
         :return:
         """
-        self.__gateway.set_connection_info(connection_info)
+        self.__gateway = get_gateway(connection_info)
 
     def read(self) -> None:
         u"""RedashサーバとAPI疎通し、プロパティをこのインスタンスにセットする。"""
         response = self.__gateway.get_query(self.id)
         self.set_properties(response.json())
 
+    async def async_read(self) -> None:
+        u"""readメソッドのコルーチン版。"""
+        response = await self.__get_async_gateway().get_query(self.id)
+        self.set_properties(response.json())
+
     def update(self) -> None:
         u"""
         RedashサーバとAPI疎通し、このインスタンスに紐づくクエリのプロパティを更新する。
@@ -69,18 +103,68 @@ class Query:
         update_properties = self.__extract_update_props_as_dict()
         self.__gateway.update_query(self.id, update_properties)
 
-    def execute(self) -> 'Job':
+    async def async_update(self) -> None:
+        u"""updateメソッドのコルーチン版。"""
+        update_properties = self.__extract_update_props_as_dict()
+        await self.__get_async_gateway().update_query(
+            self.id, update_properties)
+
+    def execute(self, max_age: int=0) -> 'Job':
         u"""
         RedashサーバとAPI疎通し、クエリを再実行する。
 
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+                        0の場合、必ず再実行する。
         :return: クエリの実行状態を保持するJobクラス。
+                 サーバ上の実行結果を使った場合は、既に成功した状態のJobを返す。
         """
-        response = self.__gateway.execute_query(self.id)
-        return Job(
-            job_id=response.json()[u'job'][u'id'],
-            query_id=self.id,
-            connection_info=self.__gateway.get_connection_info(),
-            query_name=self.name)
+        return self.execute_with({}, max_age)
+
+    async def async_execute(self, max_age: int=0) -> 'Job':
+        u"""executeメソッドのコルーチン版。"""
+        return await self.async_execute_with({}, max_age)
+
+    def execute_with(
+        self, key_and_values: Dict[str, str], max_age: int=0
+    ) -> 'Job':
+        u"""
+        RedashサーバとAPI疎通し、クエリパラメータに値をバインドしたクエリを実行する。
+
+        バインドしたSQL文字列を実行リクエストに含めて送るため、
+        サーバ上のクエリや、このインスタンスのプロパティは書き換えない。
+        そのため、異なるパラメータでの実行を並行して行っても互いに干渉しない。
+        また、このクエリがいずれのパラメータも使っておらず、max_ageが0の場合は、クエリの再実行APIを使う。
+        :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+                        0の場合、必ず再実行する。
+        :return: クエリの実行状態を保持するJobクラス。
+                 サーバ上の実行結果を使った場合は、既に成功した状態のJobを返す。
+        """
+        if not self.uses_any_of(key_and_values) and max_age <= 0:
+            response = self.__gateway.execute_query(self.id)
+            return self.__make_job(response, key_and_values)
+
+        response = self.__gateway.execute_query_text(
+            self.render(key_and_values),
+            getattr(self, u'data_source_id', None),
+            self.id,
+            max_age)
+        return self.__make_job(response, key_and_values)
+
+    async def async_execute_with(
+        self, key_and_values: Dict[str, str], max_age: int=0
+    ) -> 'Job':
+        u"""execute_withメソッドのコルーチン版。"""
+        if not self.uses_any_of(key_and_values) and max_age <= 0:
+            response = await self.__get_async_gateway().execute_query(self.id)
+            return self.__make_job(response, key_and_values)
+
+        response = await self.__get_async_gateway().execute_query_text(
+            self.render(key_and_values),
+            getattr(self, u'data_source_id', None),
+            self.id,
+            max_age)
+        return self.__make_job(response, key_and_values)
 
     def fork(self) -> 'Query':
         u"""
@@ -89,12 +173,12 @@ class Query:
         :return: コピーしたQueryインスタンス。
         """
         response = self.__gateway.fork_query(self.id)
+        return self.__make_fork_query(response)
 
-        # 新規にQueryオブジェクトを作成して返す。
-        fork_query = Query(
-            connection_info=self.__gateway.get_connection_info())
-        fork_query.set_properties(response.json())
-        return fork_query
+    async def async_fork(self) -> 'Query':
+        u"""forkメソッドのコルーチン版。"""
+        response = await self.__get_async_gateway().fork_query(self.id)
+        return self.__make_fork_query(response)
 
     def archive(self) -> None:
         u"""
@@ -104,31 +188,85 @@ class Query:
         """
         self.__gateway.archive_query(self.id)
 
+    async def async_archive(self) -> None:
+        u"""archiveメソッドのコルーチン版。"""
+        await self.__get_async_gateway().archive_query(self.id)
+
     def set_properties(self, properties: Dict[str, Any]) -> None:
         u"""
         このインスタンスに、プロパティをまとめてセットする。
 
+        FIELDS以外のプロパティは、まとめて一つの辞書に保持する。
         :param properties: プロパティ名と値をまとめた辞書。
         """
         for name, value in properties.items():
-            setattr(self, name, value)
+            if name in self.FIELDS:
+                setattr(self, name, value)
+            elif self.__payload is None:
+                self.__payload = {name: value}
+            else:
+                self.__payload[name] = value
+
+    def get_payload(self) -> Dict[str, Any]:
+        u"""
+        このインスタンスが保持している全てのプロパティを、サーバから得た形式の辞書で返す。
 
-    def bind_values(self, key_and_values: Dict) -> None:
+        :return:
+        """
+        payload = dict(self.__payload or {})
+        for name in self.FIELDS:
+            if hasattr(self, name):
+                payload[name] = getattr(self, name)
+        return payload
+
+    def bind_values(self, key_and_values: Dict) -> bool:
         u"""
         このインスタンスのクエリにおける、クエリパラメータ部分に、実際の値をバインドする。
 
         :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+        :return: このクエリが使っているパラメータが含まれ、SQLが書き換わった場合はTrue。
+                 (Falseの場合、サーバ上のクエリを更新する必要はない。)
         """
+        if not self.uses_any_of(key_and_values):
+            return False
+
         # 現在のSQLを、一旦以下のプロパティに保存しておく。
         if not self.__value_bind_flag:
             self.__original_query = self.query
 
-        # SQL中の'{{ 変数名 }}'の箇所を、値に置き換える。
-        for key, value in key_and_values.items():
-            self.query = sub(r'{{ *' + key + ' *}}', value, self.query)
+        self.query = self.render(key_and_values)
 
         # フラグをonにする。
         self.__value_bind_flag = True
+        return True
+
+    def render(self, key_and_values: Dict[str, str]) -> str:
+        u"""
+        このインスタンスのクエリのクエリパラメータ部分に値をバインドした、SQL文字列を返す。
+
+        bind_valuesメソッドと異なり、このインスタンスのプロパティは書き換えない。
+        :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+        :return: 値をバインドしたSQL文字列。
+        """
+        # SQL中の'{{ 変数名 }}'の箇所を、値に置き換える。
+        return get_query_template(self.query).render(key_and_values)
+
+    def get_parameter_names(self) -> FrozenSet[str]:
+        u"""
+        このインスタンスのクエリが使っているクエリパラメータのキーの集合を返す。
+
+        :return:
+        """
+        return get_query_template(self.query).get_parameter_names()
+
+    def uses_any_of(self, key_and_values: Dict[str, str]) -> bool:
+        u"""
+        このインスタンスのクエリが、引数で渡したクエリパラメータのいずれかを使っているかどうかを返す。
+
+        :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+        :return: いずれかを使っていればTrue。
+        """
+        return not self.get_parameter_names().isdisjoint(key_and_values)
 
     def unbind_values(self) -> None:
         u"""このインスタンスのクエリにおける、クエリパラメータ部分をバインドされていない状態に復元する。"""
@@ -160,16 +298,9 @@ class Query:
         """
         self.__check_file_format_and_raise_exception(file_format)
 
-        # このインスタンスのプロパティを走査し、publicなメンバ変数だけ辞書に詰める。
-        tmp_dict = {}
-        for key, value in self.__dict__.items():
-            if match(r'^_Query.*', key):
-                continue
-            tmp_dict[key] = value
-
         # ファイルに書き出す(既に存在するファイルなら上書き)。
         with open(file_path, u'w') as file:
-            file.write(dumps(tmp_dict))
+            file.write(dumps(self.get_payload()))
 
     def deserialize(self, file_path: str, file_format: str) -> None:
         u"""
@@ -200,6 +331,55 @@ class Query:
         """
         return self.name
 
+    def __get_async_gateway(self) -> 'AsyncGateway':
+        u"""
+        このインスタンスと同じ接続情報を持つ、共有のAsyncGatewayオブジェクトを返す。
+
+        :return:
+        """
+        return get_async_gateway(self.__gateway.get_connection_info())
+
+    def __make_job(
+        self, response: 'Response', parameters: Dict[str, str]=None
+    ) -> 'Job':
+        u"""
+        クエリ実行APIのレスポンスから、Jobオブジェクトを生成する。
+
+        サーバ上の実行結果が使われた場合(レスポンスがジョブではなく実行結果を持つ場合)は、
+        その実行結果を保持した、成功状態のJobオブジェクトを生成する。
+        :param response: クエリ実行APIのレスポンス。
+        :param parameters: クエリ実行時にバインドしたクエリパラメータ。
+        :return: クエリの実行状態を保持するJobクラス。
+        """
+        body = response.json()
+        if u'query_result' in body:
+            return Job(
+                query_id=self.id,
+                connection_info=self.__gateway.get_connection_info(),
+                query_name=self.name,
+                parameters=parameters,
+                query_result=body[u'query_result'])
+
+        return Job(
+            job_id=body[u'job'][u'id'],
+            query_id=self.id,
+            connection_info=self.__gateway.get_connection_info(),
+            query_name=self.name,
+            parameters=parameters,
+            query=self)
+
+    def __make_fork_query(self, response: 'Response') -> 'Query':
+        u"""
+        フォークAPIのレスポンスから、新規にQueryオブジェクトを生成する。
+
+        :param response: フォークAPIのレスポンス。
+        :return: コピーしたQueryインスタンス。
+        """
+        fork_query = Query(
+            connection_info=self.__gateway.get_connection_info())
+        fork_query.set_properties(response.json())
+        return fork_query
+
     def __extract_update_props_as_dict(self) -> Dict[Any, Any]:
         u"""
         更新対象となるプロパティを抽出する。
@@ -239,13 +419,20 @@ class Query:
 class QueryList:
     u"""Redash上のクエリを表すクラス。"""
 
-    def __init__(self, connection_info: 'ConnectionInfo'=None) -> None:
+    def __init__(
+        self,
+        connection_info: 'ConnectionInfo'=None,
+        catalog: 'QueryCatalog'=None
+    ) -> None:
         u"""
         コンストラクタ。
 
         :param connection_info:
+        :param catalog: クエリ一覧のローカルキャッシュ。
+                        指定した場合、search_queries_byメソッドはこのキャッシュを検索する。
         """
-        self.__gateway = Gateway(connection_info)
+        self.__gateway = get_gateway(connection_info)
+        self.__catalog = catalog
         self.__queries = []
 
     def set_connection_info(self, connection_info: 'ConnectionInfo') -> None:
@@ -255,21 +442,37 @@ class QueryList:
         :param connection_info:
         :return:
         """
-        self.__gateway.set_connection_info(connection_info)
+        self.__gateway = get_gateway(connection_info)
+
+    def set_catalog(self, catalog: 'QueryCatalog') -> None:
+        u"""
+        クエリ一覧のローカルキャッシュをセットする(Noneの場合、サーバ上で検索する)。
+
+        :param catalog:
+        :return:
+        """
+        self.__catalog = catalog
 
     def search_queries_by(self, text: str) -> List['Query']:
         u"""
         文字列でクエリを検索し、該当するQueryオブジェクトをこのインスタンスにセットする。
 
+        ローカルキャッシュがセットされている場合は、サーバの検索APIを使わずにキャッシュを検索する。
+        (キャッシュが古くなっていれば、先にサーバ上のクエリ一覧と差分同期する。)
         :param text: 検索に使う文字列。
         :return: 検索条件に該当するQueryオブジェクトのリスト。
         """
-        response = self.__gateway.search_queries(text)
+        if self.__catalog is None:
+            found_properties = self.__gateway.search_queries(text).json()
+        else:
+            if not self.__catalog.is_fresh():
+                self.__catalog.sync()
+            found_properties = self.__catalog.search(text)
 
         # サーバから得られた辞書のリストを、Queryオブジェクトのリストに変換する。
         search_queries = []
-        for query_params in response.json():
-            query = Query(connection_info=self.__gateway.get_connection_info())
+        for query_params in found_properties:
+            query = self.__make_query()
             query.set_properties(query_params)
             search_queries.append(query)
         self.__queries += search_queries
@@ -304,7 +507,7 @@ class QueryList:
 
         # Queryオブジェクト生成。
         props = response.json()
-        query = Query(connection_info=self.__gateway.get_connection_info())
+        query = self.__make_query()
         query.set_properties(props)
 
         return query
@@ -319,18 +522,51 @@ class QueryList:
         for query in self.__queries:
             query.update()
 
-    def execute_in_bulk(self) -> List['Job']:
+    def execute_in_bulk(self, max_age: int=0) -> List['Job']:
         u"""
         RedashサーバとAPI疎通し、各クエリを実行する。
 
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う(Query.executeメソッドを参照)。
         :return: ジョブのリスト。
         """
         jobs = []
         for query in self.__queries:
-            job = query.execute()
+            job = query.execute(max_age)
             jobs.append(job)
         return jobs
 
+    def execute_with_in_bulk(
+        self, key_and_values: Dict[str, str], max_age: int=0
+    ) -> List['Job']:
+        u"""
+        RedashサーバとAPI疎通し、各クエリをクエリパラメータに値をバインドした状態で実行する。
+
+        サーバ上のクエリは書き換えない(Query.execute_withメソッドを参照)。
+        :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+        :return: ジョブのリスト。
+        """
+        jobs = []
+        for query in self.__queries:
+            jobs.append(query.execute_with(key_and_values, max_age))
+        return jobs
+
+    def execute_sweep(
+        self, parameter_sets: List[Dict[str, str]], max_age: int=0
+    ) -> List['Job']:
+        u"""
+        RedashサーバとAPI疎通し、各クエリを、各パラメータの組み合わせで実行する。
+
+        サーバ上のクエリは書き換えない(Query.execute_withメソッドを参照)。
+        :param parameter_sets: クエリパラメータのキーとバリューをまとめた辞書のリスト。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+        :return: ジョブのリスト(パラメータ毎に、このインスタンスが保持するクエリの順序で並ぶ)。
+        """
+        jobs = []
+        for key_and_values in parameter_sets:
+            jobs += self.execute_with_in_bulk(key_and_values, max_age)
+        return jobs
+
     def fork_in_bulk(self) -> List['Query']:
         u"""
         RedashサーバとAPI疎通し、各クエリをフォークする。
@@ -347,6 +583,112 @@ class QueryList:
         for query in self.__queries:
             query.archive()
 
+    async def async_read_in_bulk(self, concurrency: int=0) -> None:
+        u"""
+        read_in_bulkメソッドのコルーチン版。各クエリのリクエストを並行して行う。
+
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        """
+        await self.__run_concurrently(u'async_read', concurrency)
+
+    async def async_update_in_bulk(self, concurrency: int=0) -> None:
+        u"""
+        update_in_bulkメソッドのコルーチン版。各クエリのリクエストを並行して行う。
+
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        """
+        await self.__run_concurrently(u'async_update', concurrency)
+
+    async def async_execute_in_bulk(
+        self, concurrency: int=0, max_age: int=0
+    ) -> List['Job']:
+        u"""
+        execute_in_bulkメソッドのコルーチン版。各クエリのリクエストを並行して行う。
+
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+        :return: ジョブのリスト(このインスタンスが保持するクエリと同じ順序)。
+        """
+        return await self.__run_concurrently(
+            u'async_execute', concurrency, max_age)
+
+    async def async_execute_with_in_bulk(
+        self,
+        key_and_values: Dict[str, str],
+        concurrency: int=0,
+        max_age: int=0
+    ) -> List['Job']:
+        u"""
+        execute_with_in_bulkメソッドのコルーチン版。各クエリのリクエストを並行して行う。
+
+        :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+        :return: ジョブのリスト(このインスタンスが保持するクエリと同じ順序)。
+        """
+        return await self.__run_concurrently(
+            u'async_execute_with', concurrency, key_and_values, max_age)
+
+    async def async_execute_sweep(
+        self,
+        parameter_sets: List[Dict[str, str]],
+        concurrency: int=0,
+        max_age: int=0
+    ) -> List['Job']:
+        u"""
+        execute_sweepメソッドのコルーチン版。
+
+        全ての(クエリ, パラメータ)の組み合わせの実行リクエストを、同時実行数を制限しつつ並行して行う。
+        :param parameter_sets: クエリパラメータのキーとバリューをまとめた辞書のリスト。
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+        :return: ジョブのリスト(パラメータ毎に、このインスタンスが保持するクエリの順序で並ぶ)。
+        """
+        return await self.async_execute_each(
+            [(query, key_and_values)
+             for key_and_values in parameter_sets
+             for query in self.__queries],
+            concurrency,
+            max_age)
+
+    async def async_execute_each(
+        self,
+        query_and_parameters: List[Tuple['Query', Dict[str, str]]],
+        concurrency: int=0,
+        max_age: int=0
+    ) -> List['Job']:
+        u"""
+        (クエリ, パラメータ)の組のリストを、同時実行数を制限しつつ並行して実行する。
+
+        各組はQuery.async_execute_withメソッドで実行する(パラメータを使わないクエリは、通常の実行となる)。
+        キャッシュ済みの組を除いて実行する場合など、組み合わせを呼び出し側で決めたい場合に使う。
+        :param query_and_parameters: Queryオブジェクトと、クエリパラメータの辞書の組のリスト。
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+        :return: ジョブのリスト(引数のリストと同じ順序)。
+        """
+        return await self.__gather(
+            [partial(query.async_execute_with, key_and_values, max_age)
+             for query, key_and_values in query_and_parameters],
+            concurrency)
+
+    async def async_fork_in_bulk(self, concurrency: int=0) -> List['Query']:
+        u"""
+        fork_in_bulkメソッドのコルーチン版。各クエリのリクエストを並行して行う。
+
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        :return: フォークしたクエリのリスト(このインスタンスが保持するクエリと同じ順序)。
+        """
+        return await self.__run_concurrently(u'async_fork', concurrency)
+
+    async def async_archive_in_bulk(self, concurrency: int=0) -> None:
+        u"""
+        archive_in_bulkメソッドのコルーチン版。各クエリのリクエストを並行して行う。
+
+        :param concurrency: 同時に行うリクエスト数の上限。0の場合、コネクションプールのサイズに合わせる。
+        """
+        await self.__run_concurrently(u'async_archive', concurrency)
+
     def set_properties_in_bulk(self, properties: Dict[str, Any]) -> None:
         u"""
         各クエリに、引数で渡したプロパティをセットする。
@@ -356,15 +698,20 @@ class QueryList:
         for query in self.__queries:
             query.set_properties(properties)
 
-    def bind_values_in_bulk(self, key_and_values: Dict) -> None:
+    def bind_values_in_bulk(self, key_and_values: Dict) -> List['Query']:
         u"""
         各クエリのクエリパラメータ部分に、実際の値をバインドする。
 
         ※あるクエリが、対象のクエリパラメータを持たない場合は、値はバインドされない。
         :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+        :return: 値がバインドされ、SQLが書き換わったクエリのリスト。
+                 (これ以外のクエリは、サーバ上のクエリを更新する必要はない。)
         """
+        bound_queries = []
         for query in self.__queries:
-            query.bind_values(key_and_values)
+            if query.bind_values(key_and_values):
+                bound_queries.append(query)
+        return bound_queries
 
     def unbind_values_in_bulk(self) -> None:
         u"""各クエリのクエリパラメータ部分を、バインドされていない状態に復元する。"""
@@ -398,7 +745,7 @@ class QueryList:
         """
         files = list_files_in(dir_path, file_format, read_recursively)
         for file in files:
-            query = Query(connection_info=self.__gateway.get_connection_info())
+            query = self.__make_query()
             query.deserialize(file, file_format)
             self.__queries.append(query)
 
@@ -411,6 +758,20 @@ class QueryList:
         """
         self.__queries += queries
 
+    def remove_archived(self) -> List['Query']:
+        u"""
+        このインスタンスから、アーカイブ済みのクエリを除く。
+
+        :return: 除いたQueryオブジェクトのリスト。
+        """
+        archived = [
+            query for query in self.__queries
+            if getattr(query, u'is_archived', False)]
+        self.__queries = [
+            query for query in self.__queries
+            if not getattr(query, u'is_archived', False)]
+        return archived
+
     def get_queries(self) -> List['Query']:
         U"""
         このインスタンスが保持するQueryのリストを返す。
@@ -426,3 +787,52 @@ class QueryList:
         :return:
         """
         return len(self.__queries)
+
+    def __make_query(self) -> 'Query':
+        u"""
+        このインスタンスと同じ接続情報を持つ、Queryオブジェクトを生成する。
+
+        :return:
+        """
+        return Query(connection_info=self.__gateway.get_connection_info())
+
+    async def __run_concurrently(
+        self, method_name: str, concurrency: int, *params: Any
+    ) -> List[Any]:
+        u"""
+        各クエリのコルーチンメソッドを、同時実行数を制限しつつ並行して実行する。
+
+        :param method_name: 実行するQueryのコルーチンメソッド名。
+        :param concurrency: 同時実行数の上限。0の場合、コネクションプールのサイズに合わせる。
+        :param params: コルーチンメソッドに渡す引数。
+        :return: 各コルーチンの戻り値のリスト(このインスタンスが保持するクエリと同じ順序)。
+        """
+        return await self.__gather(
+            [partial(getattr(query, method_name), *params)
+             for query in self.__queries],
+            concurrency)
+
+    async def __gather(
+        self,
+        coroutine_functions: List[Callable[[], Awaitable[Any]]],
+        concurrency: int
+    ) -> List[Any]:
+        u"""
+        引数なしのコルーチン関数のリストを、同時実行数を制限しつつ並行して実行する。
+
+        :param coroutine_functions: 引数なしで呼び出せるコルーチン関数のリスト。
+        :param concurrency: 同時実行数の上限。0の場合、コネクションプールのサイズに合わせる。
+        :return: 各コルーチンの戻り値のリスト(引数のリストと同じ順序)。
+        """
+        if concurrency <= 0:
+            connection_info = self.__gateway.get_connection_info()
+            concurrency = connection_info.get_pool_size() \
+                if connection_info else ConnectionInfo.DEFAULT_POOL_SIZE
+        semaphore = Semaphore(concurrency)
+
+        async def run(coroutine_function: Callable[[], Awaitable[Any]]) -> Any:
+            async with semaphore:
+                return await coroutine_function()
+
+        return await gather(
+            *[run(function) for function in coroutine_functions])
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* QueryCatalog
+"""
+
+from json import dumps, loads
+from logging import getLogger
+from os import makedirs
+from os.path import abspath, dirname
+from sqlite3 import OperationalError, connect
+from time import time
+from typing import Any, Dict, Iterable, List
+
+from .connection_info import ConnectionInfo
+from .gateway import get_gateway
+
+
+logger = getLogger(__name__)
+
+
+class QueryCatalog:
+    u"""
+    Redash上のクエリ一覧を、ローカルのSQLiteファイルにキャッシュしておくクラス。
+
+    概要:
+    1. syncメソッドで、サーバ上のクエリ一覧を更新日時(updated_at)の降順に取得し、
+       キャッシュ内の同じidのクエリより新しいものだけを取り込む(差分同期)。
+    2. searchメソッドでは、サーバと疎通せずに、ローカルの全文検索インデックスからクエリを検索する。
+    3. 前回の同期からmax_age秒以内であれば、キャッシュは新鮮(is_fresh)とみなす。
+
+    補足:
+    ・古いRedashはorderパラメータを無視して作成日時の降順で返すため、
+      ページが更新日時の降順に並んでいることを確かめた場合にだけ、前回同期した時点より古いクエリで取得を打ち切る。
+      並んでいない場合は、全てのページを取得する。
+    ・一覧APIはアーカイブ済みのクエリを返さないため、差分同期ではアーカイブが反映されない。
+      そのため、前回の全件同期からFULL_SYNC_INTERVAL秒を過ぎていれば、全件を取り直す。
+      また、キャッシュのプロパティ(SQLを含む)は、最大でmax_age秒古い可能性がある。
+      実行するクエリは、サーバから読み直してから使うこと。
+    ・全文検索には、SQLiteのFTS5(trigramトークナイザ)が使える場合はそれを使い、
+      使えない場合や、検索文字列が3文字未満の場合は、LIKEによる部分一致検索を行う。
+    """
+
+    # キャッシュを新鮮とみなす、前回の同期からの経過秒数のデフォルト値。
+    DEFAULT_MAX_AGE = 60 * 60
+    # 全件同期を行う間隔(秒)。
+    FULL_SYNC_INTERVAL = 24 * 60 * 60
+    # 一覧APIで、1ページあたりに取得するクエリ数。
+    PAGE_SIZE = 250
+
+    def __init__(
+        self,
+        file_path: str,
+        connection_info: 'ConnectionInfo'=None,
+        max_age: float=DEFAULT_MAX_AGE
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param file_path: キャッシュに使うSQLiteファイルのパス(存在しない場合は作成する)。
+        :param connection_info: 接続情報を保持するオブジェクト。
+        :param max_age: キャッシュを新鮮とみなす、前回の同期からの経過秒数。
+        """
+        self.__gateway = get_gateway(connection_info)
+        self.__max_age = max_age
+
+        if file_path != u':memory:':
+            makedirs(dirname(abspath(file_path)), exist_ok=True)
+        self.__db = connect(file_path)
+        self.__fts_enabled = self.__create_tables()
+
+        # 別のサーバのキャッシュだった場合は、全て破棄する。
+        if connection_info is not None:
+            end_point = connection_info.get_end_point()
+            if self.__get_meta(u'end_point') != end_point:
+                self.clear()
+                self.__set_meta(u'end_point', end_point)
+                self.__db.commit()
+
+    def set_connection_info(self, connection_info: 'ConnectionInfo') -> None:
+        u"""
+        サーバへの接続情報を保持するオブジェクトをセットする。
+
+        :param connection_info:
+        :return:
+        """
+        self.__gateway = get_gateway(connection_info)
+
+    def is_fresh(self) -> bool:
+        u"""
+        前回の同期から、max_age秒以内かどうかを返す。
+
+        :return:
+        """
+        synced_at = self.__get_meta(u'synced_at')
+        if synced_at is None:
+            return False
+        return time() - float(synced_at) <= self.__max_age
+
+    def sync(self, full: bool=False) -> int:
+        u"""
+        サーバと疎通し、ローカルのキャッシュをサーバ上のクエリ一覧に合わせる。
+
+        :param full: Trueの場合、差分ではなく全件を取り直し、一覧に無いクエリをキャッシュから除く。
+                     Falseでも、前回の全件同期からFULL_SYNC_INTERVAL秒を過ぎていれば全件同期となる。
+        :return: 追加・更新したクエリの件数。
+        """
+        now = time()
+        full_synced_at = self.__get_meta(u'full_synced_at')
+        if full_synced_at is None \
+                or now - float(full_synced_at) > self.FULL_SYNC_INTERVAL:
+            full = True
+
+        # 更新日時の降順に並んでいれば、この日時より古いクエリに達した時点で打ち切る。
+        # (全件同期の場合は、打ち切らずに全て取り込む。)
+        watermark = u'' if full else self.__get_latest_updated_at()
+
+        seen_ids = set()
+        count = 0
+        page = 1
+        # これまでに取得したクエリが、更新日時の降順に並んでいるかどうかと、最後のクエリの更新日時。
+        ordered = True
+        previous = None  # type: str
+        while True:
+            response = self.__gateway.get_queries(page, self.PAGE_SIZE)
+            body = response.json()
+            results = body.get(u'results', [])
+
+            for properties in results:
+                updated_at = properties.get(u'updated_at', u'')
+                if previous is not None and updated_at > previous:
+                    ordered = False
+                previous = updated_at
+
+            reached_watermark = False
+            for properties in results:
+                updated_at = properties.get(u'updated_at', u'')
+                if ordered and updated_at < watermark:
+                    reached_watermark = True
+                    break
+                seen_ids.add(properties[u'id'])
+                if not full and not self.__is_newer(properties):
+                    continue
+                self.__upsert(properties)
+                count += 1
+
+            if reached_watermark \
+                    or page * self.PAGE_SIZE >= body.get(u'count', 0) \
+                    or not results:
+                break
+            page += 1
+
+        if full:
+            self.__delete_except(seen_ids)
+            self.__set_meta(u'full_synced_at', str(now))
+        self.__set_meta(u'synced_at', str(now))
+        self.__db.commit()
+
+        logger.info(
+            u'synced %d queries into the catalog (full=%s)', count, full)
+        return count
+
+    def search(self, text: str) -> List[Dict[str, Any]]:
+        u"""
+        キャッシュから、名前・説明・SQLのいずれかに文字列を含むクエリを検索する。
+
+        文字列が数字のみの場合は、idが一致するクエリも対象とする。
+        サーバの検索APIと同様に、アーカイブ済みのクエリと下書きのクエリは除く。
+        :param text: 検索に使う文字列(大文字・小文字は区別しない)。
+        :return: 該当するクエリのプロパティ(サーバから得た辞書)のリスト。
+        """
+        if self.__fts_enabled and len(text) >= 3:
+            cursor = self.__db.execute(
+                u'SELECT properties FROM queries WHERE id IN ('
+                u'SELECT rowid FROM queries_fts WHERE queries_fts MATCH ?'
+                u') OR id = ? ORDER BY id',
+                (u'"' + text.replace(u'"', u'""') + u'"', self.__to_id(text)))
+        else:
+            pattern = u'%' + text.replace(u'\\', u'\\\\') \
+                .replace(u'%', u'\\%').replace(u'_', u'\\_') + u'%'
+            cursor = self.__db.execute(
+                u'SELECT properties FROM queries '
+                u"WHERE name LIKE :p ESCAPE '\\' "
+                u"OR description LIKE :p ESCAPE '\\' "
+                u"OR query LIKE :p ESCAPE '\\' "
+                u'OR id = :id ORDER BY id',
+                {u'p': pattern, u'id': self.__to_id(text)})
+        found = [loads(row[0]) for row in cursor]
+        return [
+            properties for properties in found
+            if not properties.get(u'is_archived')
+            and not properties.get(u'is_draft')
+        ]
+
+    def remove(self, query_ids: Iterable[int]) -> None:
+        u"""
+        キャッシュから、指定したidのクエリを除く(アーカイブしたクエリを即座に反映する場合などに使う)。
+
+        :param query_ids: 除くクエリのidのリスト。
+        :return:
+        """
+        for query_id in query_ids:
+            self.__delete(query_id)
+        self.__db.commit()
+
+    def clear(self) -> None:
+        u"""
+        キャッシュを全て破棄する。
+
+        :return:
+        """
+        self.__db.execute(u'DELETE FROM queries')
+        if self.__fts_enabled:
+            self.__db.execute(u'DELETE FROM queries_fts')
+        self.__db.execute(u'DELETE FROM meta')
+        self.__db.commit()
+
+    def close(self) -> None:
+        u"""
+        SQLiteファイルとの接続を閉じる。
+
+        :return:
+        """
+        self.__db.close()
+
+    def __create_tables(self) -> bool:
+        u"""
+        キャッシュ用のテーブルを(存在しなければ)作成する。
+
+        :return: 全文検索インデックスが使える場合はTrue。
+        """
+        self.__db.execute(
+            u'CREATE TABLE IF NOT EXISTS queries ('
+            u'id INTEGER PRIMARY KEY, name TEXT, description TEXT, '
+            u'query TEXT, data_source_id INTEGER, updated_at TEXT, '
+            u'properties TEXT)')
+        self.__db.execute(
+            u'CREATE INDEX IF NOT EXISTS queries_updated_at '
+            u'ON queries (updated_at)')
+        self.__db.execute(
+            u'CREATE TABLE IF NOT EXISTS meta ('
+            u'key TEXT PRIMARY KEY, value TEXT)')
+        try:
+            self.__db.execute(
+                u'CREATE VIRTUAL TABLE IF NOT EXISTS queries_fts USING fts5('
+                u'name, description, query, tokenize="trigram")')
+            enabled = True
+        except OperationalError:
+            # FTS5やtrigramトークナイザに対応していないSQLiteの場合。
+            enabled = False
+        self.__db.commit()
+        return enabled
+
+    def __upsert(self, properties: Dict[str, Any]) -> None:
+        u"""
+        クエリを1件、キャッシュに追加(または更新)する。
+
+        :param properties: サーバから得たクエリのプロパティ。
+        :return:
+        """
+        query_id = properties[u'id']
+        values = (
+            properties.get(u'name') or u'',
+            properties.get(u'description') or u'',
+            properties.get(u'query') or u'',
+        )
+        self.__db.execute(
+            u'INSERT OR REPLACE INTO queries VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (query_id,) + values + (
+                properties.get(u'data_source_id'),
+                properties.get(u'updated_at', u''),
+                dumps(properties)))
+        if self.__fts_enabled:
+            self.__db.execute(
+                u'DELETE FROM queries_fts WHERE rowid = ?', (query_id,))
+            self.__db.execute(
+                u'INSERT INTO queries_fts (rowid, name, description, query) '
+                u'VALUES (?, ?, ?, ?)', (query_id,) + values)
+
+    def __delete(self, query_id: int) -> None:
+        u"""
+        クエリを1件、キャッシュから除く。
+
+        :param query_id:
+        :return:
+        """
+        self.__db.execute(u'DELETE FROM queries WHERE id = ?', (query_id,))
+        if self.__fts_enabled:
+            self.__db.execute(
+                u'DELETE FROM queries_fts WHERE rowid = ?', (query_id,))
+
+    def __delete_except(self, query_ids: Iterable[int]) -> None:
+        u"""
+        指定したid以外のクエリを、キャッシュから除く。
+
+        :param query_ids: 残すクエリのidの集合。
+        :return:
+        """
+        keep = set(query_ids)
+        stale_ids = [
+            row[0] for row in self.__db.execute(u'SELECT id FROM queries')
+            if row[0] not in keep
+        ]
+        for query_id in stale_ids:
+            self.__delete(query_id)
+
+    def __is_newer(self, properties: Dict[str, Any]) -> bool:
+        u"""
+        サーバから得たクエリが、キャッシュ内の同じidのクエリより新しい(またはキャッシュに無い)かどうかを返す。
+
+        :param properties: サーバから得たクエリのプロパティ。
+        :return:
+        """
+        row = self.__db.execute(
+            u'SELECT updated_at FROM queries WHERE id = ?',
+            (properties[u'id'],)).fetchone()
+        return row is None or properties.get(u'updated_at', u'') > row[0]
+
+    def __get_latest_updated_at(self) -> str:
+        u"""
+        キャッシュ内で最も新しい更新日時を返す(キャッシュが空の場合は空文字列)。
+
+        :return:
+        """
+        row = self.__db.execute(
+            u'SELECT MAX(updated_at) FROM queries').fetchone()
+        return row[0] or u''
+
+    def __get_meta(self, key: str) -> str:
+        u"""
+        メタ情報を返す(存在しない場合はNone)。
+
+        :param key:
+        :return:
+        """
+        row = self.__db.execute(
+            u'SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def __set_meta(self, key: str, value: str) -> None:
+        u"""
+        メタ情報をセットする。
+
+        :param key:
+        :param value:
+        :return:
+        """
+        self.__db.execute(
+            u'INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value))
+
+    @staticmethod
+    def __to_id(text: str) -> int:
+        u"""
+        検索文字列がidを表す場合は、そのidを返す(それ以外は、どのidにも一致しない-1を返す)。
+
+        :param text:
+        :return:
+        """
+        return int(text) if text.strip().isdigit() else -1
@@ -3,15 +3,64 @@ u"""
 以下クラスを提供するモジュール。
 
 * QueryResult
+* StreamingQueryResult
 """
 
+from collections import OrderedDict
+from csv import QUOTE_NONNUMERIC, writer
+from io import TextIOWrapper
+from json import JSONEncoder
 from os import linesep
+from typing import \
+    TYPE_CHECKING, Any, BinaryIO, Dict, Iterator, List, Optional, TextIO
 
-from typing import Any, Dict
+from yaml import SafeDumper, dump_all
+
+from .column_table import ColumnTable
+from .columnar_file import ColumnarWriter
+from .compression import open_output, split_compression
+from .result_stream import QueryResultStream
+
+if TYPE_CHECKING:
+    from requests import Response
+
+try:
+    # libyamlがあれば、C実装のDumperを使う(純Python実装より数倍速い)。
+    from yaml import CSafeDumper as _BaseDumper
+except ImportError:
+    _BaseDumper = SafeDumper
+
+
+class _RowDumper(_BaseDumper):
+    u"""クエリの実行結果の各行を、カラムの順序を保ったままYAMLに書き出すDumper。"""
+
+
+# OrderedDictを、キーをソートせず、順序通りのマッピングとして書き出す。
+_RowDumper.add_representer(
+    OrderedDict,
+    lambda dumper, row: dumper.represent_mapping(
+        u'tag:yaml.org,2002:map', row.items()))
 
 
 class QueryResult:
-    u"""Redashでのクエリ実行結果を保持するクラス。"""
+    u"""
+    Redashでのクエリ実行結果を保持するクラス。
+
+    補足:
+    ・実行結果の表(dataプロパティのcolumnsとrows)は、生成時に一度だけColumnTable(カラム毎の配列)に変換して保持する。
+      行毎の辞書は保持しないため、大きな結果ほどメモリ使用量が減る。各シリアライズ処理も、ColumnTableから行を取り出す。
+    ・dataプロパティは互換性のために残しているが、参照する度に行毎の辞書の配列を組み立て直すため、
+      大きな結果ではget_tableメソッドを使うこと。
+    """
+
+    # serializeメソッドで書き出せるファイルフォーマット。
+    FILE_FORMATS = (u'csv', u'json', u'yml', u'yaml', u'columnar')
+
+    # JSON Linesの各行を変換するエンコーダ(行毎にdumpsでエンコーダを生成しないよう、共有する)。
+    JSON_ENCODER = JSONEncoder(ensure_ascii=False)
+
+    # 実行結果の表。dataプロパティにcolumnsとrowsが無い場合はNone。
+    __table = None  # type: ColumnTable
 
     def __init__(self, properties: Dict[str, Any]) -> None:
         u"""
@@ -22,17 +71,89 @@ class QueryResult:
         for key, value in properties.items():
             setattr(self, key, value)
 
-    def serialize(self, file_path: str, file_format: str) -> None:
+    @property
+    def data(self) -> Dict[str, Any]:
+        u"""Redashが返す形式の実行結果(columnsとrowsを持つ辞書)。参照する度に組み立て直す。"""
+        if self.__table is None:
+            return self.__data
+        data = dict(self.__data)
+        data[u'columns'] = self.__table.get_columns()
+        data[u'rows'] = self.__table.to_rows()
+        return data
+
+    @data.setter
+    def data(self, data: Dict[str, Any]) -> None:
+        if u'columns' in data and u'rows' in data:
+            self.__table = ColumnTable.from_rows(
+                data[u'columns'], data[u'rows'])
+            # (columnsとrows以外の項目は、そのまま保持する。)
+            self.__data = {
+                key: value for key, value in data.items()
+                if key not in (u'columns', u'rows')}
+        else:
+            self.__table = None
+            self.__data = data
+
+    def get_table(self) -> Optional['ColumnTable']:
+        u"""
+        実行結果の表を、カラム毎の配列として保持するオブジェクトを返す。
+
+        :return: dataプロパティにcolumnsとrowsが無い場合はNone。
+        """
+        return self.__table
+
+    def iter_tables(self) -> Iterator['ColumnTable']:
+        u"""
+        実行結果の表を、一つ以上のColumnTable(先頭から順に行を分けたもの)として返す。
+
+        各シリアライズ処理は、このメソッドが返す表から行を取り出す。
+        :return: dataプロパティにcolumnsとrowsが無い場合は、何も返さない。
+        """
+        if self.__table is not None:
+            yield self.__table
+
+    def serialize(
+        self,
+        file_path: str,
+        file_format: str,
+        compression_level: int=None,
+        background: bool=False
+    ) -> None:
         u"""
         このインスタンスを、ファイルにシリアライズする。
 
+        いずれのフォーマットも一行(一レコード)ずつ書き出すため、結果の行数によらずメモリ使用量は一定になる。
+        (columnarの場合は、row group一つ分で一定になる。)
         :param file_path: ファイルのパス。
-        :param file_format: ファイルフォーマット。
+        :param file_format: ファイルフォーマット(csv、json、yml、yamlまたはcolumnar)。
+                            jsonの場合はJSON Lines形式、
+                            yml・yamlの場合は1レコード1ドキュメントのYAMLで書き出す。
+                            columnarの場合は、列指向のバイナリ形式(ColumnarWriterを参照)で書き出す。
+                            csv.gzやjson.zstのように圧縮形式の拡張子(gz、zst)を付けた場合は、
+                            書き出しながら圧縮する。
+        :param compression_level: 圧縮レベル。Noneの場合は、圧縮形式毎のデフォルト値を使う。
+        :param background: Trueの場合、圧縮とファイルへの書き出しを別スレッドで行う。
         """
+        file_format, compression = split_compression(file_format)
         self.__check_file_format_and_raise_exception(file_format)
 
-        with open(file_path, u'w') as file:
-            file.write(self.__make_csv_serialize_data())
+        stream = open_output(
+            file_path, compression, compression_level, background)
+        if file_format == u'columnar':
+            with stream:
+                self.__write_columnar(stream)
+            return
+
+        # 改行コードはcsvモジュール側などで付与するため、ここでは変換させない。
+        # csvはOSの既定の文字コードで、JSON Lines・YAMLはOSによらずUTF-8で書き出す。
+        encoding = None if file_format == u'csv' else u'utf-8'
+        with TextIOWrapper(stream, encoding=encoding, newline=u'') as file:
+            if file_format == u'csv':
+                self.__write_csv(file)
+            elif file_format == u'json':
+                self.__write_json_lines(file)
+            else:
+                self.__write_yaml(file)
 
     def get_query_name(self) -> str:
         u"""
@@ -42,6 +163,37 @@ class QueryResult:
         """
         return getattr(self, u'query_name', u'')
 
+    def get_parameters(self) -> Dict[str, str]:
+        u"""
+        このインスタンスに対応するクエリの実行時に、バインドしたクエリパラメータを返す。
+
+        :return:
+        """
+        return getattr(self, u'parameters', {})
+
+    def get_query_id(self) -> int:
+        u"""
+        このインスタンスに対応するQueryオブジェクトのidを返す。
+
+        :return:
+        """
+        return getattr(self, u'query_id', 0)
+
+    def get_properties(self) -> Dict[str, Any]:
+        u"""
+        このインスタンスのプロパティを、コンストラクタに渡せる辞書形式で返す。
+
+        :return:
+        """
+        properties = {
+            key: value for key, value in vars(self).items()
+            if not key.startswith(u'_')}
+        try:
+            properties[u'data'] = self.data
+        except AttributeError:
+            pass
+        return properties
+
     def __check_file_format_and_raise_exception(
         self, file_format: str
     ) -> None:
@@ -51,55 +203,204 @@ class QueryResult:
         :param file_format:
         :return:
         """
-        # 現状、csvのみサポート。
-        if file_format != u'csv':
-            raise ValueError()
+        if file_format not in self.FILE_FORMATS:
+            raise ValueError(
+                u'unsupported file format: {}'.format(file_format))
 
-    def __make_csv_serialize_data(self) -> str:
+    def __write_csv(self, file: TextIO) -> None:
         u"""
-        このインスタンスをcsvファイルとして出力するための文字列を作って返す。
+        このインスタンスを、csv形式でファイルに一行ずつ書き出す。
 
         補足:
         ・実運用上の事情を考慮して、このインスタンスが持つdataプロパティの内容のみ抽出している。
+        ・全体を一つの文字列に組み立てず、一行ずつ書き出すため、結果の行数によらずメモリ使用量は一定になる。
+        ・ヘッダ行は、カンマ・ダブルクォート・改行を含むカラム名のみダブルクォートで囲む。
+        ・各レコードは、数値以外の値をダブルクォートで囲み、値の中のダブルクォートは二重にしてエスケープする。
+          値がない場合(nullの場合も含む)は、空文字列("")を出力する。
         ・各行末尾に付与する改行コードは、各OSに準拠した改行コードを付与する(linesepの使用部分)。
 
         参考:
         csvファイルの一般的なフォーマットについては、以下リンクを参照した。
         http://itdoc.hitachi.co.jp/manuals/3020/30203698A0/swrj0068.htm
+        :param file: 書き出し先のファイルオブジェクト。
         :return:
         """
-        if (u'columns' not in self.data) or (u'rows' not in self.data):
-            return u''
-
-        # ヘッダ行を作る。
-        headers = u''
-        for column_definition in self.data[u'columns']:
-            headers += column_definition[u'name'] + u','
-        # 末尾のカンマを改行文字に置換しておく。
-        headers = headers[:-1] + linesep
-
-        # 各レコードを作る。
-        records = u''
-        for column_values in self.data[u'rows']:
-            for column_definition in self.data[u'columns']:
-                column_name = column_definition[u'name']
-
-                # 万一値がない場合は、カンマだけ付与。
-                if column_name not in column_values:
-                    records += u','
-                    continue
+        record_writer = None
+        for table in self.iter_tables():
+            if record_writer is None:
+                # ヘッダ行を書き出す。
+                header_writer = writer(file, lineterminator=linesep)
+                header_writer.writerow(table.get_column_names())
+                record_writer = writer(
+                    file, quoting=QUOTE_NONNUMERIC, lineterminator=linesep)
+
+            # 各レコードを書き出す(イテレータで渡すため、一行ずつ変換・書き出しされる)。
+            record_writer.writerows(table.iter_rows())
+
+    def __write_columnar(self, file: BinaryIO) -> None:
+        u"""
+        このインスタンスを、列指向のバイナリ形式でファイルに書き出す。
+
+        補足:
+        ・csvと同様に、dataプロパティの内容のみ抽出する。
+        ・カラムの型(columnsのtype)に応じた型付きの列バッファに変換し、row group毎にzlibで圧縮する。
+        :param file: 書き出し先の(バイナリモードで開いた)ファイルオブジェクト。
+        :return:
+        """
+        columnar_writer = None
+        for table in self.iter_tables():
+            if columnar_writer is None:
+                columnar_writer = ColumnarWriter(file, table.get_columns())
+            columnar_writer.write_columns(
+                table.get_values(), table.count_rows())
+        if columnar_writer is not None:
+            columnar_writer.close()
+
+    def __write_json_lines(self, file: TextIO) -> None:
+        u"""
+        このインスタンスを、JSON Lines形式(1行に1レコードのJSONオブジェクト)でファイルに一行ずつ書き出す。
+
+        補足:
+        ・csvと同様に、dataプロパティの内容のみ抽出し、各オブジェクトのキーはカラムの順に並べる。
+          値がない場合は、nullを出力する。
+        ・全体を一つのJSON配列に組み立てないため、結果の行数によらずメモリ使用量は一定になる。
+        :param file: 書き出し先のファイルオブジェクト。
+        :return:
+        """
+        encode = self.JSON_ENCODER.encode
+        for row in self.__iter_rows():
+            file.write(encode(row))
+            file.write(u'\n')
+
+    def __write_yaml(self, file: TextIO) -> None:
+        u"""
+        このインスタンスを、1レコードを1ドキュメント(---区切り)とするYAMLで、ファイルに一件ずつ書き出す。
+
+        補足:
+        ・csvと同様に、dataプロパティの内容のみ抽出し、各マッピングのキーはカラムの順に並べる。
+          値がない場合は、nullを出力する。
+        ・dump_allにジェネレータを渡すため、一件ずつ変換・書き出しされる。
+        :param file: 書き出し先のファイルオブジェクト。
+        :return:
+        """
+        dump_all(
+            self.__iter_rows(), file, Dumper=_RowDumper,
+            explicit_start=True, default_flow_style=False, allow_unicode=True)
+
+    def __iter_rows(self) -> Iterator['OrderedDict']:
+        u"""
+        実行結果の各レコードを、カラムの順にキーを並べた辞書として一件ずつ返す。
+
+        :return:
+        """
+        for table in self.iter_tables():
+            column_names = table.get_column_names()
+            for row in table.iter_rows():
+                yield OrderedDict(zip(column_names, row))
 
-                # 値を追加(文字列の場合、前後にダブルクォートを付与)。
-                value = column_values[column_name]
-                if type(value) is str:
-                    value = u'"' + value + u'"'
 
-                records += str(value) + u','
+class StreamingQueryResult(QueryResult):
+    u"""
+    クエリ結果取得APIのレスポンスを読み込みながら、実行結果の行を一定行数ずつシリアライズするQueryResult。
 
-            # 末尾のカンマを改行文字に置換しておく。
-            records = records[:-1] + linesep
+    概要:
+    1. レスポンスボディは、serializeメソッドの中で少しずつ読み込む(QueryResultStreamを参照)。
+    2. batch_size行ずつColumnTableに変換して書き出し、書き出した行は保持しない。
+       そのため、レスポンスボディ全体や全ての行を同時に持たず、メモリ使用量はおよそ一回分の行数で一定になる。
 
-        return headers + records
+    補足:
+    ・行は一度しか読み込めないため、serializeメソッドは一度しか呼び出せない(get_tableメソッドはNoneを返す)。
+    ・runtimeなど、レスポンスでrowsより後ろにある項目は、serializeメソッドで読み込み終えた時点で設定される。
+    ・rowsがcolumnsより前にある場合は、columnsを読み込むまで行を溜めておく。
+    """
+
+    # レスポンスボディを読み込む単位(バイト数)。
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        properties: Dict[str, Any],
+        response: 'Response',
+        batch_size: int=QueryResultStream.DEFAULT_BATCH_SIZE
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param properties: プロパティ名と値をまとめた辞書(クエリ名など、レスポンスに含まれないもの)。
+        :param response: クエリ結果取得APIの、ボディを読み込んでいない(stream=Trueの)レスポンス。
+        :param batch_size: 一度にColumnTableに変換して書き出す行数。
+        """
+        super().__init__(properties)
+        self.__response = response
+        self.__stream = QueryResultStream(
+            response.iter_content(self.CHUNK_SIZE), batch_size)
+
+    def serialize(
+        self,
+        file_path: str,
+        file_format: str,
+        compression_level: int=None,
+        background: bool=False
+    ) -> None:
+        u"""
+        レスポンスを読み込みながら、このインスタンスをファイルにシリアライズする。
+
+        書き出しに失敗した場合も、レスポンスは閉じる(コネクションをプールに戻す)。
+        :param file_path: ファイルのパス。
+        :param file_format: ファイルフォーマット(QueryResult.serializeを参照)。
+        :param compression_level: 圧縮レベル。Noneの場合は、圧縮形式毎のデフォルト値を使う。
+        :param background: Trueの場合、圧縮とファイルへの書き出しを別スレッドで行う。
+        """
+        try:
+            super().serialize(
+                file_path, file_format, compression_level, background)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        u"""
+        レスポンスを閉じる。行を読み込む前に呼び出した場合、以降は行を読み込めない。
+
+        :return:
+        """
+        self.__response.close()
+
+    def iter_tables(self) -> Iterator['ColumnTable']:
+        u"""
+        レスポンスを読み込みながら、実行結果の表をbatch_size行ずつのColumnTableとして返す。
+
+        イテレートし終えた時点で、レスポンスに含まれる各項目をプロパティに設定する。
+        :return: レスポンスにcolumnsとrowsが無い場合は、何も返さない。
+        """
+        pending = []  # type: List[List[Dict[str, Any]]]
+        returned = False
+        try:
+            for rows in self.__stream.iter_batches():
+                columns = self.__stream.get_properties().get(
+                    u'data', {}).get(u'columns')
+                if columns is None:
+                    pending.append(rows)
+                    continue
+                while pending:
+                    yield ColumnTable.from_rows(columns, pending.pop(0))
+                yield ColumnTable.from_rows(columns, rows)
+                returned = True
+        finally:
+            self.close()
+
+        properties = self.__stream.get_properties()
+        for key, value in properties.items():
+            setattr(self, key, value)
+
+        data = properties.get(u'data')
+        if not isinstance(data, dict) or u'columns' not in data:
+            return
+        for rows in pending:
+            yield ColumnTable.from_rows(data[u'columns'], rows)
+            returned = True
+        if not returned:
+            # (行が無い場合も、ヘッダ行などを書き出すために空の表を返す。)
+            yield ColumnTable.from_rows(data[u'columns'], [])
 
 
 class NullQueryResult(QueryResult):
@@ -119,12 +420,20 @@ class NullQueryResult(QueryResult):
         self.retrieved_at = u''
         self.runtime = 0.0
 
-    def serialize(self, file_path: str, file_format: str) -> None:
+    def serialize(
+        self,
+        file_path: str,
+        file_format: str,
+        compression_level: int=None,
+        background: bool=False
+    ) -> None:
         u"""
         Nullオブジェクトなので、何もしない。
 
         :param file_path: ファイルのパス。
         :param file_format: ファイルフォーマット。
+        :param compression_level: 圧縮レベル。
+        :param background: 別スレッドで書き出すかどうか。
         """
         pass
 
@@ -135,3 +444,19 @@ class NullQueryResult(QueryResult):
         :return:
         """
         return u''
+
+    def get_parameters(self) -> Dict[str, str]:
+        u"""
+        Nullオブジェクトなので、空の辞書を返す。
+
+        :return:
+        """
+        return {}
+
+    def get_query_id(self) -> int:
+        u"""
+        Nullオブジェクトなので、0を返す。
+
+        :return:
+        """
+        return 0
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* QueryTemplate
+
+また、以下の関数を提供する。
+
+* get_query_template
+"""
+
+from functools import lru_cache
+from re import compile
+from typing import Dict, FrozenSet, List
+
+
+class QueryTemplate:
+    u"""
+    クエリパラメータ('{{ 変数名 }}'の箇所)を含むSQL文字列を、パース済みの状態で保持するクラス。
+
+    概要:
+    1. 生成時にSQL文字列を一度だけ走査し、リテラル部分とパラメータ部分に分割しておく。
+    2. renderメソッドでは、分割済みの部分を連結するだけで、全てのパラメータを一度にバインドする。
+    3. キーや値は正規表現として解釈しないため、記号を含んでいてもそのままバインドされる。
+
+    補足:
+    ・同じSQL文字列に対するパースを繰り返さないよう、get_query_template関数経由で取得すること。
+    """
+
+    # '{{ 変数名 }}'の箇所にマッチする正規表現(変数名の前後の空白は無視する)。
+    PARAMETER_PATTERN = compile(r'{{ *([^{}]*?) *}}')
+
+    def __init__(self, query_text: str) -> None:
+        u"""
+        コンストラクタ。
+
+        :param query_text: クエリパラメータを含むSQL文字列。
+        """
+        # 偶数番目にリテラル部分、奇数番目にパラメータのキーが入る。
+        self.__literals = []  # type: List[str]
+        self.__keys = []  # type: List[str]
+        # バインドする値が無い場合に、元の文字列を復元するためのパラメータ部分。
+        self.__placeholders = []  # type: List[str]
+
+        position = 0
+        for m in self.PARAMETER_PATTERN.finditer(query_text):
+            self.__literals.append(query_text[position:m.start()])
+            self.__keys.append(m.group(1))
+            self.__placeholders.append(m.group(0))
+            position = m.end()
+        self.__literals.append(query_text[position:])
+
+        self.__parameter_names = frozenset(self.__keys)
+
+    def get_parameter_names(self) -> FrozenSet[str]:
+        u"""
+        このSQL文字列が使っているクエリパラメータのキーの集合を返す。
+
+        :return:
+        """
+        return self.__parameter_names
+
+    def render(self, key_and_values: Dict[str, str]) -> str:
+        u"""
+        クエリパラメータ部分に値をバインドしたSQL文字列を返す。
+
+        :param key_and_values: クエリパラメータのキーとバリューをまとめた辞書。
+                               キーが含まれないパラメータ部分は、そのまま残す。
+        :return: 値をバインドしたSQL文字列。
+        """
+        parts = [self.__literals[0]]
+        for key, placeholder, literal in zip(
+            self.__keys, self.__placeholders, self.__literals[1:]
+        ):
+            parts.append(key_and_values.get(key, placeholder))
+            parts.append(literal)
+        return u''.join(parts)
+
+
+@lru_cache(maxsize=1024)
+def get_query_template(query_text: str) -> 'QueryTemplate':
+    u"""
+    SQL文字列に対応するQueryTemplateオブジェクトを返す(同じSQL文字列なら、パース済みのものを使い回す)。
+
+    :param query_text: クエリパラメータを含むSQL文字列。
+    :return: QueryTemplateオブジェクト。
+    """
+    return QueryTemplate(query_text)
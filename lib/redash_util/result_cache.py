@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* ResultCache
+"""
+
+from hashlib import md5, sha1
+from json import dump, dumps, load
+from logging import getLogger
+from os import listdir, makedirs, remove, replace, stat, utime
+from os.path import join
+from tempfile import NamedTemporaryFile
+from time import time
+from typing import Dict, Optional, TYPE_CHECKING
+
+from .query_result import QueryResult
+
+if TYPE_CHECKING:
+    from .query import Query
+
+
+logger = getLogger(__name__)
+
+
+class ResultCache:
+    u"""
+    クエリの実行結果(QueryResult)を、ローカルのディレクトリにキャッシュしておくクラス。
+
+    概要:
+    1. キャッシュのキーは、クエリのquery_hash(SQLのハッシュ値)、データソース、バインドしたパラメータから生成する。
+       そのため、SQLやパラメータが変わらない限り、同じキーになる。
+    2. 書き込みからmax_age秒を過ぎたエントリは、古いものとして扱い、読み出さない。
+    3. 全エントリの合計サイズがmax_bytesを超えた場合は、最後に読み書きした日時が古いエントリから削除する(LRU)。
+
+    補足:
+    ・各エントリは、キー毎に1つのJSONファイルとして保存する。
+    ・書き込み日時はファイルの更新日時(mtime)、最後に読み書きした日時はアクセス日時(atime)で管理する。
+      (atimeはOSの設定に依存しないよう、読み出し時に明示的に更新する。)
+    """
+
+    # 全エントリの合計サイズの上限のデフォルト値(バイト)。
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+    # エントリのファイルの拡張子。
+    EXTENSION = u'.json'
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_age: float,
+        max_bytes: int=DEFAULT_MAX_BYTES
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param cache_dir: キャッシュを保存するディレクトリのパス(存在しない場合は作成する)。
+        :param max_age: エントリを新鮮とみなす、書き込みからの経過秒数。
+        :param max_bytes: 全エントリの合計サイズの上限(バイト)。
+        """
+        self.__cache_dir = cache_dir
+        self.__max_age = max_age
+        self.__max_bytes = max_bytes
+        makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(query: 'Query', parameters: Dict[str, str]=None) -> str:
+        u"""
+        クエリとバインドするパラメータから、キャッシュのキーを生成する。
+
+        :param query: Queryオブジェクト。
+                      サーバから得たquery_hashプロパティがあればそれを使い、無ければSQLのハッシュ値を使う。
+        :param parameters: バインドするクエリパラメータのキーとバリュー。
+        :return: キー(16進数の文字列)。
+        """
+        query_hash = getattr(query, u'query_hash', None) \
+            or md5(query.query.encode(u'utf-8')).hexdigest()
+        source = dumps(
+            [query_hash, getattr(query, u'data_source_id', None),
+             parameters or {}],
+            sort_keys=True)
+        return sha1(source.encode(u'utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional['QueryResult']:
+        u"""
+        キーに対応する、新鮮なエントリを返す。
+
+        :param key: make_keyメソッドで生成したキー。
+        :return: QueryResultオブジェクト。エントリが無いか古い場合はNone。
+        """
+        file_path = self.__make_path(key)
+        try:
+            modified_at = stat(file_path).st_mtime
+        except FileNotFoundError:
+            return None
+
+        now = time()
+        if now - modified_at > self.__max_age:
+            self.__remove(file_path)
+            return None
+
+        try:
+            with open(file_path, u'r') as file:
+                properties = load(file)
+        except (OSError, ValueError):
+            # 壊れたエントリや、読み出し中に削除されたエントリは、無かったものとして扱う。
+            self.__remove(file_path)
+            return None
+
+        # LRUでの削除順を決めるため、アクセス日時だけを更新する。
+        utime(file_path, (now, modified_at))
+        return QueryResult(properties)
+
+    def put(self, key: str, query_result: 'QueryResult') -> None:
+        u"""
+        キーに対応するエントリとして、クエリの実行結果を書き込む。
+
+        書き込み後、合計サイズが上限を超えていれば、古いエントリを削除する。
+        :param key: make_keyメソッドで生成したキー。
+        :param query_result: クエリの実行結果。
+        :return:
+        """
+        # 書き込み途中のファイルが読み出されないよう、一時ファイルに書いてから置き換える。
+        with NamedTemporaryFile(
+            u'w', dir=self.__cache_dir, suffix=u'.tmp', delete=False
+        ) as file:
+            dump(query_result.get_properties(), file)
+        replace(file.name, self.__make_path(key))
+
+        self.evict()
+
+    def evict(self) -> None:
+        u"""
+        古いエントリを削除し、合計サイズが上限を超えていれば、最後に読み書きした日時が古い順に削除する。
+
+        :return:
+        """
+        now = time()
+        entries = []
+        for file_name in listdir(self.__cache_dir):
+            if not file_name.endswith(self.EXTENSION):
+                continue
+            file_path = join(self.__cache_dir, file_name)
+            try:
+                st = stat(file_path)
+            except FileNotFoundError:
+                continue
+            if now - st.st_mtime > self.__max_age:
+                self.__remove(file_path)
+            else:
+                entries.append((st.st_atime, st.st_size, file_path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, file_path in sorted(entries):
+            if total_bytes <= self.__max_bytes:
+                break
+            self.__remove(file_path)
+            total_bytes -= size
+            logger.info(u'evicted a cached result: %s', file_path)
+
+    def __make_path(self, key: str) -> str:
+        u"""
+        キーに対応するエントリのファイルパスを返す。
+
+        :param key:
+        :return:
+        """
+        return join(self.__cache_dir, key + self.EXTENSION)
+
+    def __remove(self, file_path: str) -> None:
+        u"""
+        エントリのファイルを削除する(既に削除されていても例外は送出しない)。
+
+        :param file_path:
+        :return:
+        """
+        try:
+            remove(file_path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* QueryResultStream
+"""
+
+from codecs import getincrementaldecoder
+from json import JSONDecoder
+from json.decoder import WHITESPACE
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class QueryResultStream:
+    u"""
+    クエリ結果取得APIのレスポンスボディを少しずつ読み込みながら、実行結果の行を一定行数ずつ取り出すクラス。
+
+    概要:
+    1. レスポンスボディのチャンク(バイト列)を、読み込み途中の部分だけをバッファに残しながら順に解析する。
+    2. query_result.data.rowsの配列の要素(行)は、一つずつPythonの辞書に変換し、batch_size行ずつまとめて返す。
+    3. それ以外の項目(columnsやruntimeなど)は、値毎にPythonのオブジェクトに変換し、get_propertiesメソッドで返す。
+
+    補足:
+    ・レスポンスボディ全体も、全ての行の辞書も保持しないため、メモリ使用量はおよそ一回分の行数で一定になる。
+    ・各値の変換は標準のJSONDecoder(raw_decode)で行い、値が途中で切れている場合はチャンクを読み足して変換し直す。
+    ・行を読み終えるまで、rowsより後ろにある項目(キーをソートしたJSONでのruntimeなど)は取り出せない。
+    """
+
+    # 実行結果の行の配列の位置。
+    ROWS_PATH = (u'query_result', u'data', u'rows')
+
+    # 値の直後に現れうる文字(区切り文字と空白)。
+    TERMINATORS = frozenset(u',:]} \t\n\r')
+
+    # 一度に返す行数のデフォルト値。
+    DEFAULT_BATCH_SIZE = 10000
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        batch_size: int=DEFAULT_BATCH_SIZE
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param chunks: レスポンスボディ(UTF-8でエンコードしたJSON)を、先頭から順に分割したバイト列。
+        :param batch_size: 一度に返す行数。
+        """
+        if batch_size < 1:
+            raise ValueError(u'batch_size must be positive.')
+        self.__chunks = iter(chunks)
+        self.__batch_size = batch_size
+        self.__decoder = getincrementaldecoder(u'utf-8')()
+        decoder = JSONDecoder()
+        self.__decode_value = decoder.raw_decode
+        self.__scan_once = decoder.scan_once
+        # 読み込み済みで未解析の文字列と、その中の解析位置。
+        self.__buffer = u''
+        self.__pos = 0
+        self.__eof = False
+        self.__started = False
+        # 行以外の項目を、元のJSONの構造のまま保持する辞書。
+        self.__document = {}  # type: Dict[str, Any]
+
+    def get_properties(self) -> Dict[str, Any]:
+        u"""
+        query_resultの項目のうち、これまでに読み込んだものを返す(dataはrowsを含まない)。
+
+        :return:
+        """
+        properties = self.__document.get(u'query_result')
+        return properties if isinstance(properties, dict) else {}
+
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        u"""
+        実行結果の行(カラム名と値の辞書)を、batch_size行ずつリストにまとめて返すイテレータ。
+
+        イテレートし終えた時点で、レスポンスボディを最後まで解析し終えている。
+        一つのインスタンスにつき、一度しかイテレートできない。
+        :return:
+        """
+        if self.__started:
+            raise ValueError(u'the query result stream has already been read.')
+        self.__started = True
+
+        yield from self.__iter_object(self.__document, ())
+        if self.__skip_whitespace():
+            raise ValueError(
+                u'extra data in the query result: {!r}'.format(
+                    self.__buffer[self.__pos:self.__pos + 20]))
+
+    def __iter_object(
+        self, container: Dict[str, Any], path: Tuple[str, ...]
+    ) -> Iterator[List[Dict[str, Any]]]:
+        u"""
+        JSONのオブジェクトを解析し、各項目をcontainerに設定する。
+
+        行の配列に至る途中のオブジェクトは、値を一括で変換せずに、この処理を再帰して解析する。
+        :param container: 項目を設定する辞書。
+        :param path: このオブジェクトの位置(キーの組)。
+        :return: 行の配列を解析した場合は、行のリストのイテレータ。
+        """
+        self.__expect(u'{')
+        if self.__peek() == u'}':
+            self.__pos += 1
+            return
+
+        while True:
+            key = self.__decode()
+            if not isinstance(key, str):
+                raise ValueError(u'invalid key in the query result.')
+            self.__expect(u':')
+
+            child_path = path + (key,)
+            on_path = child_path == self.ROWS_PATH[:len(child_path)]
+            if on_path and child_path == self.ROWS_PATH:
+                if self.__peek() == u'[':
+                    yield from self.__iter_rows()
+                else:
+                    container[key] = self.__decode()
+            elif on_path and self.__peek() == u'{':
+                child = container[key] = {}  # type: Dict[str, Any]
+                yield from self.__iter_object(child, child_path)
+            else:
+                container[key] = self.__decode()
+
+            delimiter = self.__peek()
+            self.__pos += 1
+            if delimiter == u'}':
+                return
+            if delimiter != u',':
+                raise ValueError(
+                    u'expected "," or "}}" but got {!r}.'.format(delimiter))
+
+    def __iter_rows(self) -> Iterator[List[Dict[str, Any]]]:
+        u"""
+        行の配列を解析し、行をbatch_size行ずつリストにまとめて返す。
+
+        :return:
+        """
+        self.__expect(u'[')
+        if self.__peek() == u']':
+            self.__pos += 1
+            return
+
+        scan_once = self.__scan_once
+        match_whitespace = WHITESPACE.match
+        batch_size = self.__batch_size
+        batch = []  # type: List[Dict[str, Any]]
+        while True:
+            # バッファ内で直後の区切り文字まで揃っている行は、メソッド呼び出しを挟まずに続けて変換する。
+            buffer = self.__buffer
+            pos = match_whitespace(buffer, self.__pos).end()
+            limit = len(buffer)
+            delimiter = None
+            while delimiter != u']':
+                try:
+                    value, end = scan_once(buffer, pos)
+                except (StopIteration, ValueError):
+                    break
+                end = match_whitespace(buffer, end).end()
+                if end >= limit or buffer[end] not in u',]':
+                    break
+                batch.append(value)
+                delimiter = buffer[end]
+                pos = self.__pos = match_whitespace(buffer, end + 1).end()
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            self.__pos = pos
+
+            # チャンクの境目にかかる行は、読み足しながら変換する。
+            if delimiter != u']':
+                batch.append(self.__decode())
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+                delimiter = self.__peek()
+                self.__pos += 1
+                if delimiter not in (u',', u']'):
+                    raise ValueError(
+                        u'expected "," or "]" but got {!r}.'.format(
+                            delimiter))
+            if delimiter == u']':
+                break
+        if batch:
+            yield batch
+
+    def __decode(self) -> Any:
+        u"""
+        解析位置にある一つの値を、Pythonのオブジェクトに変換する。
+
+        :return:
+        """
+        self.__peek()
+        while True:
+            try:
+                value, end = self.__decode_value(self.__buffer, self.__pos)
+            except ValueError:
+                # 値が途中で切れている可能性があるため、読み足して変換し直す。
+                if self.__fill():
+                    continue
+                raise
+            # (数値はチャンクの境目で切れていても変換できてしまうため、値の直後の区切り文字まで読み込む。)
+            buffer = self.__buffer
+            if (end < len(buffer) and buffer[end] in self.TERMINATORS) \
+                    or not self.__fill():
+                self.__pos = end
+                return value
+
+    def __expect(self, char: str) -> None:
+        u"""
+        解析位置にある文字が、引数の文字であることを確認して読み進める。
+
+        :param char:
+        :return:
+        """
+        actual = self.__peek()
+        if actual != char:
+            raise ValueError(
+                u'expected {!r} but got {!r}.'.format(char, actual))
+        self.__pos += 1
+
+    def __peek(self) -> str:
+        u"""
+        空白を読み飛ばし、解析位置にある文字を返す(解析位置は進めない)。
+
+        :return:
+        """
+        if not self.__skip_whitespace():
+            raise ValueError(u'unexpected end of the query result.')
+        return self.__buffer[self.__pos]
+
+    def __skip_whitespace(self) -> bool:
+        u"""
+        必要に応じて読み足しながら、空白を読み飛ばす。
+
+        :return: 空白以外の文字があればTrue。レスポンスボディの末尾に達した場合はFalse。
+        """
+        while True:
+            self.__pos = WHITESPACE.match(self.__buffer, self.__pos).end()
+            if self.__pos < len(self.__buffer):
+                return True
+            if not self.__fill():
+                return False
+
+    def __fill(self) -> bool:
+        u"""
+        次のチャンクを読み込み、解析済みの部分を捨ててバッファに追加する。
+
+        :return: 読み込んだ場合はTrue。レスポンスボディの末尾に達していた場合はFalse。
+        """
+        if self.__eof:
+            return False
+        for chunk in self.__chunks:
+            text = self.__decoder.decode(chunk)
+            if text:
+                self.__buffer = self.__buffer[self.__pos:] + text
+                self.__pos = 0
+                return True
+
+        self.__eof = True
+        text = self.__decoder.decode(b'', final=True)
+        if not text:
+            return False
+        self.__buffer = self.__buffer[self.__pos:] + text
+        self.__pos = 0
+        return True
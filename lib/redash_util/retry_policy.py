@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* RetryPolicy
+* TokenBucket
+"""
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from random import uniform
+from threading import Lock
+from time import monotonic, sleep
+from typing import Optional, TYPE_CHECKING
+
+from requests import ConnectionError, ConnectTimeout, RequestException, \
+    Timeout
+
+if TYPE_CHECKING:
+    from requests import Response
+
+
+class RetryPolicy:
+    u"""
+    サーバへのリクエストが一時的なエラーで失敗した場合に、再試行するかどうかと、その間隔を決めるクラス。
+
+    概要:
+    1. 再試行の間隔は、試行する度に指数的に延ばし(exponential backoff)、ゆらぎ(jitter)を加える。
+    2. レスポンスにRetry-Afterヘッダがある場合は、その秒数(または日時)まで待つ。
+    3. 試行回数の上限は、HTTPメソッドが冪等かどうかで分ける。
+
+    補足:
+    ・冪等でないメソッド(POST)は、サーバが処理していないことが明らかな場合
+      (429・503のレスポンスや、接続の確立に失敗した場合)だけ再試行する。
+      POSTのクエリ実行APIを、二重に実行することを避けるため。
+    """
+
+    # 冪等なHTTPメソッド。
+    IDEMPOTENT_METHODS = frozenset(
+        [u'GET', u'HEAD', u'OPTIONS', u'PUT', u'DELETE'])
+    # 冪等なメソッドで、再試行するステータスコード。
+    RETRY_STATUSES = frozenset([429, 502, 503, 504])
+    # 冪等でないメソッドで、再試行するステータスコード(サーバが処理していないことが明らかなもの)。
+    NON_IDEMPOTENT_RETRY_STATUSES = frozenset([429, 503])
+
+    def __init__(
+        self,
+        max_attempts: int=5,
+        max_non_idempotent_attempts: int=3,
+        initial_backoff: float=0.5,
+        max_backoff: float=30.0,
+        multiplier: float=2.0,
+        jitter: float=0.5,
+        max_retry_after: float=300.0
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param max_attempts: 冪等なメソッドの、最初の試行を含めた試行回数の上限。1の場合は再試行しない。
+        :param max_non_idempotent_attempts: 冪等でないメソッドの、最初の試行を含めた試行回数の上限。
+        :param initial_backoff: 最初の再試行までの間隔(秒)。
+        :param max_backoff: 再試行の間隔の上限(秒)。
+        :param multiplier: 再試行する度に、間隔に掛ける倍率。
+        :param jitter: ゆらぎの割合(0〜1)。
+                       実際の間隔は、backoff * (1 - jitter)〜backoffの一様乱数となる。
+        :param max_retry_after: Retry-Afterヘッダに従って待つ時間の上限(秒)。
+                                これより長く待つよう指示された場合は、再試行しない。
+        """
+        self.max_attempts = max_attempts
+        self.max_non_idempotent_attempts = max_non_idempotent_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+
+    def get_max_attempts(self, method: str) -> int:
+        u"""
+        HTTPメソッドに応じた、試行回数の上限を返す。
+
+        :param method: HTTPメソッド名。
+        :return:
+        """
+        if method.upper() in self.IDEMPOTENT_METHODS:
+            return self.max_attempts
+        return self.max_non_idempotent_attempts
+
+    def should_retry_response(
+        self, method: str, response: 'Response', attempt: int
+    ) -> bool:
+        u"""
+        レスポンスを受け取った場合に、再試行するかどうかを返す。
+
+        :param method: HTTPメソッド名。
+        :param response: 受け取ったレスポンス。
+        :param attempt: 何回目の試行だったか(1始まり)。
+        :return:
+        """
+        if attempt >= self.get_max_attempts(method):
+            return False
+
+        if method.upper() in self.IDEMPOTENT_METHODS:
+            statuses = self.RETRY_STATUSES
+        else:
+            statuses = self.NON_IDEMPOTENT_RETRY_STATUSES
+        if response.status_code not in statuses:
+            return False
+
+        retry_after = self.get_retry_after(response)
+        return retry_after is None or retry_after <= self.max_retry_after
+
+    def should_retry_error(
+        self, method: str, error: 'RequestException', attempt: int
+    ) -> bool:
+        u"""
+        通信エラーでレスポンスを受け取れなかった場合に、再試行するかどうかを返す。
+
+        :param method: HTTPメソッド名。
+        :param error: 送出された例外。
+        :param attempt: 何回目の試行だったか(1始まり)。
+        :return:
+        """
+        if attempt >= self.get_max_attempts(method):
+            return False
+
+        if method.upper() in self.IDEMPOTENT_METHODS:
+            return isinstance(error, (ConnectionError, Timeout))
+        # 冪等でないメソッドは、リクエストがサーバに届いていない場合だけ再試行する。
+        return isinstance(error, ConnectTimeout)
+
+    def get_backoff(
+        self, attempt: int, response: Optional['Response']=None
+    ) -> float:
+        u"""
+        次の試行までの間隔を返す。
+
+        :param attempt: 何回目の試行だったか(1始まり)。
+        :param response: 受け取ったレスポンス。Retry-Afterヘッダがあれば、その値を優先する。
+        :return: 間隔(秒)。
+        """
+        if response is not None:
+            retry_after = self.get_retry_after(response)
+            if retry_after is not None:
+                return retry_after
+
+        backoff = min(
+            self.initial_backoff * self.multiplier ** (attempt - 1),
+            self.max_backoff)
+        return uniform(backoff * (1.0 - self.jitter), backoff)
+
+    @staticmethod
+    def get_retry_after(response: 'Response') -> Optional[float]:
+        u"""
+        レスポンスのRetry-Afterヘッダが示す、待つべき秒数を返す。
+
+        ヘッダの値は、秒数とHTTP日付のどちらの形式でもよい。
+        :param response: 受け取ったレスポンス。
+        :return: 秒数。ヘッダが無いか、解釈できない場合はNone。
+        """
+        value = (getattr(response, u'headers', None) or {}).get(u'Retry-After')
+        if not value:
+            return None
+
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(
+            (retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    u"""
+    トークンバケット方式で、サーバへのリクエストの頻度を制限するクラス。
+
+    概要:
+    1. バケットには、1秒あたりrate個のトークンが、capacity個まで溜まる。
+    2. リクエストの前にacquireメソッドでトークンを1つ取り出し、無ければ溜まるまで待つ。
+       そのため、平均してrate件/秒を超えない範囲で、capacity件までのバーストを許す。
+    3. サーバから429が返った場合などは、pauseメソッドで、全ての呼び出し元をまとめて待たせる。
+
+    補足:
+    ・スレッドセーフであり、同じ接続情報を使う全てのGateway(AsyncGatewayのスレッドを含む)で共有する。
+    """
+
+    def __init__(self, rate: float, capacity: float=None) -> None:
+        u"""
+        コンストラクタ。
+
+        :param rate: 1秒あたりに溜まるトークン数(リクエスト数/秒の上限)。
+        :param capacity: 溜められるトークン数の上限。Noneの場合はrateと同じ(1秒分)とする。
+        """
+        self.__rate = rate
+        self.__capacity = max(capacity or rate, 1.0)
+        self.__tokens = self.__capacity
+        self.__updated_at = monotonic()
+        self.__lock = Lock()
+
+    def acquire(self) -> float:
+        u"""
+        トークンを1つ取り出す。トークンが無い場合は、溜まるまで待つ。
+
+        :return: 待った時間(秒)。
+        """
+        waited = 0.0
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.__tokens >= 1.0:
+                    self.__tokens -= 1.0
+                    return waited
+                wait = (1.0 - self.__tokens) / self.__rate
+            sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        u"""
+        指定した秒数の間、トークンが溜まらないようにする(全ての呼び出し元が待つことになる)。
+
+        :param seconds: 待たせる秒数。
+        :return:
+        """
+        with self.__lock:
+            self.__refill()
+            # トークンを負債にすることで、その分だけ溜まるのを遅らせる。
+            # (複数の呼び出し元から同時に呼ばれても、待たせる時間は積み上げない。)
+            self.__tokens = min(self.__tokens, -seconds * self.__rate)
+
+    def __refill(self) -> None:
+        u"""
+        前回の更新からの経過時間に応じて、トークンを溜める(ロックを取得した状態で呼び出すこと)。
+
+        :return:
+        """
+        now = monotonic()
+        self.__tokens = min(
+            self.__tokens + (now - self.__updated_at) * self.__rate,
+            self.__capacity)
+        self.__updated_at = now
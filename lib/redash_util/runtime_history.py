@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* RuntimeHistory
+"""
+
+from json import dump, load
+from os import makedirs, replace
+from os.path import abspath, dirname, exists
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .query import Query
+
+
+class RuntimeHistory:
+    u"""
+    クエリ毎の過去の実行時間(QueryResultのruntime)を記録し、次回の実行時間を見積もるクラス。
+
+    概要:
+    1. recordメソッドで、クエリのid毎に実行時間を記録する。
+       見積もりは、過去の実行時間の指数移動平均とする(直近の実行時間ほど重みが大きい)。
+    2. order_longest_firstメソッドで、見積もりの長い順に(クエリ, パラメータ)の組を並べ替える。
+       同時実行数に上限がある場合、長いクエリから実行する(LPT: Longest Processing Time first)ことで、
+       全体の所要時間(最後のクエリが終わるまでの時間)を短くできる。
+
+    補足:
+    ・file_pathを指定した場合、saveメソッドでJSONファイルに保存し、次回生成時に読み込む。
+    ・実行時間が未知のクエリは、既知のクエリのうち最長のものと同じ見積もりとする
+      (未知のクエリが長い場合に、最後に回されて全体の所要時間が延びることを避けるため)。
+    """
+
+    # 指数移動平均で、新しい実行時間に掛ける重み(0〜1)。
+    SMOOTHING = 0.5
+
+    def __init__(self, file_path: str=None) -> None:
+        u"""
+        コンストラクタ。
+
+        :param file_path: 記録を保存するJSONファイルのパス。存在する場合は、記録を読み込む。
+        """
+        self.__file_path = file_path
+        self.__runtimes = {}  # type: Dict[int, float]
+
+        if file_path and exists(file_path):
+            with open(file_path, u'r') as file:
+                self.__runtimes = {
+                    int(query_id): float(runtime)
+                    for query_id, runtime in load(file).items()}
+
+    def record(self, query_id: int, runtime: float) -> None:
+        u"""
+        クエリの実行時間を記録する。
+
+        :param query_id: クエリのid。
+        :param runtime: 実行時間(秒)。
+        :return:
+        """
+        previous = self.__runtimes.get(query_id)
+        if previous is None:
+            self.__runtimes[query_id] = runtime
+        else:
+            self.__runtimes[query_id] = \
+                self.SMOOTHING * runtime + (1.0 - self.SMOOTHING) * previous
+
+    def get_estimate(self, query_id: int) -> Optional[float]:
+        u"""
+        クエリの実行時間の見積もりを返す。
+
+        :param query_id: クエリのid。
+        :return: 見積もり(秒)。記録が無い場合はNone。
+        """
+        return self.__runtimes.get(query_id)
+
+    def order_longest_first(
+        self, query_and_parameters: List[Tuple['Query', Dict[str, str]]]
+    ) -> List[Tuple['Query', Dict[str, str]]]:
+        u"""
+        (クエリ, パラメータ)の組を、実行時間の見積もりの長い順に並べ替えたリストを返す。
+
+        見積もりが同じ組同士は、元の順序を保つ。
+        :param query_and_parameters: Queryオブジェクトと、クエリパラメータの辞書の組のリスト。
+        :return: 並べ替えたリスト。
+        """
+        unknown_estimate = max(self.__runtimes.values(), default=0.0)
+
+        def estimate(pair: Tuple['Query', Dict[str, str]]) -> float:
+            runtime = self.__runtimes.get(pair[0].id)
+            return unknown_estimate if runtime is None else runtime
+
+        return sorted(query_and_parameters, key=estimate, reverse=True)
+
+    def save(self) -> None:
+        u"""
+        記録をJSONファイルに保存する(file_pathを指定していない場合は何もしない)。
+
+        :return:
+        """
+        if not self.__file_path:
+            return
+
+        directory = dirname(abspath(self.__file_path))
+        makedirs(directory, exist_ok=True)
+        # 書き込み途中のファイルが読み込まれないよう、一時ファイルに書いてから置き換える。
+        with NamedTemporaryFile(
+            u'w', dir=directory, suffix=u'.tmp', delete=False
+        ) as file:
+            dump(
+                {str(query_id): runtime
+                 for query_id, runtime in self.__runtimes.items()},
+                file)
+        replace(file.name, self.__file_path)
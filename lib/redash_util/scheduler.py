@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+u"""
+以下クラスを提供するモジュール。
+
+* DataSourceStats
+* JobScheduler
+"""
+
+from asyncio import Semaphore, gather, get_event_loop
+from collections import OrderedDict, deque
+from logging import getLogger
+from time import monotonic
+from typing import \
+    Any, Callable, Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from .connection_info import ConnectionInfo
+from .job import JobManager
+
+if TYPE_CHECKING:
+    from .job import Job
+    from .query import Query
+    from .query_result import QueryResult
+
+
+logger = getLogger(__name__)
+
+
+class DataSourceStats:
+    u"""JobSchedulerが、データソース毎に記録する統計情報を保持するクラス。"""
+
+    def __init__(self, data_source_id: Optional[int]) -> None:
+        u"""
+        コンストラクタ。
+
+        :param data_source_id: データソースのid。
+        """
+        self.data_source_id = data_source_id
+        # キューに積まれている(まだ実行していない)クエリの件数。
+        self.queued = 0
+        # キューに積まれたクエリの件数の最大値。
+        self.max_queue_depth = 0
+        # 実行中(終了を待っている)のジョブの件数。
+        self.in_flight = 0
+        # 実行したジョブの件数。
+        self.submitted = 0
+        # 終了したジョブの件数。
+        self.finished = 0
+        # 最初にジョブを実行した時刻と、最後にジョブが終了した時刻(monotonic)。
+        self.first_submitted_at = None  # type: Optional[float]
+        self.last_finished_at = None  # type: Optional[float]
+
+    def get_throughput(self) -> float:
+        u"""
+        最初にジョブを実行してから最後にジョブが終了するまでの、1分あたりの終了ジョブ数を返す。
+
+        :return: スループット(件/分)。ジョブが終了していない場合は0。
+        """
+        if self.first_submitted_at is None or self.last_finished_at is None:
+            return 0.0
+        elapsed = self.last_finished_at - self.first_submitted_at
+        if elapsed <= 0:
+            return 0.0
+        return self.finished * 60.0 / elapsed
+
+    def __repr__(self) -> str:
+        return (
+            u'data_source_id={} queued={} max_queue_depth={} in_flight={} '
+            u'submitted={} finished={} throughput={:.2f}/min'
+        ).format(
+            self.data_source_id, self.queued, self.max_queue_depth,
+            self.in_flight, self.submitted, self.finished,
+            self.get_throughput())
+
+
+class JobScheduler:
+    u"""
+    データソース毎の同時実行数を制限しつつ、クエリを実行するクラス。
+
+    概要:
+    1. addメソッドで渡された(クエリ, パラメータ)の組を、クエリのdata_source_id毎のキューに積む。
+    2. 各データソースで実行中のジョブがmax_in_flight件未満であれば、キューの先頭から実行する。
+    3. ジョブが終了して枠が空き次第、同じデータソースのキューから次のクエリを実行する。
+
+    補足:
+    ・ジョブの状態の更新(ポーリング)は、JobManagerに任せる。
+    ・JobManagerに実行時間の記録(RuntimeHistory)がセットされている場合、各キューを実行時間の見積もりの長い順に並べる。
+      長いクエリから実行することで、全体の所要時間を短くできる(LPT: Longest Processing Time first)。
+    ・データソース毎のキューの深さや、スループットは、get_statsメソッドで参照できる。
+    """
+
+    # データソース毎の同時実行数の上限のデフォルト値。
+    DEFAULT_MAX_IN_FLIGHT = 5
+
+    def __init__(
+        self,
+        job_manager: 'JobManager'=None,
+        max_in_flight: int=DEFAULT_MAX_IN_FLIGHT,
+        source_limits: Dict[int, int]=None,
+        concurrency: int=ConnectionInfo.DEFAULT_POOL_SIZE,
+        max_age: int=0
+    ) -> None:
+        u"""
+        コンストラクタ。
+
+        :param job_manager: ジョブの状態を更新するJobManager。Noneの場合は新規に生成する。
+        :param max_in_flight: データソース毎の同時実行数の上限(source_limitsに無いデータソースに適用する)。
+        :param source_limits: data_source_idと、そのデータソースの同時実行数の上限の辞書。
+        :param concurrency: クエリの実行リクエストを、同時に行う数の上限。
+        :param max_age: この秒数以内の実行結果がサーバ上にあれば、再実行せずにそれを使う。
+        """
+        self.__job_manager = job_manager or JobManager([])
+        self.__max_in_flight = max_in_flight
+        self.__source_limits = source_limits or {}
+        self.__concurrency = concurrency
+        self.__max_age = max_age
+
+        # データソース毎のキューと統計情報(データソースが現れた順に保持する)。
+        # キューには、(クエリ, パラメータ)の組を積む。
+        self.__queues = OrderedDict()  # type: Dict[Optional[int], deque]
+        self.__stats = OrderedDict()  # type: Dict[Optional[int], Any]
+        # 実行中のジョブと、そのデータソースの対応。
+        self.__job_sources = {}  # type: Dict[Job, Optional[int]]
+        # ジョブを発行する度に呼び出す関数。
+        self.__submit_listener = None  # type: Optional[Callable[[Job], None]]
+
+    def set_submit_listener(self, listener: Callable[['Job'], None]) -> None:
+        u"""
+        ジョブを発行する度に、そのジョブを引数として呼び出す関数をセットする(発行したジョブの記録などに使う)。
+
+        :param listener:
+        :return:
+        """
+        self.__submit_listener = listener
+
+    def add(
+        self, query_and_parameters: List[Tuple['Query', Dict[str, str]]]
+    ) -> None:
+        u"""
+        (クエリ, パラメータ)の組を、データソース毎のキューに積む。
+
+        :param query_and_parameters: Queryオブジェクトと、クエリパラメータの辞書の組のリスト。
+        :return:
+        """
+        history = self.__job_manager.get_runtime_history()
+        if history is not None:
+            # キュー毎の並びが、見積もりの長い順になるよう、まとめて並べ替えてから積む。
+            for queue in self.__queues.values():
+                query_and_parameters = list(queue) + query_and_parameters
+                queue.clear()
+            for stats in self.__stats.values():
+                stats.queued = 0
+            query_and_parameters = history.order_longest_first(
+                query_and_parameters)
+
+        for query, parameters in query_and_parameters:
+            data_source_id = getattr(query, u'data_source_id', None)
+            if data_source_id not in self.__queues:
+                self.__queues[data_source_id] = deque()
+                self.__stats[data_source_id] = DataSourceStats(data_source_id)
+            self.__queues[data_source_id].append((query, parameters))
+
+            stats = self.__stats[data_source_id]
+            stats.queued += 1
+            stats.max_queue_depth = max(stats.max_queue_depth, stats.queued)
+
+    def get_limit(self, data_source_id: Optional[int]) -> int:
+        u"""
+        データソースの同時実行数の上限を返す。
+
+        :param data_source_id:
+        :return:
+        """
+        return max(
+            self.__source_limits.get(data_source_id, self.__max_in_flight), 1)
+
+    def get_stats(self) -> Dict[Optional[int], 'DataSourceStats']:
+        u"""
+        データソース毎の統計情報を返す。
+
+        :return: data_source_idと、統計情報の辞書。
+        """
+        return dict(self.__stats)
+
+    def count_queued(self) -> int:
+        u"""
+        キューに積まれている(まだ実行していない)クエリの件数を返す。
+
+        :return:
+        """
+        return sum(len(queue) for queue in self.__queues.values())
+
+    def iter_finished_jobs(
+        self, deadline: Optional[float]=None, concurrent: bool=True
+    ) -> Iterator['Job']:
+        u"""
+        データソース毎の上限までクエリを実行し、終了したジョブを終了した順に返す。
+
+        ジョブが終了する度に、空いた枠の分だけ同じデータソースのキューから次のクエリを実行する。
+        キューが空になり全てのジョブが終了するか、deadline(またはJobManagerのtotal_timeout)を
+        過ぎた時点でイテレートを終える(その場合、キューに残ったクエリは実行しない)。
+        :param deadline: 待機する時間の上限(秒)。Noneの場合、全てのジョブが終了するまで待機する。
+        :param concurrent: Trueの場合、ジョブの状態取得を並行して行う。
+        :return: 終了したジョブのイテレータ。
+        """
+        start = monotonic()
+
+        # サーバ上の実行結果を再利用したジョブは、実行した時点で終了しているため、その場で返す。
+        finished_jobs = self.__submit_ready()
+        while finished_jobs:
+            job = finished_jobs.pop(0)
+            yield job
+            finished_jobs += self.__release(job)
+
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - (monotonic() - start)
+        for job in self.__job_manager.iter_finished_jobs(
+                remaining, concurrent):
+            if job not in self.__job_sources:
+                # このインスタンス以外から登録されたジョブ。
+                yield job
+                continue
+
+            finished_jobs = [job]
+            while finished_jobs:
+                job = finished_jobs.pop(0)
+                yield job
+                finished_jobs += self.__release(job)
+
+    def iter_completed(
+        self,
+        deadline: Optional[float]=None,
+        concurrent: bool=True,
+        batch_size: Optional[int]=None
+    ) -> Iterator['QueryResult']:
+        u"""
+        ジョブが成功した順に、そのジョブの実行結果を返すイテレータ。
+
+        実行の仕方はiter_finished_jobsメソッドと同じ。失敗したジョブの結果は返さない。
+        :param deadline: 待機する時間の上限(秒)。Noneの場合、全てのジョブが終了するまで待機する。
+        :param concurrent: Trueの場合、ジョブの状態取得を並行して行う。
+        :param batch_size: 指定した場合、batch_size行ずつ読み込む結果(Job.stream_resultを参照)を返す。
+        :return: ジョブの実行結果を保持するオブジェクトのイテレータ。
+        """
+        yield from self.__job_manager.iter_results(
+            self.iter_finished_jobs(deadline, concurrent), batch_size)
+
+    def __release(self, job: 'Job') -> List['Job']:
+        u"""
+        終了したジョブの枠を空け、空いた枠の分だけ次のクエリを実行する。
+
+        :param job: 終了したジョブ。
+        :return: 新たに実行したジョブのうち、実行した時点で終了していたもののリスト。
+        """
+        data_source_id = self.__job_sources.pop(job)
+        stats = self.__stats[data_source_id]
+        stats.in_flight -= 1
+        stats.finished += 1
+        stats.last_finished_at = monotonic()
+        if self.__job_manager.expired():
+            # 全体の時間の上限を過ぎた場合は、キューに残ったクエリを実行しない。
+            return []
+        return self.__submit_ready()
+
+    def __submit_ready(self) -> List['Job']:
+        u"""
+        各データソースの空いた枠の分だけ、キューの先頭からクエリを実行する。
+
+        実行したジョブのうち、終了していないものはJobManagerに登録する。
+        :return: 実行した時点で終了していたジョブのリスト。
+        """
+        ready = []  # type: List[Tuple[Optional[int], Query, Dict[str, str]]]
+        for data_source_id, queue in self.__queues.items():
+            stats = self.__stats[data_source_id]
+            while queue and stats.in_flight < self.get_limit(data_source_id):
+                query, parameters = queue.popleft()
+                ready.append((data_source_id, query, parameters))
+                stats.queued -= 1
+                stats.in_flight += 1
+        if not ready:
+            return []
+
+        jobs = get_event_loop().run_until_complete(self.__submit(ready))
+
+        now = monotonic()
+        unfinished_jobs = []
+        finished_jobs = []
+        for (data_source_id, _, _), job in zip(ready, jobs):
+            stats = self.__stats[data_source_id]
+            stats.submitted += 1
+            if stats.first_submitted_at is None:
+                stats.first_submitted_at = now
+            self.__job_sources[job] = data_source_id
+            if self.__submit_listener is not None:
+                self.__submit_listener(job)
+            if job.is_finished():
+                finished_jobs.append(job)
+            else:
+                unfinished_jobs.append(job)
+
+        self.__job_manager.add(unfinished_jobs)
+        logger.debug(u'submitted %d job(s): %s', len(jobs), self.__stats)
+        return finished_jobs
+
+    async def __submit(
+        self, ready: List[Tuple[Optional[int], 'Query', Dict[str, str]]]
+    ) -> List['Job']:
+        u"""
+        クエリの実行リクエストを、同時実行数を制限しつつ並行して行う。
+
+        :param ready: (data_source_id, クエリ, パラメータ)の組のリスト。
+        :return: ジョブのリスト(引数のリストと同じ順序)。
+        """
+        semaphore = Semaphore(max(self.__concurrency, 1))
+
+        async def submit(
+            query: 'Query', parameters: Dict[str, str]
+        ) -> 'Job':
+            async with semaphore:
+                return await query.async_execute_with(
+                    parameters, self.__max_age)
+
+        return await gather(
+            *[submit(query, parameters) for _, query, parameters in ready])
@@ -1,19 +1,47 @@
 # -*- coding: utf-8 -*-
 u"""テストに関するユーティリティクラスを提供するライブラリ。"""
 
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Iterator
 
 
 class ResponseMock:
     u"""requestsライブラリの、Responseモジュールのモッククラス。"""
 
-    def __init__(self, json_data: Dict[str, Any], status_code: int) -> None:
+    def __init__(
+        self,
+        json_data: Dict[str, Any],
+        status_code: int,
+        content: bytes=b'',
+        headers: Dict[str, str]=None
+    ) -> None:
         self.json_data = json_data
         self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
 
     def json(self) -> Dict[str, Any]:
         return self.json_data
 
+    def iter_content(self, chunk_size: int=1) -> Iterator[bytes]:
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
     # TODO status_codeの値に応じた例外を送出するようにする。
     def raise_for_status(self) -> None:
         pass
+
+    def close(self) -> None:
+        pass
+
+
+def make_coroutine_function(return_value: Any) -> Callable[..., Any]:
+    u"""
+    任意の引数を受け取り、指定した値を返すコルーチン関数を生成する。
+
+    コルーチンメソッドをpatchする際に、side_effectとして渡すことを想定している。
+    :param return_value: コルーチンの戻り値。
+    :return: コルーチン関数。
+    """
+    async def coroutine_function(*args: Any, **kwargs: Any) -> Any:
+        return return_value
+    return coroutine_function
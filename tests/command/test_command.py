@@ -2,14 +2,24 @@
 u"""commandsパッケージに対するテストをまとめたモジュール。"""
 
 from unittest import TestCase
-from unittest.mock import patch
+from unittest.mock import Mock, patch
+
+from datetime import date
 
 from lib.command import \
     ArchiveQueriesCommand,\
     BaseCommand,\
     ExecuteQueriesCommand,\
     ForkQueriesCommand
-from lib.redash_util import Job, NullQueryResult
+from lib.command.command import \
+    make_daily_parameter_sets, \
+    make_parameter_label
+from lib.redash_util import \
+    ExecutionJournal, Job, JobStatus, NullQueryResult, Query, QueryResult, \
+    ResultCache
+from lib.test_util import ResponseMock, make_coroutine_function
+
+from testfixtures import TempDirectory
 
 
 class BaseCommandTest(TestCase):
@@ -212,12 +222,81 @@ class ExecuteQueriesCommandTest(TestCase):
         except BaseException as e:
             self.assertTrue(True)
 
-    @patch(u'lib.redash_util.job.JobManager.get_query_result_list')
-    @patch(u'lib.redash_util.job.JobManager.update')
+    @patch('lib.command.command.ArgumentParser.error')
+    def test_init_direct_download_with_invalid_format_case(
+        self, error_method
+    ):
+        u"""
+        csv以外のフォーマットで--direct-downloadを指定し、エラーになるケース。
+
+        :return:
+        """
+        error_method.side_effect = SystemExit(u'')
+
+        with self.assertRaises(SystemExit):
+            ExecuteQueriesCommand([
+                u'sample_text',
+                u'json',
+                u'/tmp/query_data',
+                u'--direct-download',
+                u'--api-key',
+                u'dummy api key',
+                u'--end-point',
+                u'https://dummy.endpoint',
+            ])
+
+    def test_init_max_in_flight_case(self):
+        u"""
+        --max-in-flightオプションの既定値を確認するケース(正常ケース)。
+
+        :return:
+        """
+        args = [
+            u'sample_text',
+            u'csv',
+            u'/tmp/query_data',
+            u'--pool-size',
+            u'4',
+            u'--api-key',
+            u'dummy api key',
+            u'--end-point',
+            u'https://dummy.endpoint',
+        ]
+
+        # 省略した場合は、--pool-sizeと同じ値になる。
+        command = ExecuteQueriesCommand(args)
+        self.assertEqual(
+            command.job_manager._JobManager__max_in_flight, 4)
+
+        command = ExecuteQueriesCommand(args + [u'--max-in-flight', u'2'])
+        self.assertEqual(
+            command.job_manager._JobManager__max_in_flight, 2)
+
+    @patch('lib.command.command.ArgumentParser.error')
+    def test_init_resume_without_journal_case(self, error_method):
+        u"""
+        --journalを指定せずに--resumeを指定し、エラーになるケース。
+
+        :return:
+        """
+        error_method.side_effect = SystemExit(u'')
+
+        with self.assertRaises(SystemExit):
+            ExecuteQueriesCommand([
+                u'sample_text',
+                u'csv',
+                u'/tmp/query_data',
+                u'--resume',
+                u'--api-key',
+                u'dummy api key',
+                u'--end-point',
+                u'https://dummy.endpoint',
+            ])
+
     @patch(u'lib.redash_util.job.JobManager.finished')
+    @patch(u'lib.redash_util.job.JobManager.iter_completed')
     @patch(u'lib.redash_util.job.JobManager.add')
-    @patch(u'lib.redash_util.query.QueryList.unbind_values_in_bulk')
-    @patch(u'lib.redash_util.query.QueryList.execute_in_bulk')
+    @patch(u'lib.redash_util.query.QueryList.async_execute_with_in_bulk')
     @patch(u'lib.redash_util.query.QueryList.update_in_bulk')
     @patch(u'lib.redash_util.query.QueryList.bind_values_in_bulk')
     @patch(u'lib.redash_util.query.QueryList.search_queries_by')
@@ -226,12 +305,10 @@ class ExecuteQueriesCommandTest(TestCase):
         mock_ql_search_queries_by,
         mock_ql_bind_values_in_bulk,
         mock_ql_update_in_bulk,
-        mock_ql_execute_in_bulk,
-        mock_ql_unbind_values_in_bulk,
+        mock_ql_async_execute_with_in_bulk,
         mock_jm_add,
+        mock_jm_iter_completed,
         mock_jm_finished,
-        mock_jm_update,
-        mock_jm_get_query_result_list,
     ):
         u"""
         executeメソッドのテストケース。
@@ -242,19 +319,19 @@ class ExecuteQueriesCommandTest(TestCase):
         :param mock_ql_search_queries_by:
         :param mock_ql_bind_values_in_bulk:
         :param mock_ql_update_in_bulk:
-        :param mock_ql_execute_in_bulk:
-        :param mock_ql_unbind_values_in_bulk:
+        :param mock_ql_async_execute_with_in_bulk:
         :param mock_jm_add:
-        :param mock_jm_update:
-        :param mock_jm_get_query_result_list:
+        :param mock_jm_iter_completed:
+        :param mock_jm_finished:
         :return:
         """
         # パッチした一部のメソッドは、特定の値を返すようにしておく。
         jobs = [Job(), Job()]
-        mock_ql_execute_in_bulk.return_value = jobs
-        mock_jm_finished.return_value = True
+        mock_ql_async_execute_with_in_bulk.side_effect = \
+            make_coroutine_function(jobs)
         query_results = [NullQueryResult([]), NullQueryResult([])]
-        mock_jm_get_query_result_list.return_value = query_results
+        mock_jm_iter_completed.return_value = iter(query_results)
+        mock_jm_finished.return_value = True
 
         # インスタンスを生成して、テスト実施。
         command = ExecuteQueriesCommand([
@@ -269,21 +346,381 @@ class ExecuteQueriesCommandTest(TestCase):
             u'https://dummy.endpoint',
             u'--log-dir',
             u'/tmp/kpi_data',
+            u'--server-max-age',
+            u'300',
         ])
         command.execute()
 
         # QueryResultListクラスの各処理が、以下のように呼ばれる。
-        mock_ql_search_queries_by.ssert_called_once_with(u'sample_text')
-        mock_ql_bind_values_in_bulk.assert_called_once_with({u'key': u'value'})
-        mock_ql_update_in_bulk.assert_called_with()
-        mock_ql_execute_in_bulk.ssert_called_once_with()
-        mock_ql_unbind_values_in_bulk.ssert_called_once_with()
+        # (パラメータ付きで実行するため、サーバ上のクエリは更新されない。)
+        mock_ql_search_queries_by.assert_called_once_with(u'sample_text')
+        mock_ql_async_execute_with_in_bulk.assert_called_once_with(
+            {u'key': u'value'}, max_age=300)
+        mock_ql_bind_values_in_bulk.assert_not_called()
+        mock_ql_update_in_bulk.assert_not_called()
 
         # JobManagerクラスの各処理が、以下のように呼ばれる。
         mock_jm_add.assert_called_once_with(jobs)
+        mock_jm_iter_completed.assert_called_once_with(
+            None, batch_size=None)
         mock_jm_finished.assert_called_once_with()
-        mock_jm_update.assert_not_called()
-        mock_jm_get_query_result_list.assert_called_once_with()
+
+    @patch(u'lib.redash_util.job.JobManager.finished', return_value=True)
+    @patch(u'lib.redash_util.job.JobManager.iter_completed')
+    @patch(u'lib.redash_util.query.QueryList.async_execute_sweep')
+    @patch(u'lib.redash_util.query.QueryList.search_queries_by')
+    def test_execute_sweep_case(
+        self,
+        mock_ql_search_queries_by,
+        mock_ql_async_execute_sweep,
+        mock_jm_iter_completed,
+        mock_jm_finished,
+    ):
+        u"""
+        --sweep-daysオプションを指定した、executeメソッドのテストケース。
+
+        :param mock_ql_search_queries_by:
+        :param mock_ql_async_execute_sweep:
+        :param mock_jm_iter_completed:
+        :param mock_jm_finished:
+        :return:
+        """
+        mock_ql_async_execute_sweep.side_effect = make_coroutine_function([])
+        query_result = NullQueryResult([])
+        query_result.serialize = Mock()
+        query_result.get_query_name = Mock(return_value=u'query1')
+        query_result.get_parameters = Mock(return_value={
+            u'from': u'2017-01-01', u'to': u'2017-01-02', u'key': u'value'})
+        mock_jm_iter_completed.return_value = iter([query_result])
+
+        temp_dir = TempDirectory()
+        command = ExecuteQueriesCommand([
+            u'sample_text',
+            u'csv',
+            temp_dir.path,
+            u'--parameters',
+            u'key:value',
+            u'--sweep-days',
+            u'2017-01-01',
+            u'2017-01-03',
+            u'--sweep-keys',
+            u'from',
+            u'to',
+            u'--api-key',
+            u'dummy api key',
+            u'--end-point',
+            u'https://dummy.endpoint',
+        ])
+        command.execute()
+
+        # 検索は一度だけ行われ、全ての日付のパラメータでまとめて実行される。
+        mock_ql_search_queries_by.assert_called_once_with(u'sample_text')
+        mock_ql_async_execute_sweep.assert_called_once_with([
+            {u'key': u'value', u'from': u'2017-01-01', u'to': u'2017-01-02'},
+            {u'key': u'value', u'from': u'2017-01-02', u'to': u'2017-01-03'},
+        ], max_age=0)
+
+        # 結果は、パラメータ毎のディレクトリに出力される。
+        query_result.serialize.assert_called_once_with(
+            temp_dir.path
+            + u'/from=2017-01-01_key=value_to=2017-01-02/query1.csv',
+            u'csv', compression_level=None, background=False)
+
+        temp_dir.cleanup()
+
+    @patch(u'lib.redash_util.job.JobManager.finished', return_value=True)
+    @patch(u'lib.redash_util.job.JobManager.iter_completed')
+    @patch(u'lib.redash_util.query.QueryList.async_execute_each')
+    @patch(u'lib.redash_util.query.QueryList.search_queries_by')
+    def test_execute_with_result_cache_case(
+        self,
+        mock_ql_search_queries_by,
+        mock_ql_async_execute_each,
+        mock_jm_iter_completed,
+        mock_jm_finished,
+    ):
+        u"""
+        --max-ageオプションを指定した、executeメソッドのテストケース。
+
+        :param mock_ql_search_queries_by:
+        :param mock_ql_async_execute_each:
+        :param mock_jm_iter_completed:
+        :param mock_jm_finished:
+        :return:
+        """
+        temp_dir = TempDirectory()
+        output_dir = temp_dir.makedir(u'output')
+        cache_dir = temp_dir.makedir(u'cache')
+
+        # クエリを2件用意し、1件目の結果だけキャッシュしておく。
+        queries = []
+        for i in [1, 2]:
+            query = Query(i)
+            query.set_properties({
+                u'name': u'query' + str(i),
+                u'query': u'SELECT ' + str(i) + u';',
+                u'data_source_id': 1,
+            })
+            queries.append(query)
+        data = {u'columns': [{u'name': u'a'}], u'rows': [{u'a': 1}]}
+        ResultCache(cache_dir, 60).put(
+            ResultCache.make_key(queries[0], {}),
+            QueryResult({u'query_id': 1, u'data': data}))
+
+        def search_queries_by(text):
+            command.query_list.set_queries(queries)
+            return queries
+        mock_ql_search_queries_by.side_effect = search_queries_by
+        mock_ql_async_execute_each.side_effect = make_coroutine_function([])
+        mock_jm_iter_completed.return_value = iter([QueryResult({
+            u'query_id': 2, u'query_name': u'query2', u'parameters': {},
+            u'data': data})])
+
+        command = ExecuteQueriesCommand([
+            u'sample_text',
+            u'csv',
+            output_dir,
+            u'--max-age',
+            u'60',
+            u'--result-cache-dir',
+            cache_dir,
+            u'--api-key',
+            u'dummy api key',
+            u'--end-point',
+            u'https://dummy.endpoint',
+        ])
+        command.execute()
+
+        # キャッシュに無いクエリだけが実行される。
+        mock_ql_async_execute_each.assert_called_once_with(
+            [(queries[1], {})], max_age=0)
+
+        # キャッシュ済みの結果と、実行した結果の両方が出力される。
+        # (--journalを指定していないため、進捗の記録は作成されない。)
+        temp_dir.compare([u'query1.csv', u'query2.csv'], path=output_dir)
+
+        # 実行した結果は、次回以降のためにキャッシュされる。
+        self.assertIsNotNone(ResultCache(cache_dir, 60).get(
+            ResultCache.make_key(queries[1], {})))
+
+        temp_dir.cleanup()
+
+    @patch(u'lib.redash_util.gateway.Gateway.update_job_status')
+    @patch(u'lib.redash_util.job.JobManager.iter_completed')
+    @patch(u'lib.redash_util.query.QueryList.async_execute_each')
+    @patch(u'lib.redash_util.query.QueryList.search_queries_by')
+    def test_execute_resume_case(
+        self,
+        mock_ql_search_queries_by,
+        mock_ql_async_execute_each,
+        mock_jm_iter_completed,
+        mock_gw_update_job_status,
+    ):
+        u"""
+        --resumeオプションを指定した、executeメソッドのテストケース。
+
+        :param mock_ql_search_queries_by:
+        :param mock_ql_async_execute_each:
+        :param mock_jm_iter_completed:
+        :param mock_gw_update_job_status:
+        :return:
+        """
+        temp_dir = TempDirectory()
+        output_dir = temp_dir.makedir(u'output')
+        queries = [Query(1), Query(2), Query(3), Query(4)]
+        for query in queries:
+            query.name = u'query' + str(query.id)
+
+        # 前回の実行で、1件目は結果を書き出し済み、2件目と4件目は実行中だったとする。
+        journal_path = temp_dir.getpath(u'journal')
+        journal = ExecutionJournal(journal_path)
+        output_path = temp_dir.write(u'output/query1.csv', b'a\n1\n')
+        journal.record_written(1, {}, output_path)
+        for query_id in [2, 4]:
+            running_job = Job(
+                job_id=u'job-' + str(query_id), query_id=query_id)
+            running_job.status = JobStatus.running
+            journal.record_submitted(running_job)
+        journal.close()
+
+        # 4件目のジョブは、サーバ上で待機中のまま(期限切れなど)になっている。
+        statuses = {u'job-2': JobStatus.running, u'job-4': JobStatus.pending}
+        mock_gw_update_job_status.side_effect = lambda job_id: ResponseMock(
+            {u'job': {u'id': job_id, u'status': statuses[job_id]}}, 200)
+
+        def search_queries_by(text):
+            command.query_list.set_queries(queries)
+            return queries
+        mock_ql_search_queries_by.side_effect = search_queries_by
+        mock_ql_async_execute_each.side_effect = make_coroutine_function([])
+        mock_jm_iter_completed.return_value = iter([])
+
+        command = ExecuteQueriesCommand([
+            u'sample_text',
+            u'csv',
+            output_dir,
+            u'--journal',
+            journal_path,
+            u'--resume',
+            u'--api-key',
+            u'dummy api key',
+            u'--end-point',
+            u'https://dummy.endpoint',
+        ])
+        command.execute()
+
+        # 書き出し済みのクエリは実行せず、実行中だったジョブは状態を更新して待つ。
+        self.assertEqual(mock_gw_update_job_status.call_count, 2)
+        self.assertEqual(command.job_manager.count(JobStatus.running), 1)
+        self.assertEqual(command.job_manager.count(JobStatus.pending), 0)
+
+        # 残りのクエリと、待機中のままだったジョブのクエリが実行される。
+        mock_ql_async_execute_each.assert_called_once_with(
+            [(queries[2], {}), (queries[3], {})], max_age=0)
+
+        temp_dir.cleanup()
+
+    @patch(u'lib.redash_util.scheduler.JobScheduler.iter_completed')
+    @patch(u'lib.redash_util.scheduler.JobScheduler.add')
+    @patch(u'lib.redash_util.query.QueryList.async_execute_each')
+    @patch(u'lib.redash_util.query.QueryList.search_queries_by')
+    def test_execute_with_scheduler_case(
+        self,
+        mock_ql_search_queries_by,
+        mock_ql_async_execute_each,
+        mock_js_add,
+        mock_js_iter_completed,
+    ):
+        u"""
+        --max-in-flight-per-sourceオプションを指定した、executeメソッドのテストケース。
+
+        :param mock_ql_search_queries_by:
+        :param mock_ql_async_execute_each:
+        :param mock_js_add:
+        :param mock_js_iter_completed:
+        :return:
+        """
+        queries = [Query(1), Query(2)]
+
+        def search_queries_by(text):
+            command.query_list.set_queries(queries)
+            return queries
+        mock_ql_search_queries_by.side_effect = search_queries_by
+        mock_js_iter_completed.return_value = iter([])
+
+        command = ExecuteQueriesCommand([
+            u'sample_text',
+            u'csv',
+            u'/tmp/query_data',
+            u'--max-in-flight-per-source',
+            u'2',
+            u'--source-limits',
+            u'1:1, 5:10',
+            u'--api-key',
+            u'dummy api key',
+            u'--end-point',
+            u'https://dummy.endpoint',
+        ])
+        self.assertEqual(command.ns.source_limits, {1: 1, 5: 10})
+        self.assertEqual(command.scheduler.get_limit(1), 1)
+        self.assertEqual(command.scheduler.get_limit(2), 2)
+        command.execute()
+
+        # 全てのクエリはスケジューラのキューに積まれ、その場では実行されない。
+        mock_js_add.assert_called_once_with(
+            [(queries[0], {}), (queries[1], {})])
+        mock_ql_async_execute_each.assert_not_called()
+        mock_js_iter_completed.assert_called_once_with(
+            None, batch_size=None)
+
+    @patch(u'lib.redash_util.job.JobManager.iter_completed')
+    @patch(u'lib.redash_util.query.QueryList.async_execute_in_bulk')
+    @patch(u'lib.redash_util.query.QueryList.async_read_in_bulk')
+    @patch(u'lib.redash_util.query.QueryList.search_queries_by')
+    def test_execute_with_catalog_case(
+        self,
+        mock_ql_search_queries_by,
+        mock_ql_async_read_in_bulk,
+        mock_ql_async_execute_in_bulk,
+        mock_jm_iter_completed,
+    ):
+        u"""
+        --catalogオプションを指定した、executeメソッドのテストケース。
+
+        :param mock_ql_search_queries_by:
+        :param mock_ql_async_read_in_bulk:
+        :param mock_ql_async_execute_in_bulk:
+        :param mock_jm_iter_completed:
+        :return:
+        """
+        temp_dir = TempDirectory()
+        queries = [Query(1), Query(2)]
+
+        def search_queries_by(text):
+            command.query_list.set_queries(queries)
+            return queries
+
+        async def async_read_in_bulk(concurrency=0):
+            # 読み直した結果、2件目はアーカイブ済みだったとする。
+            queries[0].query = u'SELECT 2;'
+            queries[1].is_archived = True
+        mock_ql_search_queries_by.side_effect = search_queries_by
+        mock_ql_async_read_in_bulk.side_effect = async_read_in_bulk
+        mock_ql_async_execute_in_bulk.side_effect = \
+            make_coroutine_function([])
+        mock_jm_iter_completed.return_value = iter([])
+
+        command = ExecuteQueriesCommand([
+            u'sample_text',
+            u'csv',
+            u'/tmp/query_data',
+            u'--catalog',
+            temp_dir.getpath(u'catalog.sqlite'),
+            u'--api-key',
+            u'dummy api key',
+            u'--end-point',
+            u'https://dummy.endpoint',
+        ])
+        command.execute()
+
+        # キャッシュから検索したクエリは、実行する前にサーバから読み直す。
+        mock_ql_async_read_in_bulk.assert_called_once_with(
+            command.ns.pool_size)
+        # アーカイブ済みだったクエリは実行しない。
+        self.assertEqual(command.query_list.get_queries(), [queries[0]])
+        mock_ql_async_execute_in_bulk.assert_called_once_with(max_age=0)
+
+        command.catalog.close()
+        temp_dir.cleanup()
+
+
+class SweepFunctionsTest(TestCase):
+    u"""スイープ実行に関する関数のテストをまとめたクラス。"""
+
+    def test_make_daily_parameter_sets_normal_case(self):
+        parameter_sets = make_daily_parameter_sets(
+            date(2017, 1, 31), date(2017, 2, 2), u'start_date', u'end_date')
+
+        # 一日ずつ区切られ、終了日は翌日になる。
+        self.assertEqual(parameter_sets, [
+            {u'start_date': u'2017-01-31', u'end_date': u'2017-02-01'},
+            {u'start_date': u'2017-02-01', u'end_date': u'2017-02-02'},
+        ])
+
+    def test_make_daily_parameter_sets_invalid_range_case(self):
+        # 終了日が開始日以前の場合、ValueErrorが送出される。
+        with self.assertRaises(ValueError):
+            make_daily_parameter_sets(
+                date(2017, 1, 2), date(2017, 1, 1), u'start', u'end')
+
+    def test_make_parameter_label_normal_case(self):
+        # キーの昇順に連結され、空白やスラッシュなどの記号は置換される。
+        self.assertEqual(
+            make_parameter_label({
+                u'time': u'2017-01-01 00:00:00',
+                u'table': u'a/b',
+            }),
+            u'table=a_b_time=2017-01-01_00_00_00')
 
 
 class ArchiveQueriesCommandTest(TestCase):
@@ -327,7 +764,10 @@ class ArchiveQueriesCommandTest(TestCase):
         except BaseException as e:
             self.assertTrue(True)
 
-    @patch(u'lib.redash_util.query.QueryList.archive_in_bulk')
+    @patch(
+        u'lib.redash_util.query.QueryList.async_archive_in_bulk',
+        side_effect=make_coroutine_function(None)
+    )
     @patch(u'lib.redash_util.query.QueryList.search_queries_by')
     def test_execute_normal_case(
         self, mock_search_queries_by, mock_archive_in_bulk
@@ -397,9 +837,15 @@ class ForkQueriesCommandTest(TestCase):
         except BaseException as e:
             self.assertTrue(True)
 
-    @patch(u'lib.redash_util.query.QueryList.update_in_bulk')
+    @patch(
+        u'lib.redash_util.query.QueryList.async_update_in_bulk',
+        side_effect=make_coroutine_function(None)
+    )
     @patch(u'lib.redash_util.query.QueryList.set_properties_in_bulk')
-    @patch(u'lib.redash_util.query.QueryList.fork_in_bulk')
+    @patch(
+        u'lib.redash_util.query.QueryList.async_fork_in_bulk',
+        side_effect=make_coroutine_function([])
+    )
     @patch(u'lib.redash_util.query.QueryList.search_queries_by')
     def test_execute_normal_case(
         self,
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+u"""column_tableモジュールに対するテストをまとめたモジュール。"""
+
+from array import array
+from unittest import TestCase
+
+from lib.redash_util import ColumnTable
+
+
+class ColumnTableTest(TestCase):
+    u"""ColumnTableクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.columns = [
+            {u'name': u'id', u'type': u'integer'},
+            {u'name': u'score', u'type': u'float'},
+            {u'name': u'name', u'type': u'string'},
+            {u'name': u'count', u'type': u'integer'},
+        ]
+        self.rows = [
+            {u'id': 1, u'score': 0.5, u'name': u'a', u'count': 1},
+            {u'id': 2, u'score': 1.5, u'name': u'b', u'count': None},
+            {u'id': 3, u'score': 2.0, u'count': 2 ** 70},
+        ]
+
+    def test_from_rows_case(self):
+        table = ColumnTable.from_rows(self.columns, self.rows)
+
+        # 値の型が整数・浮動小数点数に揃ったカラムは、型付きの配列になる。
+        self.assertEqual(table.get_column(u'id'), array(u'q', [1, 2, 3]))
+        self.assertEqual(
+            table.get_column(u'score'), array(u'd', [0.5, 1.5, 2.0]))
+
+        # 欠損値やnullを含むカラムは、リストのまま保持する。
+        self.assertEqual(table.get_column(u'name'), [u'a', u'b', None])
+        self.assertEqual(table.get_column(u'count'), [1, None, 2 ** 70])
+
+        self.assertEqual(table.count_rows(), 3)
+        self.assertEqual(table.get_index(u'name'), 2)
+        self.assertEqual(
+            table.get_column_names(), [u'id', u'score', u'name', u'count'])
+
+    def test_iter_rows_case(self):
+        table = ColumnTable.from_rows(self.columns, self.rows)
+
+        # 各行は、カラムの順に値を並べたタプルとして取り出せる。
+        self.assertEqual(list(table.iter_rows()), [
+            (1, 0.5, u'a', 1),
+            (2, 1.5, u'b', None),
+            (3, 2.0, None, 2 ** 70),
+        ])
+
+        # 行毎の辞書の配列に戻すと、欠損値はnullになる。
+        self.assertEqual(table.to_rows()[2], {
+            u'id': 3, u'score': 2.0, u'name': None, u'count': 2 ** 70})
+
+    def test_mixed_types_case(self):
+        # 型が混在するカラムは、値を変えないようリストのまま保持する。
+        table = ColumnTable.from_rows(
+            [{u'name': u'value', u'type': u'float'}],
+            [{u'value': 1}, {u'value': 1.5}, {u'value': True}])
+        self.assertEqual(table.get_column(u'value'), [1, 1.5, True])
+
+        # カラムが無い場合も、行数分の空のタプルを返す。
+        table = ColumnTable.from_rows([], [{}, {}])
+        self.assertEqual(list(table.iter_rows()), [(), ()])
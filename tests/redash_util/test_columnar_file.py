@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+u"""columnar_fileモジュールに対するテストをまとめたモジュール。"""
+
+from unittest import TestCase
+
+from lib.redash_util import ColumnarReader, ColumnarWriter
+
+from testfixtures import TempDirectory
+
+
+class ColumnarFileTest(TestCase):
+    u"""ColumnarWriter・ColumnarReaderクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.temp_dir = TempDirectory()
+        self.file_path = self.temp_dir.path + u'/result.columnar'
+        self.columns = [
+            {u'name': u'id', u'type': u'integer'},
+            {u'name': u'score', u'type': u'float'},
+            {u'name': u'active', u'type': u'boolean'},
+            {u'name': u'name', u'type': u'string'},
+            {u'name': u'created_at', u'type': u'datetime'},
+        ]
+        self.rows = [
+            {u'id': 1, u'score': 0.5, u'active': True, u'name': u'ユーザ1',
+             u'created_at': u'2017-01-01T00:00:00'},
+            {u'id': 2, u'score': None, u'active': False, u'name': u'',
+             u'created_at': None},
+            {u'id': None, u'score': 3, u'name': u'a,"b"\nc'},
+        ]
+
+    def tearDown(self):
+        TempDirectory.cleanup_all()
+
+    def test_round_trip_case(self):
+        for compression in (u'zlib', None):
+            # row groupを複数に分けて書き出しても、同じ値が読み込める。
+            self.__write(self.rows, row_group_size=2, compression=compression)
+
+            reader = ColumnarReader(self.file_path)
+            self.assertEqual(reader.get_columns(), self.columns)
+            self.assertEqual(reader.get_num_rows(), 3)
+            self.assertEqual(reader.read_columns(), {
+                u'id': [1, 2, None],
+                u'score': [0.5, None, 3.0],
+                u'active': [True, False, None],
+                u'name': [u'ユーザ1', u'', u'a,"b"\nc'],
+                u'created_at': [u'2017-01-01T00:00:00', None, None],
+            })
+            self.assertEqual(list(reader.iter_rows())[2], {
+                u'id': None, u'score': 3.0, u'active': None,
+                u'name': u'a,"b"\nc', u'created_at': None})
+
+    def test_type_mismatch_case(self):
+        # カラムの型と合わない値を含む場合も、値を失わずに読み込める。
+        rows = [
+            {u'id': 1.5, u'score': u'high', u'active': 1,
+             u'name': 10, u'created_at': [1, 2]},
+            {u'id': 2 ** 70, u'score': True, u'active': None,
+             u'name': None, u'created_at': {u'a': 1}},
+        ]
+        self.__write(rows)
+
+        columns = ColumnarReader(self.file_path).read_columns()
+        self.assertEqual(columns[u'id'], [1.5, 2 ** 70])
+        self.assertEqual(columns[u'score'], [u'high', True])
+        self.assertEqual(columns[u'active'], [1, None])
+        self.assertEqual(columns[u'name'], [10, None])
+        self.assertEqual(columns[u'created_at'], [[1, 2], {u'a': 1}])
+
+    def test_empty_case(self):
+        self.__write([])
+
+        reader = ColumnarReader(self.file_path)
+        self.assertEqual(reader.get_num_rows(), 0)
+        self.assertEqual(
+            reader.read_columns(),
+            {column[u'name']: [] for column in self.columns})
+
+    def test_invalid_file_case(self):
+        self.temp_dir.write(u'result.columnar', b'id,name\n1,a\n')
+        with self.assertRaises(ValueError):
+            ColumnarReader(self.file_path)
+
+        with self.assertRaises(ValueError):
+            ColumnarWriter(None, self.columns, compression=u'lz4')
+
+    def __write(self, rows, **kwargs):
+        with open(self.file_path, u'wb') as file:
+            writer = ColumnarWriter(file, self.columns, **kwargs)
+            writer.write_rows(rows)
+            writer.close()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+u"""compressionモジュールに対するテストをまとめたモジュール。"""
+
+import gzip
+from io import BytesIO
+from unittest import TestCase, skipUnless
+from unittest.mock import Mock, patch
+
+from lib.redash_util.compression import \
+    BackgroundWriter, check_compression, open_output, split_compression, \
+    zstandard
+
+from testfixtures import TempDirectory
+
+
+class CompressionTest(TestCase):
+    u"""compressionモジュールの関数・クラスに対するテストをまとめたクラス。"""
+
+    def tearDown(self):
+        TempDirectory.cleanup_all()
+
+    def test_split_compression_case(self):
+        self.assertEqual(split_compression(u'csv.gz'), (u'csv', u'gzip'))
+        self.assertEqual(split_compression(u'json.zst'), (u'json', u'zstd'))
+        self.assertEqual(split_compression(u'csv'), (u'csv', None))
+        self.assertEqual(split_compression(u'gz'), (u'gz', None))
+
+    def test_check_compression_case(self):
+        check_compression(None)
+        check_compression(u'gzip')
+        with self.assertRaises(ValueError):
+            check_compression(u'lz4')
+
+        # zstandardパッケージが無い環境では、zstdは使えない。
+        with patch(u'lib.redash_util.compression.zstandard', None):
+            with self.assertRaises(ValueError):
+                check_compression(u'zstd')
+
+        # 最小バージョンより古いzstandardパッケージでも、zstdは使えない。
+        old_zstandard = Mock(__version__=u'0.10.2')
+        with patch(u'lib.redash_util.compression.zstandard', old_zstandard):
+            with self.assertRaises(ValueError):
+                check_compression(u'zstd')
+
+    def test_open_output_gzip_case(self):
+        temp_dir = TempDirectory()
+        file_path = temp_dir.path + u'/result.csv.gz'
+        data = b'id,name\r\n' + b''.join(
+            u'{},"name{}"\r\n'.format(i, i).encode(u'utf-8')
+            for i in range(10000))
+
+        # 別スレッドで書き出す場合も、同じ内容のgzipファイルになる。
+        for background in (False, True):
+            with open_output(file_path, u'gzip', 1, background) as file:
+                for i in range(0, len(data), 100):
+                    file.write(data[i:i + 100])
+            with gzip.open(file_path, u'rb') as file:
+                self.assertEqual(file.read(), data)
+
+        temp_dir.cleanup()
+
+    @skipUnless(zstandard, u'zstandard is not installed.')
+    def test_open_output_zstd_case(self):
+        temp_dir = TempDirectory()
+        file_path = temp_dir.path + u'/result.csv.zst'
+        data = b'id,name\r\n' + b''.join(
+            u'{},"name{}"\r\n'.format(i, i).encode(u'utf-8')
+            for i in range(10000))
+
+        # 書き出したzstdファイルを展開すると、書き込んだ内容に戻る。
+        for background in (False, True):
+            with open_output(file_path, u'zstd', 3, background) as file:
+                for i in range(0, len(data), 100):
+                    file.write(data[i:i + 100])
+            with open(file_path, u'rb') as file:
+                decompressor = zstandard.ZstdDecompressor().decompressobj()
+                self.assertEqual(decompressor.decompress(file.read()), data)
+
+        temp_dir.cleanup()
+
+    def test_background_writer_error_case(self):
+        stream = BytesIO()
+        stream.write = lambda data: 1 / 0
+
+        # 別スレッドで発生した例外は、closeメソッドの呼び出し時に送出される。
+        writer = BackgroundWriter(stream)
+        writer.write(b'data')
+        with self.assertRaises(ZeroDivisionError):
+            writer.close()
+        self.assertTrue(stream.closed)
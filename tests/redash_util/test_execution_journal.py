@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+u"""execution_journalモジュールに対するテストをまとめたモジュール。"""
+
+from unittest import TestCase
+
+from lib.redash_util import ExecutionJournal, Job, JobStatus
+
+from testfixtures import TempDirectory
+
+
+class ExecutionJournalTest(TestCase):
+    u"""ExecutionJournalクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.temp_dir = TempDirectory()
+        self.file_path = self.temp_dir.getpath(u'journal')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_resume_normal_case(self):
+        journal = ExecutionJournal(self.file_path)
+        output_path = self.temp_dir.write(u'query1.csv', b'a\n1\n')
+        journal.record_written(1, {u'date': u'2017-01-01'}, output_path)
+        for query_id in [2, 3]:
+            job = Job(job_id=u'job-' + str(query_id), query_id=query_id)
+            job.status = JobStatus.pending
+            journal.record_submitted(job)
+        job.status = JobStatus.failure
+        journal.record_finished(job)
+        journal.close()
+
+        # 再開時は、前回の記録を読み込む。
+        journal = ExecutionJournal(self.file_path, resume=True)
+        self.assertTrue(journal.is_written(1, {u'date': u'2017-01-01'}))
+        self.assertFalse(journal.is_written(1, {u'date': u'2017-01-02'}))
+
+        # 終了が記録されていないジョブだけ、idが返る。
+        self.assertEqual(journal.get_running_job_id(2, {}), u'job-2')
+        self.assertIsNone(journal.get_running_job_id(3, {}))
+        journal.close()
+
+        # 再開しない場合は、前回の記録を破棄する。
+        journal = ExecutionJournal(self.file_path)
+        self.assertFalse(journal.is_written(1, {u'date': u'2017-01-01'}))
+        journal.close()
+
+    def test_resume_broken_line_case(self):
+        journal = ExecutionJournal(self.file_path)
+        output_path = self.temp_dir.write(u'query1.csv', b'a\n1\n')
+        journal.record_written(1, {}, output_path)
+        journal.close()
+
+        # 書き込み途中で中断した行は、読み飛ばす。
+        with open(self.file_path, u'a') as file:
+            file.write(u'{"key": "[2, {}]", "job_')
+        journal = ExecutionJournal(self.file_path, resume=True)
+        self.assertTrue(journal.is_written(1, {}))
+        self.assertIsNone(journal.get_running_job_id(2, {}))
+
+        # 中断した行の後ろに追記した記録も、次の再開時に読み込める。
+        job = Job(job_id=u'job-3', query_id=3)
+        job.status = JobStatus.pending
+        journal.record_submitted(job)
+        journal.close()
+        journal = ExecutionJournal(self.file_path, resume=True)
+        self.assertTrue(journal.is_written(1, {}))
+        self.assertEqual(journal.get_running_job_id(3, {}), u'job-3')
+        journal.close()
+
+    def test_written_file_removed_case(self):
+        journal = ExecutionJournal(self.file_path)
+        journal.record_written(1, {}, self.temp_dir.getpath(u'missing.csv'))
+
+        # 書き出したファイルが消えている場合は、書き出し済みとみなさない。
+        self.assertFalse(journal.is_written(1, {}))
+        journal.close()
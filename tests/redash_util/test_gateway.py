@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+u"""gatewayモジュールに対するテストをまとめたモジュール。"""
+
+from unittest import TestCase
+from unittest.mock import patch
+
+from lib.redash_util import ConnectionInfo, RetryPolicy, TokenBucket
+from lib.redash_util.async_gateway import get_async_gateway
+from lib.redash_util.gateway import \
+    Gateway, close_all_sessions, get_gateway, get_rate_limiter, get_session
+from lib.test_util import ResponseMock
+
+from requests import ConnectionError
+
+
+class GatewayTest(TestCase):
+    u"""Gatewayクラスと、Session共有処理に対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.con = ConnectionInfo(
+            end_point=u'https://dummy.endpoint',
+            api_key=u'dummy api key',
+            pool_size=4
+        )
+
+    def tearDown(self):
+        close_all_sessions()
+
+    def test_get_session_shared_case(self):
+        # 同じ接続情報なら、同じSessionが返る。
+        self.assertIs(get_session(self.con), get_session(self.con))
+
+        # 異なる接続情報なら、別のSessionが返る。
+        other_con = ConnectionInfo(u'https://dummy.endpoint', u'other key')
+        self.assertIsNot(get_session(self.con), get_session(other_con))
+
+    def test_get_async_gateway_shared_case(self):
+        # 同じ接続情報なら、同じAsyncGateway(と、内部で同じ共有のGateway)が返る。
+        async_gateway = get_async_gateway(self.con)
+        self.assertIs(async_gateway, get_async_gateway(self.con))
+        self.assertIs(
+            async_gateway._AsyncGateway__gateway, get_gateway(self.con))
+
+        # 異なる接続情報や、接続情報がNoneの場合は、別のAsyncGatewayが返る。
+        other_con = ConnectionInfo(u'https://dummy.endpoint', u'other key')
+        self.assertIsNot(async_gateway, get_async_gateway(other_con))
+        self.assertIsNot(get_async_gateway(None), get_async_gateway(None))
+
+    def test_get_session_pool_size_case(self):
+        # 接続情報で指定したプールサイズが、アダプタに反映される。
+        adapter = get_session(self.con).get_adapter(u'https://dummy.endpoint')
+        self.assertEqual(adapter._pool_maxsize, 4)
+
+    @patch(u'requests.Session.request')
+    def test_request_via_shared_session_case(self, mock_method):
+        mock_method.return_value = ResponseMock({}, 200)
+
+        # 別々のGatewayインスタンスから呼んでも、共有のSessionを経由してリクエストが行われる。
+        Gateway(self.con).get_query(1)
+        Gateway(self.con).update_job_status(u'job-id')
+
+        mock_method.assert_any_call(
+            u'GET',
+            u'https://dummy.endpoint/api/queries/1',
+            headers={u'Authorization': u'Key dummy api key'})
+        mock_method.assert_any_call(
+            u'GET',
+            u'https://dummy.endpoint/api/jobs/job-id',
+            headers={u'Authorization': u'Key dummy api key'})
+
+    @patch(u'lib.redash_util.gateway.sleep')
+    @patch(u'requests.Session.request')
+    def test_request_retry_case(self, mock_method, mock_sleep):
+        mock_method.side_effect = [
+            ResponseMock({}, 503),
+            ResponseMock({}, 429, headers={u'Retry-After': u'7'}),
+            ResponseMock({u'id': 1}, 200),
+        ]
+
+        # 一時的なエラーの間は再試行し、成功したレスポンスを返す。
+        response = Gateway(self.con).get_query(1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_method.call_count, 3)
+
+        # Retry-Afterヘッダがある場合は、その秒数だけ待つ。
+        self.assertEqual(mock_sleep.call_args_list[1][0][0], 7.0)
+
+    @patch(u'lib.redash_util.gateway.sleep')
+    @patch(
+        u'requests.Session.request',
+        return_value=ResponseMock({}, 503)
+    )
+    def test_request_max_attempts_case(self, mock_method, mock_sleep):
+        con = ConnectionInfo(
+            u'https://dummy.endpoint', u'dummy api key',
+            retry_policy=RetryPolicy(max_attempts=3))
+
+        # 試行回数の上限に達すると、再試行をやめる。
+        response = Gateway(con).get_query(1)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(mock_method.call_count, 3)
+
+    @patch(u'lib.redash_util.gateway.sleep')
+    @patch(u'requests.Session.request')
+    def test_request_non_idempotent_case(self, mock_method, mock_sleep):
+        # 冪等でないPOSTは、サーバが処理した可能性がある502では再試行しない。
+        mock_method.return_value = ResponseMock({}, 502)
+        Gateway(self.con).execute_query(1)
+        self.assertEqual(mock_method.call_count, 1)
+
+        # 通信エラーの場合も、接続の確立に失敗した場合以外は再試行しない。
+        mock_method.reset_mock()
+        mock_method.side_effect = ConnectionError()
+        with self.assertRaises(ConnectionError):
+            Gateway(self.con).execute_query(1)
+        self.assertEqual(mock_method.call_count, 1)
+
+        # 冪等なGETは、通信エラーでも再試行する。
+        mock_method.reset_mock()
+        mock_method.side_effect = [ConnectionError(), ResponseMock({}, 200)]
+        Gateway(self.con).get_query(1)
+        self.assertEqual(mock_method.call_count, 2)
+
+    def test_get_rate_limiter_case(self):
+        # rate_limitを指定しない場合は、頻度を制限しない。
+        self.assertIsNone(get_rate_limiter(self.con))
+
+        # 同じ接続情報なら、同じTokenBucketを共有する。
+        con = ConnectionInfo(
+            u'https://dummy.endpoint', u'dummy api key', rate_limit=5)
+        self.assertIsInstance(get_rate_limiter(con), TokenBucket)
+        self.assertIs(get_rate_limiter(con), get_rate_limiter(con))
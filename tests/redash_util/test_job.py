@@ -1,17 +1,20 @@
 # -*- coding: utf-8 -*-
 u"""queryモジュールに対するテストをまとめたモジュール。"""
 
+from os import listdir
 from unittest import TestCase
 from unittest.mock import patch
 
 from lib.redash_util import \
     Job, JobManager, JobStatus, \
-    NullQueryResult, QueryResult
+    NullQueryResult, PollingPolicy, Query, QueryResult, StreamingQueryResult
 
 from lib.test_util import ResponseMock
 
 from requests import RequestException
 
+from testfixtures import TempDirectory
+
 
 class JobTest(TestCase):
     u"""Jobクラスに対するテストをまとめたクラス。"""
@@ -124,6 +127,90 @@ class JobTest(TestCase):
         self.assertEqual(
             getattr(query_result, u'query'), u'SELECT 1 AS number;')
 
+    @patch(
+        u'lib.redash_util.gateway.Gateway.download_query_result',
+        return_value=ResponseMock(
+            None, 200, content=b'number' + b'\r\n' + b'1' + b'\r\n')
+    )
+    @patch.object(Job, u'DOWNLOAD_CHUNK_SIZE', 4)
+    def test_download_result_success_case(self, mock_method):
+        job = Job(job_id=u'7c4b0355-4152-4909-90c9-747712ba256e', query_id=1)
+        setattr(job, u'status', JobStatus.success)
+        setattr(job, u'query_result_id', 1)
+
+        # statusがsuccessのjobに対しdownload_resultをコールすると、
+        # レスポンスボディがそのままファイルに書き出される。
+        temp_dir = TempDirectory()
+        file_path = temp_dir.path + u'/result.csv'
+        self.assertTrue(job.download_result(file_path))
+        mock_method.assert_called_once_with(1, u'csv')
+        self.assertEqual(
+            temp_dir.read(file_path), b'number' + b'\r\n' + b'1' + b'\r\n')
+
+        temp_dir.cleanup()
+
+    @patch(u'lib.redash_util.gateway.Gateway.download_query_result')
+    def test_download_result_error_case(self, mock_method):
+        response = ResponseMock(None, 200, content=b'number\r\n1\r\n')
+
+        def iter_content(chunk_size):
+            yield b'num'
+            raise ConnectionError(u'connection reset')
+
+        response.iter_content = iter_content
+        mock_method.return_value = response
+        job = Job(job_id=u'7c4b0355-4152-4909-90c9-747712ba256e', query_id=1)
+        setattr(job, u'status', JobStatus.success)
+
+        # 書き出しの途中で失敗した場合は、レスポンスを閉じ、ファイルを残さない。
+        temp_dir = TempDirectory()
+        with patch.object(response, u'close') as mock_close:
+            with self.assertRaises(ConnectionError):
+                job.download_result(temp_dir.path + u'/result.csv')
+        mock_close.assert_called_once_with()
+        self.assertEqual(listdir(temp_dir.path), [])
+
+        temp_dir.cleanup()
+
+    @patch(u'lib.redash_util.gateway.Gateway.download_query_result')
+    def test_download_result_failure_case(self, mock_method):
+        job = Job(job_id=u'7c4b0355-4152-4909-90c9-747712ba256e', query_id=1)
+        setattr(job, u'status', JobStatus.running)
+
+        # statusがsuccess以外のjobでは、何も書き出さずFalseが返る。
+        self.assertFalse(job.download_result(u'/tmp/result.csv'))
+        mock_method.assert_not_called()
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.stream_query_result',
+        return_value=ResponseMock(None, 200, content=(
+            b'{"query_result": {"data": {"columns": [{"name": "number"}],'
+            b' "rows": [{"number": 1}, {"number": 2}]}, "id": 1}}'))
+    )
+    def test_stream_result_success_case(self, mock_method):
+        job = Job(job_id=u'7c4b0355-4152-4909-90c9-747712ba256e', query_id=1)
+        setattr(job, u'status', JobStatus.success)
+        setattr(job, u'query_result_id', 1)
+
+        # statusがsuccessのjobに対しstream_resultをコールすると、
+        # レスポンスを読み込んでいないStreamingQueryResultオブジェクトが返る。
+        query_result = job.stream_result(1)
+        self.assertIsInstance(query_result, StreamingQueryResult)
+        self.assertEqual(query_result.get_query_id(), 1)
+        mock_method.assert_called_once_with(1)
+
+        # 読み込んだ行は、batch_size行ずつの表として返る。
+        tables = list(query_result.iter_tables())
+        self.assertEqual([table.to_rows() for table in tables], [
+            [{u'number': 1}],
+            [{u'number': 2}],
+        ])
+        self.assertEqual(getattr(query_result, u'id'), 1)
+
+        # statusがsuccess以外のjobでは、ヌルオブジェクトが返る。
+        setattr(job, u'status', JobStatus.running)
+        self.assertIsInstance(job.stream_result(), NullQueryResult)
+
     def test_get_result_failure_case(self):
         job = Job(job_id=u'7c4b0355-4152-4909-90c9-747712ba256e', query_id=1)
         setattr(job, u'status', JobStatus.running)
@@ -158,6 +245,53 @@ class JobTest(TestCase):
         job.update()
         self.assertEqual(getattr(job, u'status'), JobStatus.failure)
 
+    @patch(u'lib.redash_util.gateway.Gateway.kill_job')
+    def test_time_out_normal_case(self, mock_method):
+        job = Job(job_id=u'7c4b0355-4152-4909-90c9-747712ba256e', query_id=1)
+        setattr(job, u'status', JobStatus.running)
+        job.time_out()
+
+        # サーバ上のジョブをkillし、failureとは区別したtimeoutの状態になる。
+        mock_method.assert_called_once_with(
+            u'7c4b0355-4152-4909-90c9-747712ba256e')
+        self.assertEqual(job.get_status(), JobStatus.timeout)
+        self.assertTrue(job.is_finished())
+
+        # バックエンドでクエリが実行され続けている可能性があることを、errorに記載する。
+        self.assertIn(u'TreasureData', job.error)
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.kill_job',
+        side_effect=RequestException()
+    )
+    def test_time_out_kill_failure_case(self, mock_method):
+        job = Job(job_id=u'7c4b0355-4152-4909-90c9-747712ba256e', query_id=1)
+        setattr(job, u'status', JobStatus.running)
+
+        # killに失敗しても例外は送出せず、timeoutの状態になる。
+        job.time_out()
+        self.assertEqual(job.get_status(), JobStatus.timeout)
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query',
+        return_value=ResponseMock({
+            u'job': {u'id': u'retried', u'status': JobStatus.pending}
+        }, 200)
+    )
+    def test_resubmit_normal_case(self, mock_method):
+        job = Job(job_id=u'first', query_id=1, query=Query(1))
+        setattr(job, u'status', JobStatus.timeout)
+        self.assertTrue(job.can_resubmit())
+
+        # 同じインスタンスのまま、新しいジョブの状態になる。
+        job.resubmit()
+        mock_method.assert_called_once_with(1)
+        self.assertEqual(job.id, u'retried')
+        self.assertEqual(job.get_status(), JobStatus.pending)
+
+        # クエリを保持していないジョブは、再実行できない。
+        self.assertFalse(Job(job_id=u'first', query_id=1).can_resubmit())
+
 
 class JobManagerTest(TestCase):
     u"""JobManagerクラスに対するテストをまとめたクラス。"""
@@ -173,6 +307,36 @@ class JobManagerTest(TestCase):
         self.manager.add([job])
         self.assertEqual(self.manager.count(JobStatus.running), 1)
 
+    def test_add_duplicate_case(self):
+        # 追加済みのジョブを再度追加しても、二重に数えない。
+        job = self.__create_dummy_job(JobStatus.running)
+        self.manager.add([job])
+        self.manager.add([job])
+        self.assertEqual(self.manager.count(JobStatus.running), 1)
+
+        # 引数を省略して生成したインスタンス同士で、ジョブを共有しない。
+        self.assertEqual(JobManager().count(JobStatus.running), 0)
+
+    def test_status_index_case(self):
+        jobs = [
+            self.__create_dummy_job(JobStatus.pending),
+            self.__create_dummy_job(JobStatus.running),
+        ]
+        self.manager.add(jobs)
+        self.assertFalse(self.manager.finished())
+
+        # ジョブのステータスが変わると、ステータス毎の件数に反映される。
+        jobs[0].status = JobStatus.running
+        self.assertEqual(self.manager.count(JobStatus.pending), 0)
+        self.assertEqual(self.manager.count(JobStatus.running), 2)
+
+        jobs[1].status = JobStatus.failure
+        jobs[0].status = JobStatus.success
+        self.assertEqual(self.manager.count(JobStatus.running), 0)
+        self.assertEqual(self.manager.get_jobs(JobStatus.success), [jobs[0]])
+        self.assertEqual(self.manager.get_jobs(JobStatus.failure), [jobs[1]])
+        self.assertTrue(self.manager.finished())
+
     @patch(
         u'lib.redash_util.gateway.Gateway.update_job_status',
         return_value=ResponseMock({
@@ -193,6 +357,228 @@ class JobManagerTest(TestCase):
         self.manager.update()
         self.assertEqual(self.manager.count(JobStatus.success), 2)
 
+    @patch(
+        u'lib.redash_util.gateway.Gateway.update_job_status',
+        return_value=ResponseMock({
+            u'job': {u'status': JobStatus.success}
+        }, 200)
+    )
+    def test_update_async_case(self, mock_method):
+        self.manager.set_max_in_flight(2)
+
+        # runningのjobを3件、終了済みのjobを2件セットする。
+        self.manager.add([
+            self.__create_dummy_job(JobStatus.running),
+            self.__create_dummy_job(JobStatus.running),
+            self.__create_dummy_job(JobStatus.running),
+            self.__create_dummy_job(JobStatus.success),
+            self.__create_dummy_job(JobStatus.failure),
+        ])
+
+        # 非同期モードでも、各Jobのstatusが更新される。
+        self.manager.update(async=True)
+        self.assertEqual(self.manager.count(JobStatus.success), 4)
+        self.assertEqual(self.manager.count(JobStatus.failure), 1)
+
+        # 終了済みのjobは、状態取得の対象にならない。
+        self.assertEqual(mock_method.call_count, 3)
+
+    @patch(u'lib.redash_util.gateway.Gateway.update_job_status')
+    def test_wait_normal_case(self, mock_method):
+        # 1件目は3回目、2件目は1回目のポーリングで成功する。
+        mock_method.side_effect = [
+            ResponseMock({u'job': {u'status': JobStatus.running}}, 200),
+            ResponseMock({u'job': {u'status': JobStatus.success}}, 200),
+            ResponseMock({u'job': {u'status': JobStatus.running}}, 200),
+            ResponseMock({u'job': {u'status': JobStatus.success}}, 200),
+        ]
+        manager = JobManager(polling_policy=PollingPolicy(
+            initial_interval=0.001, max_interval=0.004))
+        manager.add([
+            self.__create_dummy_job(JobStatus.pending),
+            self.__create_dummy_job(JobStatus.pending),
+        ])
+
+        # 全てのジョブが終了すると、Trueが返る。
+        self.assertTrue(manager.wait(concurrent=False))
+        self.assertEqual(manager.count(JobStatus.success), 2)
+
+        # ポーリングした回数が記録される。
+        self.assertEqual(manager.get_poll_count(), 4)
+
+    @patch(u'lib.redash_util.gateway.Gateway.update_job_status')
+    def test_wait_poll_error_case(self, mock_method):
+        # 1件目は1回目のポーリングで状態を取得できず、2回目で成功する。
+        responses = {
+            u'job-1': [
+                RequestException(u'connection reset'),
+                ResponseMock({u'job': {u'status': JobStatus.success}}, 200),
+            ],
+            u'job-2': [
+                ResponseMock({u'job': {u'status': JobStatus.success}}, 200),
+            ],
+        }
+
+        def update_job_status(job_id):
+            response = responses[job_id].pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+        mock_method.side_effect = update_job_status
+        manager = JobManager(polling_policy=PollingPolicy(
+            initial_interval=0.001, max_interval=0.004))
+        jobs = [Job(job_id=u'job-1'), Job(job_id=u'job-2')]
+        for job in jobs:
+            job.status = JobStatus.pending
+        manager.add(jobs)
+
+        # 状態を取得できなかったジョブがあっても、他のジョブのポーリングは中断せず、
+        # そのジョブは間隔を空けて再度ポーリングされる。
+        self.assertTrue(manager.wait())
+        self.assertEqual(manager.count(JobStatus.success), 2)
+        self.assertEqual(manager.get_poll_count(), 3)
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.update_job_status',
+        return_value=ResponseMock({
+            u'job': {u'status': JobStatus.running}
+        }, 200)
+    )
+    def test_wait_deadline_exceeded_case(self, mock_method):
+        manager = JobManager(polling_policy=PollingPolicy(
+            initial_interval=0.001, max_interval=0.004))
+        manager.add([self.__create_dummy_job(JobStatus.running)])
+
+        # deadlineを過ぎてもジョブが終わらない場合、Falseが返る。
+        self.assertFalse(manager.wait(deadline=0.05))
+        self.assertEqual(manager.count(JobStatus.running), 1)
+
+        # 状態が変化しない間はポーリング間隔が延びるため、問い合わせ回数は抑えられる。
+        self.assertLess(manager.get_poll_count(), 50)
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.get_query_result',
+        return_value=ResponseMock({u'query_result': {u'id': 1}}, 200)
+    )
+    @patch(u'lib.redash_util.gateway.Gateway.update_job_status')
+    def test_iter_completed_normal_case(
+        self, mock_update_job_status, mock_get_query_result
+    ):
+        mock_update_job_status.side_effect = [
+            ResponseMock({u'job': {u'status': JobStatus.failure}}, 200),
+        ]
+        manager = JobManager(polling_policy=PollingPolicy(
+            initial_interval=0.001, max_interval=0.004))
+        manager.add([
+            self.__create_dummy_job(JobStatus.success),
+            self.__create_dummy_job(JobStatus.running),
+        ])
+
+        # 成功したジョブの結果だけが返り、失敗したジョブの結果は返らない。
+        query_results = list(manager.iter_completed(concurrent=False))
+        self.assertEqual(len(query_results), 1)
+        self.assertIsInstance(query_results[0], QueryResult)
+        self.assertTrue(manager.finished())
+
+    @patch(u'lib.redash_util.gateway.Gateway.kill_job')
+    @patch(
+        u'lib.redash_util.gateway.Gateway.update_job_status',
+        return_value=ResponseMock({
+            u'job': {u'status': JobStatus.running}
+        }, 200)
+    )
+    def test_iter_finished_jobs_job_timeout_case(
+        self, mock_update_job_status, mock_kill_job
+    ):
+        manager = JobManager(
+            polling_policy=PollingPolicy(
+                initial_interval=0.001, max_interval=0.004),
+            job_timeout=0.05)
+        manager.add([self.__create_dummy_job(JobStatus.running)])
+
+        # 時間切れのジョブはkillされ、timeoutの状態で返る。
+        jobs = list(manager.iter_finished_jobs(concurrent=False))
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].get_status(), JobStatus.timeout)
+        self.assertEqual(mock_kill_job.call_count, 1)
+        self.assertEqual(manager.get_jobs(JobStatus.timeout), jobs)
+        self.assertTrue(manager.finished())
+        self.assertFalse(manager.expired())
+
+    @patch(u'lib.redash_util.gateway.Gateway.kill_job')
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query',
+        return_value=ResponseMock({
+            u'job': {u'id': u'retried', u'status': JobStatus.pending}
+        }, 200)
+    )
+    @patch(u'lib.redash_util.gateway.Gateway.update_job_status')
+    def test_iter_finished_jobs_retry_case(
+        self, mock_update_job_status, mock_execute_query, mock_kill_job
+    ):
+        # 最初のジョブは終わらず、再実行したジョブは成功する。
+        def update_job_status(job_id):
+            if job_id == u'retried':
+                status = JobStatus.success
+            else:
+                status = JobStatus.running
+            return ResponseMock({u'job': {u'status': status}}, 200)
+        mock_update_job_status.side_effect = update_job_status
+
+        manager = JobManager(
+            polling_policy=PollingPolicy(
+                initial_interval=0.001, max_interval=0.004),
+            job_timeout=0.05, max_retries=1, retry_backoff=0.01)
+        job = Job(job_id=u'first', query_id=1, query=Query(1))
+        setattr(job, u'status', JobStatus.running)
+        manager.add([job])
+
+        # 時間切れのジョブは再実行され、再実行後に終了した時点で返る。
+        jobs = list(manager.iter_finished_jobs(concurrent=False))
+        self.assertEqual(jobs, [job])
+        self.assertEqual(job.get_status(), JobStatus.success)
+        self.assertEqual(mock_kill_job.call_count, 1)
+        self.assertEqual(mock_execute_query.call_count, 1)
+
+    @patch(u'lib.redash_util.gateway.Gateway.kill_job')
+    @patch(
+        u'lib.redash_util.gateway.Gateway.update_job_status',
+        return_value=ResponseMock({
+            u'job': {u'status': JobStatus.running}
+        }, 200)
+    )
+    def test_iter_finished_jobs_total_timeout_case(
+        self, mock_update_job_status, mock_kill_job
+    ):
+        manager = JobManager(
+            polling_policy=PollingPolicy(
+                initial_interval=0.001, max_interval=0.004),
+            total_timeout=0.05)
+        manager.add([
+            self.__create_dummy_job(JobStatus.running),
+            self.__create_dummy_job(JobStatus.pending),
+        ])
+
+        # 全体の上限を過ぎると、終わっていない全てのジョブがkillされる。
+        self.assertTrue(manager.wait(concurrent=False))
+        self.assertTrue(manager.expired())
+        self.assertEqual(manager.count(JobStatus.timeout), 2)
+        self.assertEqual(mock_kill_job.call_count, 2)
+
+    def test_polling_policy_normal_case(self):
+        policy = PollingPolicy(
+            initial_interval=1.0, max_interval=3.0, multiplier=2.0, jitter=0.5)
+
+        # 間隔は倍々に延び、上限で頭打ちになる。
+        self.assertEqual(policy.next_interval(1.0), 2.0)
+        self.assertEqual(policy.next_interval(2.0), 3.0)
+
+        # ゆらぎを加えた間隔は、interval * (1 - jitter)〜intervalの範囲に収まる。
+        for i in range(100):
+            interval = policy.add_jitter(2.0)
+            self.assertGreaterEqual(interval, 1.0)
+            self.assertLessEqual(interval, 2.0)
+
     def test_finished_return_true_case(self):
         # statusがsuccessとfailureのJobのみの場合、Trueが返る。
         self.manager.add([
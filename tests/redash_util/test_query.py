@@ -1,11 +1,12 @@
 # -*- coding: utf-8 -*-
 u"""queryモジュールに対するテストをまとめたモジュール。"""
 
+from asyncio import get_event_loop
 from json import dumps, loads
 from unittest import TestCase
 from unittest.mock import patch
 
-from lib.redash_util import ConnectionInfo, Job, Query, QueryList
+from lib.redash_util import ConnectionInfo, Job, JobStatus, Query, QueryList
 from lib.test_util import ResponseMock
 
 from requests import RequestException
@@ -59,6 +60,62 @@ class QueryTest(TestCase):
         # プログラム上では特に変化が起こらないため、例外が発生しなければOKとする。
         self.assertTrue(True)
 
+    @patch(u'lib.redash_util.gateway.Gateway.get_query_result')
+    @patch(u'lib.redash_util.gateway.Gateway.execute_query')
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query_text',
+        return_value=ResponseMock({
+            u'query_result': {
+                u'id': 10,
+                u'data': {u'columns': [], u'rows': []},
+            }
+        }, 200)
+    )
+    def test_execute_with_max_age_fresh_case(
+        self, mock_execute_query_text, mock_execute_query,
+        mock_get_query_result
+    ):
+        query = self.__create_query(1)
+        query.set_properties({
+            u'data_source_id': 2, u'query': u'SELECT * FROM t;'})
+
+        job = query.execute(max_age=300)
+
+        # 再実行APIではなく、max_age付きの実行APIが使われる。
+        mock_execute_query.assert_not_called()
+        mock_execute_query_text.assert_called_once_with(
+            u'SELECT * FROM t;', 2, 1, 300)
+
+        # サーバ上の実行結果が新しければ、成功した状態のJobが返り、
+        # 結果の取得でもサーバと疎通しない。
+        self.assertEqual(job.get_status(), JobStatus.success)
+        self.assertTrue(job.is_finished())
+        result = job.get_result()
+        mock_get_query_result.assert_not_called()
+        self.assertEqual(result.id, 10)
+        self.assertEqual(result.get_query_id(), 1)
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query_text',
+        return_value=ResponseMock({
+            u'job': {
+                u'id': '752f5afc-ce7e-4d6a-aded-7e33dc8efa28',
+                u'status': 1,
+            }
+        }, 200)
+    )
+    def test_execute_with_max_age_stale_case(self, mock_method):
+        query = self.__create_query(1)
+        query.set_properties({
+            u'data_source_id': 2, u'query': u'SELECT {{ a }};'})
+
+        job = query.execute_with({u'a': u'1'}, max_age=300)
+
+        # サーバ上の実行結果が古ければ、通常通りジョブが登録される。
+        mock_method.assert_called_once_with(u'SELECT 1;', 2, 1, 300)
+        self.assertEqual(job.id, '752f5afc-ce7e-4d6a-aded-7e33dc8efa28')
+        self.assertFalse(job.is_finished())
+
     @patch(
         u'lib.redash_util.gateway.Gateway.execute_query',
         return_value=ResponseMock({
@@ -83,6 +140,55 @@ class QueryTest(TestCase):
         # 例外が発生せず、Jobインスタンスが返ればOK。
         self.assertIsInstance(job, Job)
 
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query_text',
+        return_value=ResponseMock({
+            u'job': {
+                u'id': '752f5afc-ce7e-4d6a-aded-7e33dc8efa28',
+                u'status': 1,
+            }
+        }, 200)
+    )
+    def test_execute_with_normal_case(self, mock_method):
+        query = self.__create_query(1)
+        query.set_properties({
+            u'data_source_id': 2,
+            u'query': u'SELECT * FROM t WHERE d = {{ date }};'})
+
+        job = query.execute_with({u'date': u"'2017-01-01'"})
+
+        # 値をバインドしたSQLが、実行リクエストに含めて送られる。
+        mock_method.assert_called_once_with(
+            u"SELECT * FROM t WHERE d = '2017-01-01';", 2, 1, 0)
+        self.assertIsInstance(job, Job)
+
+        # このインスタンスのSQLは書き換わらない。
+        self.assertEqual(
+            query.query, u'SELECT * FROM t WHERE d = {{ date }};')
+        self.assertFalse(query.is_bound())
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query',
+        return_value=ResponseMock({
+            u'job': {
+                u'id': '752f5afc-ce7e-4d6a-aded-7e33dc8efa28',
+                u'status': 1,
+            }
+        }, 200)
+    )
+    @patch(u'lib.redash_util.gateway.Gateway.execute_query_text')
+    def test_execute_with_unused_parameter_case(
+            self, mock_execute_query_text, mock_execute_query):
+        query = self.__create_query(1)
+        query.set_properties({u'query': u'SELECT * FROM t;'})
+
+        job = query.execute_with({u'date': u"'2017-01-01'"})
+
+        # パラメータを使わないクエリは、通常の実行APIで実行される。
+        mock_execute_query_text.assert_not_called()
+        mock_execute_query.assert_called_once_with(1)
+        self.assertEqual(job.get_parameters(), {u'date': u"'2017-01-01'"})
+
     @patch(
         u'lib.redash_util.gateway.Gateway.fork_query',
         return_value=ResponseMock({
@@ -209,6 +315,45 @@ class QueryTest(TestCase):
         with self.assertRaises(OSError):
             query.deserialize(u'/not_found_file.json', u'json')
 
+    def test_set_properties_payload_case(self):
+        sample_data = self.__create_dict_for_file_io_test()
+        sample_data[u'user'] = {u'id': 1, u'name': u'user'}
+
+        # FIELDS以外のプロパティは属性にはせず、辞書にまとめて保持する。
+        query = Query()
+        query.set_properties(sample_data)
+        self.assertEqual(query.name, sample_data[u'name'])
+        self.assertEqual(query.get_payload(), sample_data)
+        with self.assertRaises(AttributeError):
+            getattr(query, u'user')
+
+    def test_serialize_round_trip_case(self):
+        sample_data = self.__create_dict_for_file_io_test()
+        sample_data[u'tags'] = [u'daily']
+        sample_data[u'latest_query_data_id'] = 10
+        temp_dir = TempDirectory()
+
+        query = Query()
+        query.set_properties(sample_data)
+        query.serialize(temp_dir.path + u'/query.json', u'json')
+
+        # FIELDS以外のプロパティも、シリアライズ・デシリアライズで失われない。
+        restored = Query()
+        restored.deserialize(temp_dir.path + u'/query.json', u'json')
+        self.assertEqual(restored.get_payload(), sample_data)
+        self.assertEqual(restored.get_payload()[u'tags'], [u'daily'])
+
+        temp_dir.cleanup()
+
+    def test_share_gateway_case(self):
+        # 同じ接続情報を持つクエリ・ジョブは、Gatewayを共有する。
+        query = self.__create_query(1)
+        other = self.__create_query(2)
+        self.assertIs(query._Query__gateway, other._Query__gateway)
+        self.assertIs(
+            Job(job_id=u'1', connection_info=self.con)._Job__gateway,
+            query._Query__gateway)
+
     def __create_query(self, query_id):
         return Query(query_id=query_id, connection_info=self.con)
 
@@ -330,7 +475,7 @@ class QueryListTest(TestCase):
     def test_execute_in_bulk_normal_case(self, mock_method):
         query_list = self.__create_list_with_queries()
         query_list.execute_in_bulk()
-        mock_method.assert_called_with()
+        mock_method.assert_called_with(0)
 
     @patch(u'lib.redash_util.query.Query.archive')
     def test_archive_in_bulk_normal_case(self, mock_method):
@@ -338,6 +483,78 @@ class QueryListTest(TestCase):
         query_list.archive_in_bulk()
         mock_method.assert_called_with()
 
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query',
+        return_value=ResponseMock({
+            u'job': {
+                u'id': '752f5afc-ce7e-4d6a-aded-7e33dc8efa28',
+                u'status': 1,
+            }
+        }, 200)
+    )
+    def test_async_execute_in_bulk_normal_case(self, mock_method):
+        query_list = self.__create_list_with_queries(count=3)
+        jobs = get_event_loop().run_until_complete(
+            query_list.async_execute_in_bulk(concurrency=2))
+
+        # 全てのクエリが実行され、クエリと同じ順序でJobのリストが返る。
+        self.assertEqual(mock_method.call_count, 3)
+        self.assertEqual([job.query_id for job in jobs], [1, 2, 3])
+        for job in jobs:
+            self.assertIsInstance(job, Job)
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query_text',
+        return_value=ResponseMock({
+            u'job': {
+                u'id': '752f5afc-ce7e-4d6a-aded-7e33dc8efa28',
+                u'status': 1,
+            }
+        }, 200)
+    )
+    def test_async_execute_sweep_normal_case(self, mock_method):
+        query_list = self.__create_list_with_queries()
+        for query in query_list.get_queries():
+            query.query = u'SELECT {{ key }};'
+        parameter_sets = [{u'key': u'a'}, {u'key': u'b'}, {u'key': u'c'}]
+        jobs = get_event_loop().run_until_complete(
+            query_list.async_execute_sweep(parameter_sets, concurrency=2))
+
+        # 全ての(クエリ, パラメータ)の組み合わせが実行される。
+        self.assertEqual(mock_method.call_count, 6)
+        self.assertEqual(
+            [(job.query_id, job.get_parameters()) for job in jobs],
+            [(1, {u'key': u'a'}), (2, {u'key': u'a'}),
+             (1, {u'key': u'b'}), (2, {u'key': u'b'}),
+             (1, {u'key': u'c'}), (2, {u'key': u'c'})])
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.fork_query',
+        return_value=ResponseMock({u'id': 10, u'name': u'forked'}, 200)
+    )
+    def test_async_fork_in_bulk_normal_case(self, mock_method):
+        query_list = self.__create_list_with_queries()
+        fork_queries = get_event_loop().run_until_complete(
+            query_list.async_fork_in_bulk())
+
+        mock_method.assert_any_call(1)
+        mock_method.assert_any_call(2)
+        self.assertEqual(len(fork_queries), 2)
+        for query in fork_queries:
+            self.assertIsInstance(query, Query)
+
+    @patch(
+        u'lib.redash_util.gateway.Gateway.archive_query',
+        return_value=ResponseMock(None, 200)
+    )
+    def test_async_archive_in_bulk_normal_case(self, mock_method):
+        query_list = self.__create_list_with_queries()
+        get_event_loop().run_until_complete(
+            query_list.async_archive_in_bulk())
+
+        mock_method.assert_any_call(1)
+        mock_method.assert_any_call(2)
+
     @patch(u'lib.redash_util.query.Query.bind_values')
     def test_bind_values_in_bulk_normal_case(self, mock_method):
         query_list = self.__create_list_with_queries()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+u"""query_catalogモジュールに対するテストをまとめたモジュール。"""
+
+from os import path
+from unittest import TestCase
+from unittest.mock import patch
+
+from lib.redash_util import ConnectionInfo, QueryCatalog, QueryList
+from lib.test_util import ResponseMock
+
+from testfixtures import TempDirectory
+
+
+def make_page(queries, count=None):
+    u"""一覧APIのレスポンスを模したResponseMockを返す。"""
+    return ResponseMock({
+        u'count': len(queries) if count is None else count,
+        u'page': 1,
+        u'page_size': QueryCatalog.PAGE_SIZE,
+        u'results': queries,
+    }, 200)
+
+
+class QueryCatalogTest(TestCase):
+    u"""QueryCatalogクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.con = ConnectionInfo(
+            end_point=u'https://dummy.endpoint',
+            api_key=u'dummy api key'
+        )
+        self.queries = [
+            {u'id': 2, u'name': u'DAU by platform', u'description': u'',
+             u'query': u'SELECT 3;', u'data_source_id': 1,
+             u'updated_at': u'2017-01-02T00:00:00'},
+            {u'id': 1, u'name': u'revenue', u'description': u'daily sales',
+             u'query': u'SELECT * FROM dau_100%;', u'data_source_id': 2,
+             u'updated_at': u'2017-01-01T00:00:00'},
+        ]
+
+    def tearDown(self):
+        TempDirectory.cleanup_all()
+
+    def test_search_normal_case(self):
+        catalog = QueryCatalog(u':memory:', self.con)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries)):
+            self.assertEqual(catalog.sync(), 2)
+
+        # 名前・説明・SQLのいずれかに、大文字・小文字を区別せず部分一致する。
+        self.assertEqual(
+            [q[u'id'] for q in catalog.search(u'dau')], [1, 2])
+        self.assertEqual(
+            [q[u'id'] for q in catalog.search(u'SALES')], [1])
+        # 3文字未満の文字列や、LIKEの特殊文字を含む文字列でも検索できる。
+        self.assertEqual(
+            [q[u'id'] for q in catalog.search(u'0%')], [1])
+        # 数字のみの場合は、idでも検索できる。
+        self.assertEqual(
+            [q[u'id'] for q in catalog.search(u'2')], [2])
+        # サーバから得たプロパティが、そのまま返る。
+        self.assertEqual(catalog.search(u'revenue'), [self.queries[1]])
+
+    def test_search_archived_and_draft_case(self):
+        self.queries[0][u'is_archived'] = True
+        self.queries[1][u'is_draft'] = True
+        self.queries.append(
+            {u'id': 3, u'name': u'DAU', u'description': u'',
+             u'query': u'SELECT 1;', u'data_source_id': 1,
+             u'is_archived': False, u'is_draft': False,
+             u'updated_at': u'2017-01-03T00:00:00'})
+        catalog = QueryCatalog(u':memory:', self.con)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries)):
+            catalog.sync()
+
+        # アーカイブ済みのクエリと下書きのクエリは、検索結果に含めない。
+        self.assertEqual(
+            [q[u'id'] for q in catalog.search(u'dau')], [3])
+        self.assertEqual(catalog.search(u'2'), [])
+
+    def test_sync_incremental_case(self):
+        old_query = {
+            u'id': 3, u'name': u'old', u'description': u'', u'query': u'',
+            u'data_source_id': 1, u'updated_at': u'2016-12-31T00:00:00'}
+        catalog = QueryCatalog(u':memory:', self.con)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries + [old_query])):
+            catalog.sync()
+        self.assertTrue(catalog.is_fresh())
+
+        # 前回の同期以降に更新されたクエリだけを取り込む。
+        updated = dict(self.queries[1])
+        updated.update({
+            u'name': u'revenue v2', u'updated_at': u'2017-01-03T00:00:00'})
+        page = make_page(
+            [updated, self.queries[0], old_query], count=1000)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=page) as mock_method:
+            self.assertEqual(catalog.sync(), 1)
+
+        # 更新日時の降順に並んでいれば、前回の同期時点より古いクエリに達した時点で、次のページは取得しない。
+        mock_method.assert_called_once_with(1, QueryCatalog.PAGE_SIZE)
+        self.assertEqual(catalog.search(u'v2'), [updated])
+
+    def test_sync_unordered_case(self):
+        catalog = QueryCatalog(u':memory:', self.con)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries)):
+            catalog.sync()
+
+        # orderを無視して作成日時の降順で返すサーバでは、古いクエリに達しても打ち切らない。
+        # 前回の同期時点と同じ更新日時でも、キャッシュに無いクエリは取り込む。
+        new_query = {
+            u'id': 3, u'name': u'new', u'description': u'', u'query': u'',
+            u'data_source_id': 1, u'updated_at': u'2017-01-02T00:00:00'}
+        updated = dict(self.queries[1])
+        updated.update({
+            u'name': u'revenue v2', u'updated_at': u'2017-01-03T00:00:00'})
+        pages = [
+            make_page([new_query, self.queries[0]], count=3),
+            make_page([updated], count=3),
+        ]
+        with patch.object(QueryCatalog, u'PAGE_SIZE', 2), \
+                patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                      side_effect=pages) as mock_method:
+            self.assertEqual(catalog.sync(), 2)
+
+        self.assertEqual(mock_method.call_count, 2)
+        self.assertEqual(catalog.search(u'v2'), [updated])
+        self.assertEqual(catalog.search(u'new'), [new_query])
+
+    def test_sync_full_case(self):
+        catalog = QueryCatalog(u':memory:', self.con)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries)):
+            catalog.sync()
+
+        # 全件同期では、一覧に無い(アーカイブされた)クエリがキャッシュから除かれる。
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries[:1])):
+            catalog.sync(full=True)
+        self.assertEqual([q[u'id'] for q in catalog.search(u'dau')], [2])
+
+    def test_remove_normal_case(self):
+        catalog = QueryCatalog(u':memory:', self.con)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries)):
+            catalog.sync()
+
+        catalog.remove([1])
+        self.assertEqual([q[u'id'] for q in catalog.search(u'dau')], [2])
+
+    def test_persistent_file_case(self):
+        temp_dir = TempDirectory()
+        file_path = path.join(temp_dir.path, u'cache', u'catalog.sqlite')
+
+        catalog = QueryCatalog(file_path, self.con, max_age=60)
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries)):
+            catalog.sync()
+        catalog.close()
+
+        # 別プロセスでファイルを開き直しても、キャッシュは新鮮なまま使える。
+        catalog = QueryCatalog(file_path, self.con, max_age=60)
+        self.assertTrue(catalog.is_fresh())
+        self.assertEqual(len(catalog.search(u'dau')), 2)
+        catalog.close()
+
+        # 別のサーバに接続する場合は、キャッシュを破棄する。
+        other_con = ConnectionInfo(
+            end_point=u'https://other.endpoint', api_key=u'dummy api key')
+        catalog = QueryCatalog(file_path, other_con, max_age=60)
+        self.assertFalse(catalog.is_fresh())
+        self.assertEqual(catalog.search(u'dau'), [])
+        catalog.close()
+
+    @patch(u'lib.redash_util.gateway.Gateway.search_queries')
+    def test_search_queries_by_with_catalog_case(self, mock_search_queries):
+        catalog = QueryCatalog(u':memory:', self.con)
+        query_list = QueryList(self.con, catalog)
+
+        # キャッシュが古い場合は同期してから、キャッシュを検索する。
+        with patch(u'lib.redash_util.gateway.Gateway.get_queries',
+                   return_value=make_page(self.queries)) as mock_get_queries:
+            queries = query_list.search_queries_by(u'revenue')
+            queries = query_list.search_queries_by(u'platform')
+
+        # 2回目の検索では、キャッシュが新鮮なため同期しない。
+        mock_get_queries.assert_called_once_with(1, QueryCatalog.PAGE_SIZE)
+        mock_search_queries.assert_not_called()
+        self.assertEqual(query_list.count(), 2)
+        self.assertEqual(queries[0].id, 2)
+        self.assertEqual(queries[0].data_source_id, 1)
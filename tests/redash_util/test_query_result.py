@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 u"""queryモジュールに対するテストをまとめたモジュール。"""
 
+import gzip
+from json import dumps, loads
 from os import linesep
 
 from unittest import TestCase
+from unittest.mock import patch
 
-from lib.redash_util import QueryResult
+from lib.redash_util import \
+    ColumnarReader, QueryResult, StreamingQueryResult
+
+from lib.test_util import ResponseMock
 
 from testfixtures import TempDirectory
 
+from yaml import safe_load_all
+
 
 class QueryResultTest(TestCase):
     u"""QueryResultクラスに対するテストをまとめたクラス。"""
@@ -60,3 +68,200 @@ class QueryResultTest(TestCase):
         self.assertEqual(file_raw_data, expected_data)
 
         temp_dir.cleanup()
+
+    def test_serialize_to_csv_escape_case(self):
+        # カンマ・ダブルクォート・改行を含む値や、欠損値を持つQueryResultインスタンスを作る。
+        query_result = QueryResult({
+            u'id': 1,
+            u'data': {
+                u'columns': [
+                    {u'name': u'col,1', u'type': u'string'},
+                    {u'name': u'col2', u'type': u'float'},
+                    {u'name': u'col3', u'type': u'string'},
+                ],
+                u'rows': [
+                    {
+                        u'col,1': u'a,"b"' + u'\n' + u'c',
+                        u'col2': 1.5,
+                        u'col3': None,
+                    },
+                    {
+                        u'col,1': u'',
+                        u'col2': 2,
+                    },
+                ],
+            }})
+
+        temp_dir = TempDirectory()
+        query_result.serialize(temp_dir.path + u'/sample_data.csv', u'csv')
+
+        # カンマなどを含むカラム名・値はダブルクォートで囲まれ、値の中のダブルクォートは二重になる。
+        # また、nullや欠損値は空文字列として出力される。
+        expected_data = u'"col,1",col2,col3' + linesep \
+                        + u'"a,""b""' + u'\n' + u'c",1.5,""' + linesep \
+                        + u'"",2,""' + linesep
+        with open(temp_dir.path + u'/sample_data.csv', newline=u'') as file:
+            self.assertEqual(file.read(), expected_data)
+
+        temp_dir.cleanup()
+
+    def test_serialize_to_json_lines_case(self):
+        query_result = self.__create_query_result_for_format_test()
+
+        temp_dir = TempDirectory()
+        query_result.serialize(temp_dir.path + u'/sample_data.json', u'json')
+
+        # 1行に1レコードのJSONオブジェクトが、カラムの順にキーを並べて書き出される。
+        # 欠損値はnullとなる。
+        with open(temp_dir.path + u'/sample_data.json', encoding=u'utf-8',
+                  newline=u'') as file:
+            lines = file.read().split(u'\n')
+        self.assertEqual(lines, [
+            u'{"col2": "値1", "col1": 1.5}',
+            u'{"col2": "a\\nb", "col1": null}',
+            u'',
+        ])
+        self.assertEqual(loads(lines[1]), {u'col2': u'a\nb', u'col1': None})
+
+        temp_dir.cleanup()
+
+    def test_serialize_to_yaml_case(self):
+        query_result = self.__create_query_result_for_format_test()
+
+        temp_dir = TempDirectory()
+        for file_format in (u'yml', u'yaml'):
+            file_path = temp_dir.path + u'/sample_data.' + file_format
+            query_result.serialize(file_path, file_format)
+
+            # 1レコードが1ドキュメントとして、カラムの順にキーを並べて書き出される。
+            with open(file_path, encoding=u'utf-8') as file:
+                documents = list(safe_load_all(file))
+            self.assertEqual(documents, [
+                {u'col2': u'値1', u'col1': 1.5},
+                {u'col2': u'a\nb', u'col1': None},
+            ])
+            self.assertEqual(list(documents[0]), [u'col2', u'col1'])
+
+        temp_dir.cleanup()
+
+    def test_serialize_to_columnar_case(self):
+        query_result = self.__create_query_result_for_format_test()
+
+        temp_dir = TempDirectory()
+        file_path = temp_dir.path + u'/sample_data.columnar'
+        query_result.serialize(file_path, u'columnar')
+
+        # カラムの型に応じた列として書き出され、ColumnarReaderで読み込める。
+        reader = ColumnarReader(file_path)
+        self.assertEqual(
+            [column[u'name'] for column in reader.get_columns()],
+            [u'col2', u'col1'])
+        self.assertEqual(reader.read_columns(), {
+            u'col2': [u'値1', u'a\nb'],
+            u'col1': [1.5, None],
+        })
+
+        temp_dir.cleanup()
+
+    def test_serialize_compressed_case(self):
+        query_result = self.__create_query_result_for_format_test()
+
+        temp_dir = TempDirectory()
+        file_path = temp_dir.path + u'/sample_data.json.gz'
+        for background in (False, True):
+            query_result.serialize(
+                file_path, u'json.gz', compression_level=9,
+                background=background)
+
+            # 圧縮形式の拡張子を付けると、gzipで圧縮して書き出される。
+            with gzip.open(file_path, u'rt', encoding=u'utf-8') as file:
+                self.assertEqual(file.read(), (
+                    u'{"col2": "値1", "col1": 1.5}\n'
+                    u'{"col2": "a\\nb", "col1": null}\n'))
+
+        temp_dir.cleanup()
+
+    def test_data_property_case(self):
+        properties = {
+            u'id': 1,
+            u'data': {
+                u'columns': [{u'name': u'col1', u'type': u'integer'}],
+                u'rows': [{u'col1': 1}, {u'col1': 2}],
+                u'metadata': {u'data_scanned': 100},
+            }}
+        query_result = QueryResult(properties)
+
+        # 実行結果の表は、カラム毎の配列として保持される。
+        table = query_result.get_table()
+        self.assertEqual(list(table.get_column(u'col1')), [1, 2])
+
+        # dataプロパティやget_propertiesメソッドは、元の形式で返す。
+        self.assertEqual(query_result.data, properties[u'data'])
+        self.assertEqual(query_result.get_properties(), properties)
+
+        # columnsとrowsが無い場合は、そのまま保持する。
+        query_result = QueryResult({u'id': 1, u'data': {u'rows': []}})
+        self.assertIsNone(query_result.get_table())
+        self.assertEqual(query_result.data, {u'rows': []})
+
+    @patch.object(StreamingQueryResult, u'CHUNK_SIZE', 7)
+    def test_serialize_streaming_case(self):
+        query_result = self.__create_query_result_for_format_test()
+        content = dumps({u'query_result': {
+            u'data': query_result.data, u'id': 1, u'runtime': 0.5,
+        }}, sort_keys=True).encode(u'utf-8')
+
+        temp_dir = TempDirectory()
+        query_result.serialize(temp_dir.path + u'/expected.csv', u'csv')
+
+        # レスポンスを読み込みながら1行ずつ書き出しても、同じcsvになる。
+        # rowsより後ろにある項目は、書き出し終えた時点で設定される。
+        streaming_result = StreamingQueryResult(
+            {u'query_name': u'sample'}, ResponseMock(None, 200, content), 1)
+        self.assertIsNone(getattr(streaming_result, u'runtime', None))
+        streaming_result.serialize(temp_dir.path + u'/actual.csv', u'csv')
+        self.assertEqual(
+            temp_dir.read(u'actual.csv'), temp_dir.read(u'expected.csv'))
+        self.assertEqual(getattr(streaming_result, u'runtime'), 0.5)
+        self.assertEqual(streaming_result.get_query_name(), u'sample')
+        self.assertIsNone(streaming_result.get_table())
+
+        # 行は一度しか読み込めない。
+        with self.assertRaises(ValueError):
+            streaming_result.serialize(temp_dir.path + u'/again.csv', u'csv')
+
+        temp_dir.cleanup()
+
+    def test_serialize_streaming_error_case(self):
+        # 書き出し先のファイルを開けない場合も、レスポンスは閉じる。
+        response = ResponseMock(None, 200, b'{"query_result": {}}')
+        with patch.object(response, u'close') as mock_close:
+            streaming_result = StreamingQueryResult({}, response)
+            with self.assertRaises(OSError):
+                streaming_result.serialize(
+                    u'/nonexistent_dir/result.csv', u'csv')
+        mock_close.assert_called_once_with()
+
+    def test_serialize_unsupported_format_case(self):
+        query_result = self.__create_query_result_for_format_test()
+        with self.assertRaises(ValueError):
+            query_result.serialize(u'/tmp/sample_data.xml', u'xml')
+
+    def __create_query_result_for_format_test(self):
+        u"""
+        JSON Lines・YAMLのテストに使う、ダミーのQueryResultインスタンスを生成して返す。
+
+        :return:
+        """
+        return QueryResult({
+            u'id': 1,
+            u'data': {
+                u'columns': [
+                    {u'name': u'col2', u'type': u'string'},
+                    {u'name': u'col1', u'type': u'float'},
+                ],
+                u'rows': [
+                    {u'col1': 1.5, u'col2': u'値1'},
+                    {u'col2': u'a\nb'},
+                ],
+            }})
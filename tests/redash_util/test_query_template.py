@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+u"""query_templateモジュールに対するテストをまとめたモジュール。"""
+
+from unittest import TestCase
+
+from lib.redash_util.query_template import QueryTemplate, get_query_template
+
+
+class QueryTemplateTest(TestCase):
+    u"""QueryTemplateクラスに対するテストをまとめたクラス。"""
+
+    def test_render_normal_case(self):
+        template = QueryTemplate(
+            u'SELECT {{column}} FROM {{ table }} WHERE {{  column  }} = 1;')
+
+        self.assertEqual(
+            template.get_parameter_names(), frozenset([u'column', u'table']))
+
+        # 全てのパラメータ部分が一度にバインドされる。
+        self.assertEqual(
+            template.render({u'column': u'a', u'table': u't'}),
+            u'SELECT a FROM t WHERE a = 1;')
+
+        # キーが含まれないパラメータ部分は、そのまま残る。
+        self.assertEqual(
+            template.render({u'column': u'a'}),
+            u'SELECT a FROM {{ table }} WHERE a = 1;')
+
+    def test_render_special_character_case(self):
+        template = QueryTemplate(u'SELECT * FROM t WHERE a = {{ a.b }};')
+
+        # キーや値に含まれる記号は、正規表現として解釈されない。
+        self.assertEqual(
+            template.render({u'a.b': u'"\\1$"'}),
+            u'SELECT * FROM t WHERE a = "\\1$";')
+        self.assertEqual(
+            template.render({u'a_b': u'1'}),
+            u'SELECT * FROM t WHERE a = {{ a.b }};')
+
+    def test_render_no_parameter_case(self):
+        template = QueryTemplate(u'SELECT 1;')
+
+        self.assertEqual(template.get_parameter_names(), frozenset())
+        self.assertEqual(template.render({u'key': u'value'}), u'SELECT 1;')
+
+    def test_get_query_template_normal_case(self):
+        # 同じSQL文字列に対しては、パース済みのオブジェクトが返る。
+        self.assertIs(
+            get_query_template(u'SELECT {{ a }};'),
+            get_query_template(u'SELECT {{ a }};'))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+u"""result_cacheモジュールに対するテストをまとめたモジュール。"""
+
+from os import path, utime
+from time import time
+from unittest import TestCase
+
+from lib.redash_util import Query, QueryResult, ResultCache
+
+from testfixtures import TempDirectory
+
+
+class ResultCacheTest(TestCase):
+    u"""ResultCacheクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.temp_dir = TempDirectory()
+        self.query = Query(1)
+        self.query.set_properties({
+            u'query': u'SELECT * FROM t WHERE d = {{ date }};',
+            u'query_hash': u'dummy hash',
+            u'data_source_id': 1,
+        })
+
+    def tearDown(self):
+        TempDirectory.cleanup_all()
+
+    def test_make_key_normal_case(self):
+        key = ResultCache.make_key(
+            self.query, {u'date': u'2017-01-01', u'table': u't'})
+
+        # パラメータの順序によらず、同じキーになる。
+        self.assertEqual(
+            key,
+            ResultCache.make_key(
+                self.query, {u'table': u't', u'date': u'2017-01-01'}))
+        # パラメータやSQLが変われば、異なるキーになる。
+        self.assertNotEqual(
+            key,
+            ResultCache.make_key(
+                self.query, {u'date': u'2017-01-02', u'table': u't'}))
+        self.query.query_hash = u'other hash'
+        self.assertNotEqual(
+            key,
+            ResultCache.make_key(
+                self.query, {u'date': u'2017-01-01', u'table': u't'}))
+
+    def test_get_and_put_normal_case(self):
+        cache = ResultCache(self.temp_dir.path, 60)
+        key = ResultCache.make_key(self.query)
+
+        self.assertIsNone(cache.get(key))
+
+        cache.put(key, QueryResult({u'id': 1, u'data': {u'rows': []}}))
+        result = cache.get(key)
+        self.assertEqual(result.id, 1)
+        self.assertEqual(result.data, {u'rows': []})
+
+    def test_get_expired_case(self):
+        cache = ResultCache(self.temp_dir.path, 60)
+        key = ResultCache.make_key(self.query)
+        cache.put(key, QueryResult({u'id': 1}))
+
+        # 書き込みからmax_age秒を過ぎたエントリは返らず、削除される。
+        file_path = path.join(self.temp_dir.path, key + u'.json')
+        old = time() - 61
+        utime(file_path, (old, old))
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(path.exists(file_path))
+
+    def test_evict_lru_case(self):
+        cache = ResultCache(self.temp_dir.path, 60)
+        keys = [u'key1', u'key2', u'key3']
+        for key in keys:
+            cache.put(key, QueryResult({u'data': u'x' * 100}))
+
+        # key1を最後に読み出したことにし、key2を最も古いアクセスにする。
+        now = time()
+        for key, accessed_at in zip(keys, [now, now - 20, now - 10]):
+            file_path = path.join(self.temp_dir.path, key + u'.json')
+            utime(file_path, (accessed_at, now))
+
+        # 合計サイズが2エントリ分に収まるよう、最後に使った日時が古いものから削除される。
+        entry_size = path.getsize(
+            path.join(self.temp_dir.path, u'key1.json'))
+        ResultCache(self.temp_dir.path, 60, entry_size * 2).evict()
+        self.assertIsNotNone(cache.get(u'key1'))
+        self.assertIsNone(cache.get(u'key2'))
+        self.assertIsNotNone(cache.get(u'key3'))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+u"""result_streamモジュールに対するテストをまとめたモジュール。"""
+
+from json import dumps
+from unittest import TestCase
+
+from lib.redash_util import QueryResultStream
+
+
+class QueryResultStreamTest(TestCase):
+    u"""QueryResultStreamクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.query_result = {
+            u'id': 1,
+            u'query': u'SELECT * FROM "テーブル";',
+            u'data': {
+                u'columns': [
+                    {u'name': u'id', u'type': u'integer'},
+                    {u'name': u'name', u'type': u'string'},
+                ],
+                u'rows': [
+                    {u'id': i, u'name': u'名前{}, "{}"'.format(i, i)}
+                    for i in range(5)
+                ] + [{u'id': 12345678901234567890, u'name': None}],
+            },
+            u'runtime': 1.25,
+        }
+
+    def test_iter_batches_case(self):
+        content = dumps(
+            {u'query_result': self.query_result},
+            ensure_ascii=False, indent=2).encode(u'utf-8')
+
+        # マルチバイト文字や数値の途中で区切ったチャンクでも、batch_size行ずつ同じ行が返る。
+        for chunk_size in (1, 3, 1000):
+            stream = QueryResultStream(self.__split(content, chunk_size), 4)
+            batches = list(stream.iter_batches())
+            self.assertEqual([len(batch) for batch in batches], [4, 2])
+            self.assertEqual(
+                batches[0] + batches[1], self.query_result[u'data'][u'rows'])
+
+            # 行以外の項目は、rowsを除いて返る。
+            properties = stream.get_properties()
+            self.assertEqual(properties[u'runtime'], 1.25)
+            self.assertEqual(properties[u'query'], self.query_result[u'query'])
+            self.assertEqual(properties[u'data'], {
+                u'columns': self.query_result[u'data'][u'columns']})
+
+        # 一度しかイテレートできない。
+        with self.assertRaises(ValueError):
+            list(stream.iter_batches())
+
+    def test_no_rows_case(self):
+        self.query_result[u'data'][u'rows'] = []
+        stream = QueryResultStream(
+            [dumps({u'query_result': self.query_result}).encode(u'utf-8')])
+        self.assertEqual(list(stream.iter_batches()), [])
+        self.assertEqual(stream.get_properties()[u'id'], 1)
+
+        # query_resultがオブジェクトでない場合も、そのまま読み込める。
+        stream = QueryResultStream(
+            [b'{"message": "error", "query_result": 1}'])
+        self.assertEqual(list(stream.iter_batches()), [])
+        self.assertEqual(stream.get_properties(), {})
+
+    def test_invalid_json_case(self):
+        for content in (
+            b'{"query_result": {"data": {"rows": [{"id": 1}, {"id": 2',
+            b'{"query_result": {"data": {"rows": [{"id": 1} {"id": 2}]}}}',
+            b'{"query_result": {}} {}',
+            b'[]',
+        ):
+            with self.assertRaises(ValueError):
+                stream = QueryResultStream(self.__split(content, 5))
+                list(stream.iter_batches())
+
+    def __split(self, content, chunk_size):
+        return [
+            content[i:i + chunk_size]
+            for i in range(0, len(content), chunk_size)]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+u"""retry_policyモジュールに対するテストをまとめたモジュール。"""
+
+from time import monotonic
+from unittest import TestCase
+
+from lib.redash_util import RetryPolicy, TokenBucket
+from lib.test_util import ResponseMock
+
+from requests import ConnectTimeout, ReadTimeout
+
+
+class RetryPolicyTest(TestCase):
+    u"""RetryPolicyクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        self.policy = RetryPolicy(
+            max_attempts=3, max_non_idempotent_attempts=2,
+            initial_backoff=1.0, max_backoff=3.0, jitter=0.0)
+
+    def test_should_retry_response_case(self):
+        # 冪等なメソッドは、5xxの一時的なエラーと429で再試行する。
+        for status_code in (429, 502, 503, 504):
+            self.assertTrue(self.policy.should_retry_response(
+                u'GET', ResponseMock({}, status_code), 1))
+        for status_code in (200, 400, 404, 500):
+            self.assertFalse(self.policy.should_retry_response(
+                u'GET', ResponseMock({}, status_code), 1))
+
+        # 冪等でないメソッドは、サーバが処理していないことが明らかな場合だけ再試行する。
+        self.assertTrue(self.policy.should_retry_response(
+            u'POST', ResponseMock({}, 429), 1))
+        self.assertFalse(self.policy.should_retry_response(
+            u'POST', ResponseMock({}, 502), 1))
+
+        # 試行回数の上限は、冪等かどうかで異なる。
+        self.assertTrue(self.policy.should_retry_response(
+            u'GET', ResponseMock({}, 503), 2))
+        self.assertFalse(self.policy.should_retry_response(
+            u'GET', ResponseMock({}, 503), 3))
+        self.assertFalse(self.policy.should_retry_response(
+            u'POST', ResponseMock({}, 503), 2))
+
+        # Retry-Afterで指示された時間が長すぎる場合は、再試行しない。
+        self.assertFalse(self.policy.should_retry_response(
+            u'GET', ResponseMock({}, 429, headers={u'Retry-After': u'3600'}),
+            1))
+
+    def test_should_retry_error_case(self):
+        self.assertTrue(
+            self.policy.should_retry_error(u'GET', ReadTimeout(), 1))
+        self.assertTrue(
+            self.policy.should_retry_error(u'POST', ConnectTimeout(), 1))
+        self.assertFalse(
+            self.policy.should_retry_error(u'POST', ReadTimeout(), 1))
+
+    def test_get_backoff_case(self):
+        # 間隔は倍々に延び、上限で頭打ちになる。
+        self.assertEqual(self.policy.get_backoff(1), 1.0)
+        self.assertEqual(self.policy.get_backoff(2), 2.0)
+        self.assertEqual(self.policy.get_backoff(3), 3.0)
+
+        # Retry-Afterヘッダがある場合は、その値を優先する。
+        response = ResponseMock({}, 429, headers={u'Retry-After': u'10'})
+        self.assertEqual(self.policy.get_backoff(1, response), 10.0)
+
+        # HTTP日付形式の場合、過去の日時なら待たない。
+        response = ResponseMock({}, 503, headers={
+            u'Retry-After': u'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEqual(self.policy.get_backoff(1, response), 0.0)
+
+
+class TokenBucketTest(TestCase):
+    u"""TokenBucketクラスに対するテストをまとめたクラス。"""
+
+    def test_acquire_case(self):
+        bucket = TokenBucket(rate=50.0, capacity=2)
+
+        # capacity件までは待たずに取り出せ、それ以降はトークンが溜まるまで待つ。
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertGreater(bucket.acquire(), 0.0)
+
+    def test_pause_case(self):
+        bucket = TokenBucket(rate=100.0)
+        bucket.pause(0.05)
+
+        # pauseした秒数の間は、トークンが溜まらない。
+        start = monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(monotonic() - start, 0.04)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+u"""runtime_historyモジュールに対するテストをまとめたモジュール。"""
+
+from os import path
+from unittest import TestCase
+
+from lib.redash_util import \
+    JobManager, Query, QueryResult, RuntimeHistory
+
+from testfixtures import TempDirectory
+
+
+class RuntimeHistoryTest(TestCase):
+    u"""RuntimeHistoryクラスに対するテストをまとめたクラス。"""
+
+    def tearDown(self):
+        TempDirectory.cleanup_all()
+
+    def test_record_normal_case(self):
+        history = RuntimeHistory()
+        self.assertIsNone(history.get_estimate(1))
+
+        # 見積もりは、過去の実行時間の指数移動平均になる。
+        history.record(1, 10.0)
+        self.assertEqual(history.get_estimate(1), 10.0)
+        history.record(1, 20.0)
+        self.assertEqual(history.get_estimate(1), 15.0)
+
+    def test_order_longest_first_normal_case(self):
+        history = RuntimeHistory()
+        history.record(1, 1.0)
+        history.record(2, 30.0)
+        history.record(3, 10.0)
+        pairs = [(Query(i), {}) for i in [1, 2, 3, 4]]
+
+        # 見積もりの長い順に並ぶ(未知のクエリは、既知の最長のクエリと同じ扱い)。
+        ordered = history.order_longest_first(pairs)
+        self.assertEqual([query.id for query, _ in ordered], [2, 4, 3, 1])
+
+    def test_save_and_load_case(self):
+        temp_dir = TempDirectory()
+        file_path = path.join(temp_dir.path, u'history', u'runtime.json')
+
+        history = RuntimeHistory(file_path)
+        history.record(1, 12.5)
+        history.save()
+
+        # 次回生成時に、保存した記録が読み込まれる。
+        self.assertEqual(RuntimeHistory(file_path).get_estimate(1), 12.5)
+
+    def test_record_runtime_by_job_manager_case(self):
+        history = RuntimeHistory()
+        manager = JobManager([], runtime_history=history)
+
+        manager.record_runtime(QueryResult({u'query_id': 3, u'runtime': 4.0}))
+        self.assertEqual(history.get_estimate(3), 4.0)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+u"""schedulerモジュールに対するテストをまとめたモジュール。"""
+
+from threading import Lock
+from unittest import TestCase
+from unittest.mock import patch
+
+from lib.redash_util import \
+    JobManager, JobScheduler, JobStatus, PollingPolicy, Query, RuntimeHistory
+from lib.test_util import ResponseMock
+
+
+class JobSchedulerTest(TestCase):
+    u"""JobSchedulerクラスに対するテストをまとめたクラス。"""
+
+    def setUp(self):
+        # クエリのidと、data_source_idの対応。
+        self.data_sources = {1: 1, 2: 1, 3: 1, 4: 2, 5: 2}
+        self.queries = []
+        for query_id, data_source_id in sorted(self.data_sources.items()):
+            query = Query(query_id)
+            query.set_properties({
+                u'name': u'query' + str(query_id),
+                u'query': u'SELECT ' + str(query_id) + u';',
+                u'data_source_id': data_source_id,
+            })
+            self.queries.append(query)
+
+        self.job_manager = JobManager([], polling_policy=PollingPolicy(
+            initial_interval=0.001, max_interval=0.004))
+
+        # データソース毎の実行中のジョブ数と、その最大値を記録する。
+        self.lock = Lock()
+        self.running = {1: 0, 2: 0}
+        self.max_running = {1: 0, 2: 0}
+        # 実行されたクエリのidを、実行順に記録する。
+        self.executed_ids = []
+
+    def execute_query(self, query_id):
+        data_source_id = self.data_sources[query_id]
+        with self.lock:
+            self.executed_ids.append(query_id)
+            self.running[data_source_id] += 1
+            self.max_running[data_source_id] = max(
+                self.max_running[data_source_id],
+                self.running[data_source_id])
+        return ResponseMock({u'job': {
+            u'id': u'job-' + str(query_id), u'status': JobStatus.pending,
+        }}, 200)
+
+    def update_job_status(self, job_id):
+        query_id = int(job_id[len(u'job-'):])
+        with self.lock:
+            self.running[self.data_sources[query_id]] -= 1
+        return ResponseMock({u'job': {
+            u'status': JobStatus.success, u'query_result_id': query_id,
+        }}, 200)
+
+    def test_iter_finished_jobs_normal_case(self):
+        scheduler = JobScheduler(
+            self.job_manager, max_in_flight=2, source_limits={1: 1})
+        scheduler.add([(query, {}) for query in self.queries])
+
+        with patch(u'lib.redash_util.gateway.Gateway.execute_query',
+                   side_effect=self.execute_query), \
+                patch(u'lib.redash_util.gateway.Gateway.update_job_status',
+                      side_effect=self.update_job_status):
+            jobs = list(scheduler.iter_finished_jobs())
+
+        # 全てのクエリが実行され、終了する。
+        self.assertEqual(sorted(job.query_id for job in jobs), [1, 2, 3, 4, 5])
+        self.assertTrue(self.job_manager.finished())
+
+        # データソース毎の上限を超えて、同時に実行されることはない。
+        self.assertEqual(self.max_running, {1: 1, 2: 2})
+
+        # データソース毎の統計情報が記録される。
+        stats = scheduler.get_stats()
+        self.assertEqual(stats[1].max_queue_depth, 3)
+        self.assertEqual(stats[1].submitted, 3)
+        self.assertEqual(stats[1].finished, 3)
+        self.assertEqual(stats[1].queued, 0)
+        self.assertEqual(stats[1].in_flight, 0)
+        self.assertEqual(stats[2].finished, 2)
+        self.assertGreater(stats[2].get_throughput(), 0)
+        self.assertEqual(scheduler.count_queued(), 0)
+
+    def test_iter_finished_jobs_longest_first_case(self):
+        history = RuntimeHistory()
+        for query_id, runtime in [(1, 1.0), (2, 30.0), (3, 10.0)]:
+            history.record(query_id, runtime)
+        self.job_manager.set_runtime_history(history)
+        scheduler = JobScheduler(self.job_manager, max_in_flight=1)
+        scheduler.add([(query, {}) for query in self.queries[:3]])
+
+        with patch(u'lib.redash_util.gateway.Gateway.execute_query',
+                   side_effect=self.execute_query), \
+                patch(u'lib.redash_util.gateway.Gateway.update_job_status',
+                      side_effect=self.update_job_status):
+            list(scheduler.iter_finished_jobs())
+
+        # 過去の実行時間が長いクエリから順に実行される。
+        self.assertEqual(self.executed_ids, [2, 3, 1])
+
+    @patch(u'lib.redash_util.gateway.Gateway.update_job_status')
+    @patch(
+        u'lib.redash_util.gateway.Gateway.execute_query_text',
+        return_value=ResponseMock({u'query_result': {u'id': 9}}, 200)
+    )
+    def test_iter_finished_jobs_reused_result_case(
+        self, mock_execute_query_text, mock_update_job_status
+    ):
+        scheduler = JobScheduler(
+            self.job_manager, max_in_flight=1, max_age=60)
+        scheduler.add([(query, {}) for query in self.queries])
+
+        # サーバ上の実行結果を再利用したジョブは、ポーリングせずにその場で返る。
+        jobs = list(scheduler.iter_finished_jobs())
+        self.assertEqual(len(jobs), 5)
+        self.assertEqual(mock_execute_query_text.call_count, 5)
+        mock_update_job_status.assert_not_called()
+        self.assertEqual(scheduler.get_stats()[1].finished, 3)